@@ -0,0 +1,236 @@
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, List
+import multiprocessing
+import numpy as np
+import cv2 as cv
+import platform
+import resource
+import json
+import time
+import sys
+import os
+
+from config.config import Config
+
+from typings.bench import BenchOptions, BenchReport, BenchResult
+from typings.error import Err, Error, Ok, Result
+
+# A suite runs one or more benchmark cases and returns one result per case
+Suite = Callable[[Config, BenchOptions], List[BenchResult]]
+
+# Number of iterations which are run before measuring
+WARMUP_ITERATIONS = 3
+
+
+def peak_rss() -> float:
+    '''
+    Returns the peak resident set size of the current process.
+
+    Returns:
+        The peak RSS in MiB.
+    '''
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # Linux reports kibibytes, macOS reports bytes
+    if sys.platform == 'darwin':
+        return rss / 1024 / 1024
+
+    return rss / 1024
+
+
+def result_from(name: str, samples: List[float], elapsed: float, extra: Dict[str, float] = {}) -> BenchResult:
+    '''
+    Create a benchmark result from latency samples.
+
+    Args:
+        name: Name of the case.
+        samples: Latencies in seconds.
+        elapsed: Wall time of all iterations in seconds.
+        extra: Case specific values.
+
+    Returns:
+        The benchmark result.
+    '''
+    if len(samples) == 0:
+        samples = [0.0]
+
+    ms = np.asarray(samples) * 1000
+    p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+
+    return BenchResult(
+        name=name,
+        iterations=len(samples),
+        p50=float(p50),
+        p95=float(p95),
+        p99=float(p99),
+        mean=float(ms.mean()),
+        throughput=len(samples) / elapsed if elapsed > 0 else 0.0,
+        peak_rss=peak_rss(),
+        extra=dict(extra)
+    )
+
+
+def measure(name: str, func: Callable[[int], None], iterations: int, extra: Dict[str, float] = {}) -> BenchResult:
+    '''
+    Measure the latency of `func`. The function receives the iteration number. A few warmup iterations run before
+    measuring.
+
+    Args:
+        name: Name of the case.
+        func: Function to measure.
+        iterations: Number of measured iterations.
+        extra: Case specific values.
+
+    Returns:
+        The benchmark result.
+    '''
+    for i in range(WARMUP_ITERATIONS):
+        func(i)
+
+    samples = []
+    start = time.perf_counter()
+    for i in range(iterations):
+        t = time.perf_counter()
+        func(i)
+        samples.append(time.perf_counter() - t)
+
+    return result_from(name, samples, time.perf_counter() - start, extra)
+
+
+def _run_suite(name: str, cfg: Config, options: BenchOptions) -> List[BenchResult]:
+    '''
+    Run a single suite. This is the entry point of the suite processes.
+    '''
+    from bench.suites import SUITES
+    return SUITES[name](cfg, options)
+
+
+def run_suites(cfg: Config, names: List[str], options: BenchOptions) -> Result[BenchReport, Error]:
+    '''
+    Run benchmark suites. Each suite runs in a fresh process, so that the peak RSS is measured per suite and suites
+    don't warm up caches for each other.
+
+    Args:
+        cfg: Configuration data.
+        names: Names of the suites to run.
+        options: Benchmark options.
+
+    Returns:
+        The benchmark report or an Error.
+    '''
+    results: List[BenchResult] = []
+    context = multiprocessing.get_context('spawn')
+
+    for name in names:
+        with ProcessPoolExecutor(1, context) as pool:
+            try:
+                results.extend(pool.submit(_run_suite, name, cfg, options).result())
+            except Exception as e:
+                return Err(Error(f'Suite \'{name}\' failed: {e}'))
+
+    meta = {
+        'python': platform.python_version(),
+        'opencv': cv.__version__,
+        'platform': platform.platform(),
+        'cpus': str(os.cpu_count()),
+        'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    }
+
+    return Ok(BenchReport(meta=meta, results=results))
+
+
+def compare_reports(report: BenchReport, baseline: BenchReport, tolerance: float) -> List[str]:
+    '''
+    Compare a benchmark report against a baseline. A case regressed if its p95 latency grew or its throughput dropped
+    by more than `tolerance`.
+
+    Args:
+        report: The current report.
+        baseline: The baseline report.
+        tolerance: Allowed relative change, e.g. 0.1 => 10 percent.
+
+    Returns:
+        A description of each regression. Empty if nothing regressed.
+    '''
+    previous = {result['name']: result for result in baseline['results']}
+    regressions = []
+
+    for result in report['results']:
+        base = previous.get(result['name'])
+        if base == None:
+            continue
+
+        if base['p95'] > 0 and result['p95'] > base['p95'] * (1 + tolerance):
+            regressions.append(
+                f'{result["name"]}: p95 {base["p95"]:.3f}ms -> {result["p95"]:.3f}ms '
+                f'(+{(result["p95"] / base["p95"] - 1) * 100:.1f}%)'
+            )
+
+        if base['throughput'] > 0 and result['throughput'] < base['throughput'] * (1 - tolerance):
+            regressions.append(
+                f'{result["name"]}: throughput {base["throughput"]:.1f}/s -> {result["throughput"]:.1f}/s '
+                f'({(result["throughput"] / base["throughput"] - 1) * 100:.1f}%)'
+            )
+
+    return regressions
+
+
+def format_report(report: BenchReport) -> List[str]:
+    '''
+    Format a benchmark report as human readable lines.
+
+    Args:
+        report: The benchmark report.
+
+    Returns:
+        The formatted lines.
+    '''
+    lines = []
+    for r in report['results']:
+        extra = ' '.join(f'{key}: {value:g}' for key, value in r['extra'].items())
+        lines.append(
+            f'{r["name"]:<22} p50: {r["p50"]:8.3f}ms p95: {r["p95"]:8.3f}ms p99: {r["p99"]:8.3f}ms '
+            f'{r["throughput"]:9.1f}/s rss: {r["peak_rss"]:6.1f}MiB {extra}'
+        )
+
+    return lines
+
+
+def read_report(path: str) -> Result[BenchReport, Error]:
+    '''
+    Read a benchmark report from a JSON file.
+
+    Args:
+        path: Path to the JSON file.
+
+    Returns:
+        The benchmark report or an Error.
+    '''
+    if not os.path.exists(path):
+        return Err(Error('File not found'))
+
+    try:
+        with open(path) as f:
+            return Ok(json.load(f))
+    except (OSError, json.JSONDecodeError) as e:
+        return Err(Error(f'Failed to read benchmark report: {e}'))
+
+
+def write_report(path: str, report: BenchReport) -> Error:
+    '''
+    Write a benchmark report as JSON file.
+
+    Args:
+        path: Path to the JSON file.
+        report: The benchmark report.
+
+    Returns:
+        Non None if an error occured.
+    '''
+    try:
+        with open(path, 'w') as f:
+            json.dump(report, f, indent=2)
+    except OSError as e:
+        return Error(f'Failed to write benchmark report: {e}')
+
+    return None
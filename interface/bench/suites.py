@@ -0,0 +1,345 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from queue import Empty
+from typing import Dict, List
+import numpy as np
+import cv2 as cv
+import threading
+import json
+import time
+
+from bench.runner import WARMUP_ITERATIONS, Suite, measure, result_from
+from capture.calibration import Calibration
+from capture.detection import Detector, detector_options_from
+from capture.filter import MarkerFilter
+from capture.geometry import batch_from
+from capture.scene import DEFAULT_SCENE_OPTIONS, SceneGenerator, compare
+from capture.source import SceneSource, source_from
+from capture.tracker import Tracker
+from client.client import Client
+from config.config import CaptureOptions, Config, TrackerOptions
+from renderer.shared import Shared
+from renderer.warp import Warp
+import capture.aruco as aruco
+
+from typings.capture.subscription import SubscriptionMode
+from typings.capture.scene import SceneOptions
+from typings.bench import BenchOptions, BenchResult
+from typings.renderer import Node
+
+# Identity calibration used for benchmarks which don't depend on the camera model
+IDENTITY_CALIBRATION = (np.eye(3), np.zeros(5), (), ())
+
+
+def _scene(cfg: Config, options: BenchOptions) -> SceneGenerator:
+    '''
+    Returns the synthetic scene used by the benchmarks.
+    '''
+    return SceneGenerator(cfg, SceneOptions(DEFAULT_SCENE_OPTIONS, number=options['markers']))
+
+
+def _frames(cfg: Config, options: BenchOptions, number: int) -> List[cv.Mat]:
+    '''
+    Returns gray scale benchmark frames from the configured frame source.
+    '''
+    result = source_from(cfg, options['source'])
+    if result.is_err():
+        raise Exception(result.error().string())
+
+    source = result.unwrap()
+    err = source.open()
+    if err != None:
+        raise Exception(err.string())
+
+    frames = []
+    while len(frames) < number:
+        ok, frame = source.read()
+        if not ok:
+            break
+        frames.append(cv.cvtColor(frame, cv.COLOR_BGR2GRAY))
+
+    source.release()
+    if len(frames) == 0:
+        raise Exception('No frames read from the frame source')
+
+    return frames
+
+
+def bench_tracker(cfg: Config, options: BenchOptions) -> List[BenchResult]:
+    '''
+    Benchmark the marker detection of single frames and the end-to-end tracking pipeline. On synthetic scenes the
+    detection accuracy gets measured as well.
+    '''
+    typ = aruco.type_from(cfg['capture']['aruco']['size'], cfg['capture']['aruco']['uniques'])
+    dict_type, _ = aruco.dict_from(typ)
+
+    # Detect with the same options as the tracker
+    detector = Detector(dict_type, IDENTITY_CALIBRATION, detector_options_from(cfg), cfg['capture']['aruco']['ids'])
+
+    # Use a limited number of distinct frames, rendering scenes is a lot slower than detecting markers
+    distinct = min(options['iterations'], 60)
+    truth = []
+    if options['source']:
+        frames = _frames(cfg, options, distinct)
+    else:
+        scene = _scene(cfg, options)
+        frames = []
+        for n in range(distinct):
+            frame, t = scene.render(n)
+            frames.append(cv.cvtColor(frame, cv.COLOR_BGR2GRAY))
+            truth.append(t)
+
+    accuracy = []
+
+    def detect(i: int):
+        result = detector.detect(frames[i % len(frames)])
+        if truth:
+            accuracy.append(compare(batch_from(result[0], result[1]), truth[i % len(truth)]))
+
+    detect_result = measure('tracker.detect', detect, options['iterations'])
+
+    # Only the measured iterations count, the warmup iterations ran first
+    accuracy = accuracy[WARMUP_ITERATIONS:]
+    if accuracy:
+        expected = sum(a['expected'] for a in accuracy)
+        detect_result['extra'] = {
+            'recall': sum(a['matched'] for a in accuracy) / expected,
+            'false_positives': sum(a['false_positives'] for a in accuracy),
+            'rms_error': float(np.sqrt(np.mean([a['rms_error'] ** 2 for a in accuracy if a['matched'] > 0] or [0]))),
+        }
+
+    return [detect_result, _bench_pipeline(cfg, options)]
+
+
+def _bench_pipeline(cfg: Config, options: BenchOptions) -> BenchResult:
+    '''
+    Run the tracker with its configured workers on a finite frame source as fast as possible. The latency is the
+    time between capturing a frame and receiving its markers. Frames are never dropped, the source isn't paced and
+    would otherwise outrun the detection, so every frame yields a sample.
+    '''
+    if options['source']:
+        result = source_from(cfg, options['source'])
+        if result.is_err():
+            raise Exception(result.error().string())
+        source = result.unwrap()
+    else:
+        scene = SceneOptions(DEFAULT_SCENE_OPTIONS, number=options['markers'])
+        source = SceneSource(cfg, scene, min(options['iterations'], 120), loop=False)
+
+    tracker_options = TrackerOptions(cfg['capture']['tracker'], drop_policy='none')
+    cfg = Config(cfg, capture=CaptureOptions(cfg['capture'], tracker=tracker_options))
+
+    tracker = Tracker(cfg, IDENTITY_CALIBRATION, source)
+    _, _, retrieve = tracker.subscribe(1024, SubscriptionMode.DROP_OLDEST)
+
+    latencies = []
+    done = threading.Event()
+
+    def collect():
+        while not done.is_set():
+            try:
+                batch = retrieve(True, 0.1)
+                latencies.append(time.monotonic() - batch.timestamp)
+            except Empty:
+                continue
+
+    t = threading.Thread(None, collect, 'bench-collector')
+    t.start()
+
+    # Source frames are rendered when the tracker opens the source, so start measuring with the first frame
+    err = tracker.start()
+    if err != None:
+        raise Exception(err.string())
+
+    frame = tracker.wait_for_frame(0, 60)
+    if frame == None:
+        raise Exception('No frame captured')
+
+    seq = frame.seq
+    frame.release()
+    start = time.perf_counter()
+
+    # The frame store gets closed once the tracker processed the last frame
+    while (frame := tracker.wait_for_frame(seq, 10)) != None:
+        seq = frame.seq
+        frame.release()
+
+    elapsed = time.perf_counter() - start
+    tracker.stop()
+
+    # Let the collector pick up the remaining results
+    time.sleep(0.2)
+    done.set()
+    t.join()
+
+    stats = tracker.stats()
+    if len(latencies) < stats['frames']:
+        raise Exception(f'Only {len(latencies)} of {stats["frames"]} frames were tracked')
+
+    return result_from('tracker.pipeline', latencies, elapsed, {'frames': stats['frames']})
+
+
+def bench_geometry(cfg: Config, options: BenchOptions) -> List[BenchResult]:
+    '''
+    Benchmark the conversion of detection results into marker batches and the marker filter.
+    '''
+    n = options['markers']
+    rng = np.random.default_rng(0)
+    corners = rng.uniform(0, 1000, (n, 1, 4, 2)).astype(np.float32)
+    ids = np.arange(n).reshape(n, 1)
+    corner_list = tuple(corners)
+
+    def convert(_: int):
+        batch_from(corner_list, ids)
+
+    filters = [MarkerFilter()]
+    batches = [batch_from(corners + i, ids, i, i / 60) for i in range(100)]
+
+    def apply(i: int):
+        batch = batches[i % len(batches)]
+
+        # Frames have to be passed in order, start over with a new filter after each pass
+        if i % len(batches) == 0:
+            filters[0] = MarkerFilter()
+
+        filters[0].apply(batch, batch.timestamp)
+
+    return [
+        measure('geometry.batch_from', convert, options['iterations'], {'markers': n}),
+        measure('geometry.filter', apply, options['iterations'], {'markers': n}),
+    ]
+
+
+def bench_render(cfg: Config, options: BenchOptions) -> List[BenchResult]:
+    '''
+    Benchmark rendering all render layers with a number of render objects.
+    '''
+    n = options['objects']
+    width, height = cfg['renderer']['width'], cfg['renderer']['height']
+
+    shared = Shared(cfg, None)
+    shared.add_render_layer(0, 'nodes')
+    shared.add_render_layer(1, 'overlay', False)
+
+    rng = np.random.default_rng(0)
+    for i in range(n):
+        x, y = int(rng.uniform(0, width)), int(rng.uniform(0, height))
+        shared.add_object_to_layer(i % 2, Node(x, y, 40, f'node-{i}', (0, 255, 0)))
+
+    frame = np.zeros((height, width, 3), dtype=np.uint8)
+    background = np.zeros_like(frame)
+    matrix = np.zeros((3, 3))
+
+    def render(_: int):
+        frame.fill(0)
+        shared.render(frame, matrix, width, height)
+
+    # Move a single node per frame, the rest of the scene is static
+    node = shared.get_object_on_layer_by_index(0, 0).unwrap()
+
+    def render_dirty(i: int):
+        node.update(node._x + (1 if i % 2 == 0 else -1), node._y)
+        shared.render_dirty(frame, background, matrix, width, height)
+
+    # Keystone correction of a full frame with a known homography
+    src = np.float32([[0, 0], [width, 0], [width, height], [0, height]])
+    dst = src + np.float32([[60, 30], [-30, 10], [-80, -20], [20, -50]])
+    warp = Warp()
+    warp.update(cv.getPerspectiveTransform(src, dst), width, height)
+    warped = np.zeros_like(frame)
+
+    def apply_warp(_: int):
+        warp.apply(frame, warped)
+
+    return [
+        measure('render.shared', render, options['iterations'], {'objects': n}),
+        measure('render.dirty', render_dirty, options['iterations'], {'objects': n}),
+        measure('render.warp', apply_warp, options['iterations']),
+    ]
+
+
+def bench_calibration(cfg: Config, options: BenchOptions) -> List[BenchResult]:
+    '''
+    Benchmark detecting the ChArUco board in a calibration frame.
+    '''
+    calibration = Calibration(cfg)
+    board = calibration._board.draw((cfg['renderer']['width'], cfg['renderer']['height']))
+
+    def detect(_: int):
+        calibration._corners, calibration._ids = [], []
+        calibration._frames = [board]
+        err = calibration._detect()
+        if err != None:
+            raise Exception(err.string())
+
+    return [measure('calibration.detect', detect, max(options['iterations'] // 10, 1))]
+
+
+def bench_client(cfg: Config, options: BenchOptions) -> List[BenchResult]:
+    '''
+    Benchmark backend round-trips against a local stub server.
+    '''
+    n = options['objects']
+    graph = json.dumps({
+        'status': 'success',
+        'graph': {
+            'nodes': [{'name': f'node-{i}', 'id': i} for i in range(n)],
+            'edges': [{'connects': [i, (i + 1) % n], 'score': 0.5} for i in range(n)],
+        }
+    }).encode()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def _reply(self, body: bytes):
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            self._reply(graph)
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            self._reply(b'{"status": "success"}')
+
+        def log_message(self, *_):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.daemon_threads = True
+    t = threading.Thread(None, server.serve_forever, 'bench-stub-server', daemon=True)
+    t.start()
+
+    client_cfg = Config(cfg, backend={'host': '127.0.0.1', 'port': server.server_address[1]})
+    client = Client(client_cfg)
+    payload, _ = client.get_graph()
+
+    def get(_: int):
+        _, err = client.get_graph()
+        if err != None:
+            raise Exception(err.message)
+
+    def post(_: int):
+        _, err = client.update_graph(payload)
+        if err != None:
+            raise Exception(err.message)
+
+    try:
+        return [
+            measure('client.get_graph', get, options['iterations'], {'nodes': n}),
+            measure('client.update_graph', post, options['iterations'], {'nodes': n}),
+        ]
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+SUITES: Dict[str, Suite] = {
+    'tracker': bench_tracker,
+    'geometry': bench_geometry,
+    'render': bench_render,
+    'calibration': bench_calibration,
+    'client': bench_client,
+}
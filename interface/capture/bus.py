@@ -0,0 +1,766 @@
+from multiprocessing.shared_memory import SharedMemory
+from typing import Tuple
+from queue import Empty, Full
+import multiprocessing
+import threading
+import time
+import numpy as np
+import cv2 as cv
+
+from capture.source import source_from
+from capture.publisher import Publisher
+from capture.result import TrackingResult
+from capture.tracker import Tracker
+from config.config import Config
+from utils.pool import BufferPool
+import utils.trace as trace
+
+from typings.capture.aruco import MARKER_DTYPE, MarkerBatch
+from typings.capture.calibration import CharucoCalibrationData
+from typings.capture.stats import TrackerStats
+from typings.error import Err, Error, Ok, Result
+
+# Header fields (int64)
+_HEADER_FIELDS = 8
+_H_FRAME_SLOTS = 0
+_H_MARKER_SLOTS = 1
+_H_HEIGHT = 2
+_H_WIDTH = 3
+_H_MAX_MARKERS = 4
+_H_FRAME_SEQ = 5
+_H_MARKER_SEQ = 6
+_H_CLOSED = 7
+
+# Each slot is guarded by a sequence lock: The writer sets `begin` before and `end` after writing the slot. A reader
+# copies the slot and checks that both still match the sequence number it expected.
+FRAME_META_DTYPE = np.dtype([
+    ('begin', np.int64),
+    ('end', np.int64),
+    ('timestamp', np.float64),
+])
+
+MARKER_META_DTYPE = np.dtype([
+    ('begin', np.int64),
+    ('end', np.int64),
+    ('timestamp', np.float64),
+    ('frame_no', np.int64),
+    ('count', np.int64),
+    ('static', np.int64),
+])
+
+
+def _align(n: int) -> int:
+    '''
+    Align `n` to 64 bytes.
+    '''
+    return (n + 63) & ~63
+
+
+class SharedBus:
+    '''
+    This class describes a ring buffer in shared memory which publishes camera frames and marker batches from one
+    process to others. The writer copies each frame once into the next slot, readers in other processes map the same
+    memory. A slot is overwritten only after all other slots were written, which gives readers enough time to copy it.
+    '''
+
+    def __init__(self, shm: SharedMemory, owner: bool) -> None:
+        self._owner = owner
+        self._shm = shm
+
+        buf = shm.buf
+        self._header = np.ndarray((_HEADER_FIELDS,), np.int64, buf)
+
+        frame_slots = int(self._header[_H_FRAME_SLOTS])
+        marker_slots = int(self._header[_H_MARKER_SLOTS])
+        height = int(self._header[_H_HEIGHT])
+        width = int(self._header[_H_WIDTH])
+        max_markers = int(self._header[_H_MAX_MARKERS])
+
+        offset = _align(self._header.nbytes)
+        self._frame_meta = np.ndarray((frame_slots,), FRAME_META_DTYPE, buf, offset)
+        offset = _align(offset + self._frame_meta.nbytes)
+        self._marker_meta = np.ndarray((marker_slots,), MARKER_META_DTYPE, buf, offset)
+        offset = _align(offset + self._marker_meta.nbytes)
+        self._colors = np.ndarray((frame_slots, height, width, 3), np.uint8, buf, offset)
+        offset = _align(offset + self._colors.nbytes)
+        self._grays = np.ndarray((frame_slots, height, width), np.uint8, buf, offset)
+        offset = _align(offset + self._grays.nbytes)
+        self._markers = np.ndarray((marker_slots, max_markers), MARKER_DTYPE, buf, offset)
+
+    @staticmethod
+    def size(width: int, height: int, frame_slots: int, marker_slots: int, max_markers: int) -> int:
+        '''
+        Returns the number of bytes required by a bus with the provided dimensions.
+        '''
+        size = _align(_HEADER_FIELDS * 8)
+        size += _align(frame_slots * FRAME_META_DTYPE.itemsize)
+        size += _align(marker_slots * MARKER_META_DTYPE.itemsize)
+        size += _align(frame_slots * height * width * 3)
+        size += _align(frame_slots * height * width)
+        size += marker_slots * max_markers * MARKER_DTYPE.itemsize
+        return size
+
+    @staticmethod
+    def create(
+        width: int,
+        height: int,
+        frame_slots: int = 4,
+        marker_slots: int = 16,
+        max_markers: int = 256
+    ) -> 'SharedBus':
+        '''
+        Create a new bus in shared memory. The creating process owns the memory and unlinks it on `close`.
+
+        Args:
+            width: Frame width.
+            height: Frame height.
+            frame_slots: Number of frame slots in the ring buffer.
+            marker_slots: Number of marker batch slots in the ring buffer.
+            max_markers: Maximum number of markers per batch.
+
+        Returns:
+            The bus.
+        '''
+        size = SharedBus.size(width, height, frame_slots, marker_slots, max_markers)
+        shm = SharedMemory(create=True, size=size)
+
+        header = np.ndarray((_HEADER_FIELDS,), np.int64, shm.buf)
+        header[:] = 0
+        header[_H_FRAME_SLOTS] = frame_slots
+        header[_H_MARKER_SLOTS] = marker_slots
+        header[_H_HEIGHT] = height
+        header[_H_WIDTH] = width
+        header[_H_MAX_MARKERS] = max_markers
+        del header
+
+        bus = SharedBus(shm, True)
+        bus._frame_meta[:] = 0
+        bus._marker_meta[:] = 0
+        return bus
+
+    @staticmethod
+    def attach(name: str) -> 'SharedBus':
+        '''
+        Attach to an existing bus created by another process.
+
+        Args:
+            name: Name of the shared memory block.
+
+        Returns:
+            The bus.
+        '''
+        return SharedBus(SharedMemory(name), False)
+
+    def name(self) -> str:
+        '''
+        Returns the name of the shared memory block.
+        '''
+        return self._shm.name
+
+    def dimensions(self) -> Tuple[int, int]:
+        '''
+        Returns the frame width and height.
+        '''
+        return int(self._header[_H_WIDTH]), int(self._header[_H_HEIGHT])
+
+    def is_closed(self) -> bool:
+        '''
+        Returns if the writer closed the bus.
+        '''
+        return bool(self._header[_H_CLOSED])
+
+    def frame_seq(self) -> int:
+        '''
+        Returns the sequence number of the newest frame.
+        '''
+        return int(self._header[_H_FRAME_SEQ])
+
+    def marker_seq(self) -> int:
+        '''
+        Returns the sequence number of the newest marker batch.
+        '''
+        return int(self._header[_H_MARKER_SEQ])
+
+    def write_frame(self, color: cv.Mat, gray: cv.Mat, timestamp: float) -> int:
+        '''
+        Publish a frame.
+
+        Args:
+            color: The color frame.
+            gray: The gray scale frame.
+            timestamp: Capture timestamp.
+
+        Returns:
+            The sequence number of the frame.
+        '''
+        seq = int(self._header[_H_FRAME_SEQ]) + 1
+        slot = seq % len(self._frame_meta)
+        meta = self._frame_meta[slot:slot + 1]
+
+        meta['begin'] = seq
+        np.copyto(self._colors[slot], color)
+        np.copyto(self._grays[slot], gray)
+        meta['timestamp'] = timestamp
+        meta['end'] = seq
+
+        self._header[_H_FRAME_SEQ] = seq
+        return seq
+
+    def read_frame(
+        self,
+        after: int = 0,
+        color: cv.Mat | None = None,
+        gray: cv.Mat | None = None
+    ) -> Tuple[int, float, cv.Mat, cv.Mat] | None:
+        '''
+        Copy the newest frame if it is newer than `after`.
+
+        Args:
+            after: Sequence number of the last seen frame.
+            color: Copy the color frame into this buffer (Default: None => A new buffer).
+            gray: Copy the gray scale frame into this buffer (Default: None => A new buffer).
+
+        Returns:
+            A tuple of sequence number, timestamp, color and gray scale frame or None if there is no newer frame.
+        '''
+        while True:
+            seq = int(self._header[_H_FRAME_SEQ])
+            if seq <= after:
+                return None
+
+            slot = seq % len(self._frame_meta)
+            meta = self._frame_meta[slot]
+            if meta['end'] != seq:
+                continue
+
+            timestamp = float(meta['timestamp'])
+            color = _copy_into(self._colors[slot], color)
+            gray = _copy_into(self._grays[slot], gray)
+
+            # The writer did not touch the slot while we copied it
+            if self._frame_meta[slot]['begin'] == seq:
+                return seq, timestamp, color, gray
+
+    def write_markers(self, batch: MarkerBatch) -> int:
+        '''
+        Publish a marker batch. Markers exceeding the maximum number of markers are cut off.
+
+        Args:
+            batch: The marker batch.
+
+        Returns:
+            The sequence number of the batch.
+        '''
+        seq = int(self._header[_H_MARKER_SEQ]) + 1
+        slot = seq % len(self._marker_meta)
+        meta = self._marker_meta[slot:slot + 1]
+        count = min(len(batch), self._markers.shape[1])
+
+        meta['begin'] = seq
+        self._markers[slot, :count] = batch.markers[:count]
+        meta['timestamp'] = batch.timestamp
+        meta['frame_no'] = batch.frame_no
+        meta['count'] = count
+        meta['static'] = batch.static
+        meta['end'] = seq
+
+        self._header[_H_MARKER_SEQ] = seq
+        return seq
+
+    def read_markers(self, after: int = 0) -> Tuple[int, MarkerBatch] | None:
+        '''
+        Copy the newest marker batch if it is newer than `after`.
+
+        Args:
+            after: Sequence number of the last seen batch.
+
+        Returns:
+            A tuple of sequence number and marker batch or None if there is no newer batch.
+        '''
+        while True:
+            seq = int(self._header[_H_MARKER_SEQ])
+            if seq <= after:
+                return None
+
+            slot = seq % len(self._marker_meta)
+            meta = self._marker_meta[slot].copy()
+            if meta['end'] != seq:
+                continue
+
+            markers = self._markers[slot, :int(meta['count'])].copy()
+
+            if self._marker_meta[slot]['begin'] == seq:
+                return seq, MarkerBatch(markers, int(meta['frame_no']), float(meta['timestamp']), bool(meta['static']))
+
+    def close(self):
+        '''
+        Close the bus. The owning process additionally marks the bus as closed and unlinks the shared memory.
+        '''
+        if self._owner:
+            self._header[_H_CLOSED] = 1
+
+        # Drop all views before closing the memory
+        del self._header, self._frame_meta, self._marker_meta, self._colors, self._grays, self._markers
+        self._shm.close()
+
+        if self._owner:
+            self._shm.unlink()
+
+
+def _copy_into(src: np.ndarray, dst: np.ndarray | None) -> np.ndarray:
+    '''
+    Copy an array into `dst` if it has the same shape, otherwise into a new array.
+    '''
+    if dst is None or dst.shape != src.shape:
+        return src.copy()
+
+    np.copyto(dst, src)
+    return dst
+
+
+class BusFrame:
+    '''
+    This class describes a frame read from the bus. It mirrors the interface of `Frame` but owns copies of the
+    buffers. The copies are pooled: Releasing the frame returns them to the pool of the bus tracker, so they get
+    reused for later frames. Frames which are never released are simply garbage collected.
+    '''
+
+    def __init__(
+        self,
+        seq: int,
+        timestamp: float,
+        color: cv.Mat,
+        gray: cv.Mat,
+        pool: BufferPool | None = None
+    ) -> None:
+        self._released = False
+        self._pool = pool
+
+        self.timestamp = timestamp
+        self.color = color
+        self.gray = gray
+        self.seq = seq
+
+    def release(self):
+        '''
+        Release the frame. The buffers must not be used afterwards.
+        '''
+        if self._released:
+            return
+
+        self._released = True
+        if self._pool != None:
+            self._pool.release(self.color)
+            self._pool.release(self.gray)
+
+    def __enter__(self) -> 'BusFrame':
+        return self
+
+    def __exit__(self, *_):
+        self.release()
+
+
+def _publish_frames(tracker: Tracker, bus: SharedBus, stop: threading.Event):
+    '''
+    Copy every new frame of the tracker into the bus. The tracker doesn't capture into the bus slots directly: Its
+    frame store slots stay pinned while detection workers read them, while the bus ring gets overwritten without
+    waiting for readers in other processes. The copy keeps both independent.
+    '''
+    seq = 0
+    while not stop.is_set():
+        frame = tracker.wait_for_frame(seq, 0.1)
+        if frame == None:
+            continue
+
+        with frame:
+            seq = frame.seq
+            bus.write_frame(frame.color, frame.gray, frame.timestamp)
+
+
+def run_tracker_process(
+    cfg: Config,
+    calib_data: CharucoCalibrationData,
+    source: str,
+    realtime: bool,
+    handshake: multiprocessing.Queue,
+    stats: multiprocessing.Queue,
+    stop: multiprocessing.Event,
+    trace_events: multiprocessing.Queue = None
+):
+    '''
+    Entry point of the tracker process. This runs the tracker, creates the bus once the frame dimensions are known
+    and publishes frames and marker batches until `stop` is set. Tracker stats are sent about once per second.
+
+    Args:
+        cfg: Configuration data.
+        calib_data: Camera calibration data.
+        source: Frame source spec.
+        realtime: If file based frame sources should be paced in real-time.
+        handshake: Queue to send the bus name (or an error message) to the parent process.
+        stats: Queue to send tracker stats to the parent process.
+        stop: Event to stop the process.
+        trace_events: Queue to send the recorded trace events to the parent process on exit (Default: None =>
+            Tracing disabled).
+    '''
+    if trace_events != None:
+        trace.enable()
+
+    source_result = source_from(cfg, source, realtime)
+    if source_result.is_err():
+        handshake.put((False, source_result.error().string()))
+        return
+
+    tracker = Tracker(cfg, calib_data, source_result.unwrap())
+    _, _, retrieve = tracker.subscribe()
+    err = tracker.start()
+    if err != None:
+        handshake.put((False, err.string()))
+        return
+
+    # The bus can only be created once the first frame tells us the frame dimensions. Stop waiting if the tracker
+    # stopped, e.g. because the frame source could not be opened
+    frame = None
+    deadline = time.monotonic() + 10
+    while frame == None and tracker.is_running() and time.monotonic() < deadline:
+        frame = tracker.wait_for_frame(0, 0.1)
+
+    if frame == None:
+        err = tracker.error()
+        tracker.stop()
+        handshake.put((False, err.string() if err != None else 'No frame captured'))
+        return
+
+    with frame:
+        height, width = frame.gray.shape[:2]
+
+    bus = SharedBus.create(width, height)
+    handshake.put((True, bus.name()))
+
+    frame_stop = threading.Event()
+    t = threading.Thread(None, _publish_frames, 'bus-frame-publisher', (tracker, bus, frame_stop))
+    t.start()
+
+    stats_sent = time.monotonic()
+    while not stop.is_set():
+        # Finite frame sources stop the tracker at their end, closing the bus below ends the parent as well
+        if not tracker.is_running():
+            break
+
+        # Skip sending if the parent did not pick up the last stats yet
+        if time.monotonic() - stats_sent >= 1:
+            stats_sent = time.monotonic()
+            try:
+                stats.put_nowait(tracker.stats())
+            except Full:
+                pass
+
+        try:
+            bus.write_markers(retrieve(True, 0.1))
+        except Empty:
+            continue
+
+    frame_stop.set()
+    t.join()
+    tracker.stop()
+    bus.close()
+
+    if trace_events != None:
+        trace_events.put(trace.events())
+
+
+class BusTracker(Publisher):
+    '''
+    This class runs the tracker in a separate process and provides the same consumer interface as `Tracker`. Frames
+    and marker batches are received via a shared memory bus. This takes the tracking load off the GIL of the
+    rendering process.
+    '''
+
+    def __init__(
+        self,
+        cfg: Config,
+        calib_data: CharucoCalibrationData,
+        source: str = '',
+        realtime: bool = False
+    ) -> None:
+        '''
+        Create a new bus tracker instance.
+
+        Args:
+            cfg: Configuration data.
+            calib_data: Camera calibration data.
+            source: Frame source spec (Default: '' => Camera with the configured device ID).
+            realtime: If file based frame sources should be paced in real-time.
+        '''
+        super().__init__()
+        self._context = multiprocessing.get_context('spawn')
+        self._stop = self._context.Event()
+        self._stats_queue = self._context.Queue(1)
+        self._stats: TrackerStats | None = None
+        self._trace_queue = None
+        self._realtime = realtime
+        self._calib = calib_data
+        self._source = source
+        self._cfg = cfg
+
+        self._bus: SharedBus | None = None
+        self._process = None
+        self._thread = None
+        self._running = False
+
+        # Protects waiting for frames
+        self._cond = threading.Condition()
+        self._frame_seq = 0
+        self._closed = False
+
+        # Buffers of the frames copied from the bus
+        self.buffers = BufferPool()
+
+    def start(self) -> Error:
+        '''
+        Start the tracker process and wait until the bus is ready.
+
+        Returns:
+            Non None if an error occured.
+        '''
+        if self._running:
+            return Error('Already running')
+
+        # The tracker process records trace events as well if tracing is enabled in this process
+        self._trace_queue = self._context.Queue(1) if trace.is_enabled() else None
+
+        handshake = self._context.Queue()
+        self._process = self._context.Process(
+            target=run_tracker_process,
+            name='tracking-process',
+            args=(
+                self._cfg, self._calib, self._source, self._realtime, handshake, self._stats_queue, self._stop,
+                self._trace_queue
+            )
+        )
+        self._process.start()
+
+        try:
+            ok, value = handshake.get(timeout=30)
+        except Empty:
+            self._stop.set()
+            self._process.join()
+            return Error('Tracker process did not start')
+
+        if not ok:
+            self._process.join()
+            return Error(value)
+
+        self._bus = SharedBus.attach(value)
+        self._frame_width, self._frame_height = self._bus.dimensions()
+        self._closed = False
+        self._running = True
+
+        t = threading.Thread(None, self._receive, 'bus-receiver')
+        self._thread = t
+        t.start()
+
+        return None
+
+    def _receive(self):
+        '''
+        Poll the bus for new marker batches and frames and notify subscribers and waiting readers. This also receives
+        the tracker stats.
+        '''
+        marker_seq = 0
+        stats_polled = time.monotonic()
+        while self._running and not self._bus.is_closed():
+            idle = True
+
+            # Keep the queue empty, so that the tracker process can always send its newest stats
+            if time.monotonic() - stats_polled >= 0.5:
+                stats_polled = time.monotonic()
+                try:
+                    self._stats = self._stats_queue.get_nowait()
+                except Empty:
+                    pass
+
+            result = self._bus.read_markers(marker_seq)
+            if result != None:
+                marker_seq, batch = result
+                batch.markers.flags.writeable = False
+                self.notify(TrackingResult(None, batch.frame_no, batch.timestamp, batch, batch.static))
+                idle = False
+
+            seq = self._bus.frame_seq()
+            if seq > self._frame_seq:
+                with self._cond:
+                    self._frame_seq = seq
+                    self._cond.notify_all()
+                idle = False
+
+            if idle:
+                time.sleep(0.001)
+
+        # The tracker process closed the bus, e.g. at the end of a video
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def is_running(self) -> bool:
+        '''
+        Returns if the tracker process is running. This turns False when a finite frame source reached its end.
+        '''
+        return self._running and not self._closed
+
+    def stop(self):
+        '''
+        Stop the tracker process and detach from the bus.
+        '''
+        if not self._running:
+            return
+
+        self._running = False
+        self._thread.join()
+        self._stop.set()
+
+        # Receive the trace events before joining, the process only exits once they were picked up
+        if self._trace_queue != None:
+            try:
+                trace.add_events(self._trace_queue.get(timeout=10))
+            except Empty:
+                pass
+
+        self._process.join()
+        self._bus.close()
+
+    def stats(self) -> TrackerStats:
+        '''
+        Returns the latest stats sent by the tracker process (at most about one and a half seconds old). The
+        subscriptions are the ones of this process.
+
+        Returns:
+            The stats.
+        '''
+        stats = self._stats
+        if stats == None:
+            stats = TrackerStats(
+                frames=0, fps=0.0, failed_reads=0, dropped_frames=0, stale_frames=0, static_frames=0, detect_errors=0,
+                refinements=0, refine_skips=0, recovered_markers=0, full_scans=0, roi_scans=0, stages={},
+                subscriptions={}, overhead=0.0
+            )
+
+        return TrackerStats(stats, subscriptions=self.subscription_stats())
+
+    def frame_seq(self) -> int:
+        '''
+        Returns the sequence number of the newest frame.
+
+        Returns:
+            The sequence number. 0 if no frame was received yet.
+        '''
+        return self._frame_seq
+
+    def latest_frame(self) -> BusFrame | None:
+        '''
+        Returns a copy of the newest frame.
+
+        Returns:
+            The frame or None if no frame was received yet.
+        '''
+        if not self._running:
+            return None
+
+        return self._read_frame(0)
+
+    def wait_for_frame(self, seq: int, timeout: float | None = None) -> BusFrame | None:
+        '''
+        Wait for a frame newer than `seq`.
+
+        Args:
+            seq: The sequence number of the last seen frame.
+            timeout: Maximum time to wait in seconds (Default: None => Unlimited).
+
+        Returns:
+            A copy of the frame or None if the timeout expired or the tracker stopped.
+        '''
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._frame_seq > seq or not self.is_running(), timeout):
+                return None
+
+        if not self._running:
+            return None
+
+        return self._read_frame(seq)
+
+    def _read_frame(self, after: int) -> BusFrame | None:
+        '''
+        Copy the newest frame into pooled buffers if it is newer than `after`.
+        '''
+        height, width = self._frame_height, self._frame_width
+        color = self.buffers.acquire((height, width, 3))
+        gray = self.buffers.acquire((height, width))
+
+        result = self._bus.read_frame(after, color, gray)
+        if result == None:
+            self.buffers.release(color)
+            self.buffers.release(gray)
+            return None
+
+        return BusFrame(*result, self.buffers)
+
+    def get_frame(self) -> Tuple[bool, cv.Mat]:
+        '''
+        Get a copy of the current gray scale frame.
+
+        Returns:
+            ok: If current frame is available.
+            frame: Current frame.
+        '''
+        frame = self.latest_frame()
+        if frame == None:
+            return False, None
+
+        # The caller keeps the gray scale buffer
+        self.buffers.release(frame.color)
+        return True, frame.gray
+
+    def get_color_frame(self) -> Tuple[bool, cv.Mat]:
+        '''
+        Get a copy of the current color frame.
+
+        Returns:
+            ok: If current frame is available.
+            frame: Current frame.
+        '''
+        frame = self.latest_frame()
+        if frame == None:
+            return False, None
+
+        # The caller keeps the color buffer
+        self.buffers.release(frame.gray)
+        return True, frame.color
+
+
+def tracker_from(
+    cfg: Config,
+    calib_data: CharucoCalibrationData,
+    source: str = '',
+    realtime: bool = False,
+    processes: bool = False
+) -> Result[Publisher, Error]:
+    '''
+    Returns a tracker either running in this process or in a separate process connected via a shared memory bus.
+
+    Args:
+        cfg: Configuration data.
+        calib_data: Camera calibration data.
+        source: Frame source spec.
+        realtime: If file based frame sources should be paced in real-time.
+        processes: If the tracker should run in a separate process.
+
+    Returns:
+        A result consisting of the (not yet started) tracker or an Error.
+    '''
+    if processes:
+        return Ok(BusTracker(cfg, calib_data, source, realtime))
+
+    source_result = source_from(cfg, source, realtime)
+    if source_result.is_err():
+        return Err(source_result.error())
+
+    return Ok(Tracker(cfg, calib_data, source_result.unwrap()))
@@ -10,6 +10,7 @@ import os
 from typings.capture.calibration import CharucoCalibrationData, CalibrationMode
 from typings.error import Error, Err, Ok, Result
 
+from capture.source import CameraSource, FrameSource
 import config.config as config
 import capture.aruco as aruco
 
@@ -20,7 +21,7 @@ class Calibration:
     transform when rendering.
     '''
 
-    def __init__(self, cfg: config.Config, verbose: bool = False) -> None:
+    def __init__(self, cfg: config.Config, verbose: bool = False, source: FrameSource | None = None) -> None:
         typ = aruco.type_from(
             cfg['capture']['aruco']['size'],
             cfg['capture']['aruco']['uniques']
@@ -42,6 +43,7 @@ class Calibration:
         )
 
         self._min_response = math.floor(((cols * rows) / 2) * 0.8)
+        self._source = source if source != None else CameraSource(cfg['capture']['camera_id'])
         self._verbose = verbose
         self._cfg = cfg
 
@@ -73,15 +75,18 @@ class Calibration:
         Returns:
             An Error if an error was encountered, None if otherwise.
         '''
-        cap = cv.VideoCapture(self._cfg['capture']['camera_id'])
+        err = self._source.open()
+        if err != None:
+            return err
 
         n = 0
         while n < self._cfg['capture']['calibration']['number_images']:
             if self._verbose:
                 click.echo('Capture image {:02d}'.format(n))
 
-            ok, frame = cap.read()
+            ok, frame = self._source.read()
             if not ok:
+                self._source.release()
                 return Error('Failed to read the frame')
 
             if grayscale:
@@ -92,7 +97,7 @@ class Calibration:
 
             time.sleep(self._cfg['capture']['calibration']['interval'])
 
-        cap.release()
+        self._source.release()
         return None
 
     def _detect(self) -> Error:
@@ -0,0 +1,259 @@
+from typing import List, Tuple
+import numpy as np
+import cv2 as cv
+import time
+
+from config.config import Config
+import capture.aruco as aruco
+
+from typings.capture.calibration import CharucoCalibrationData
+from typings.capture.detection import DetectorOptions
+from typings.capture.aruco import CornerList, DetectionResult, IDList
+from typings.capture.roi import Roi
+
+# Detector used by detection worker processes. Each process creates its own instance in `init_worker`, because the
+# OpenCV ArUco objects cannot be pickled.
+_worker_detector = None
+
+
+class Detector:
+    '''
+    This class describes the ArUco marker detection of a single gray scale frame. It only receives picklable
+    arguments, so that it can be re-created in detection worker processes.
+
+    With a scale > 1 the detector runs in pyramid mode: Candidates get detected on a downscaled frame and the scaled
+    corners get refined to sub-pixel accuracy on the full resolution frame.
+
+    With a set of active IDs the markers get decoded against a reduced dictionary which only contains these IDs. The
+    refinement against the board only runs if expected board markers are missing.
+    '''
+
+    def __init__(
+        self,
+        dict_type: int,
+        calib_data: CharucoCalibrationData,
+        options: DetectorOptions | None = None,
+        ids: List[int] | None = None
+    ) -> None:
+        '''
+        Create a new detector instance.
+
+        Args:
+            dict_type: Unique ArUco dict identifier. Use with `aruco.dict_from`.
+            calib_data: Camera calibration data.
+            options: Pyramid mode options (Default: None => Detect on the full resolution frame).
+            ids: Active marker IDs (Default: None => All IDs of the dictionary).
+        '''
+        self._dict = cv.aruco.Dictionary_get(dict_type)
+        self._board = aruco.board_from(3, 3, self._dict, marker_length=0.09, marker_separation=0.01)
+        self._params = cv.aruco.DetectorParameters_create()
+        self._calib = calib_data
+
+        # Durations of the detection and the refinement of the last frame in seconds
+        self.timings = (0.0, 0.0)
+
+        # Board markers which have to be found, otherwise the refinement tries to recover them
+        self._expected = np.asarray(self._board.ids, dtype=np.int32).ravel()
+
+        # The reduced dictionary only contains the active IDs. Decoded IDs are indices into `self._ids`
+        self._ids = None
+        if ids:
+            self._ids = np.unique(np.asarray(ids, dtype=np.int32))
+            self._expected = np.intersect1d(self._expected, self._ids)
+
+            board_dict = self._dict
+            self._dict = cv.aruco.Dictionary_get(dict_type)
+            self._dict.bytesList = board_dict.bytesList[self._ids]
+
+        self._scale = 1
+        if options != None:
+            self._scale = options['scale']
+
+            # The scaled corners can be off by up to `scale` pixels, the search window has to cover that error
+            window = max(options['subpix_window'], 2 * self._scale)
+            self._subpix_window = (window, window)
+            self._subpix_criteria = (
+                cv.TERM_CRITERIA_EPS + cv.TERM_CRITERIA_COUNT,
+                options['subpix_iterations'],
+                0.01
+            )
+
+    def detect(self, frame: cv.Mat, rois: List[Roi] | None = None) -> DetectionResult:
+        '''
+        Detect and refine markers in a gray scale frame.
+
+        Args:
+            frame: The gray scale frame.
+            rois: Only detect markers in these regions (Default: None => Full frame).
+
+        Returns:
+            A tuple consisting of corners, IDs, rejected candidates and recovered candidates. The recovered
+            candidates are None if the refinement was skipped.
+        '''
+        start = time.perf_counter()
+
+        # Detect the markers
+        if rois == None:
+            corners, ids, rejected = self._detect_markers(frame)
+        else:
+            corners, ids, rejected = self._detect_rois(frame, rois)
+
+        detected = time.perf_counter()
+
+        # Only refine if expected board markers are missing
+        found = ids.ravel() if ids is not None else []
+        if len(np.setdiff1d(self._expected, found)) == 0:
+            self.timings = (detected - start, 0.0)
+            return corners, ids, rejected, None
+
+        corners, ids, rejected, recovered = cv.aruco.refineDetectedMarkers(
+            frame, self._board, corners, ids, rejected,
+            cameraMatrix=self._calib[0],
+            distCoeffs=self._calib[1]
+        )
+
+        self.timings = (detected - start, time.perf_counter() - detected)
+
+        if recovered is None:
+            recovered = np.empty(0, dtype=np.int32)
+
+        return corners, ids, rejected, recovered
+
+    def _detect_rois(self, frame: cv.Mat, rois: List[Roi]):
+        '''
+        Detect markers in multiple crops of a frame. The corners get mapped back into full frame coordinates.
+
+        Args:
+            frame: The gray scale frame.
+            rois: The regions to detect markers in.
+
+        Returns:
+            A tuple consisting of corners, IDs and rejected candidates.
+        '''
+        corners, ids, rejected = [], [], []
+        seen = set()
+
+        for x0, y0, x1, y1 in rois:
+            crop_corners, crop_ids, crop_rejected = self._detect_markers(frame[y0:y1, x0:x1])
+
+            offset = np.array([x0, y0], dtype=np.float32)
+            rejected.extend(c + offset for c in crop_rejected)
+
+            if crop_ids is None:
+                continue
+
+            for c, id in zip(crop_corners, crop_ids):
+                if id[0] in seen:
+                    continue
+
+                seen.add(id[0])
+                corners.append(c + offset)
+                ids.append(id)
+
+        if len(ids) == 0:
+            return tuple(), None, tuple(rejected)
+
+        return tuple(corners), np.array(ids, dtype=np.int32), tuple(rejected)
+
+    def _detect_markers(self, frame: cv.Mat) -> Tuple[CornerList, IDList, CornerList]:
+        '''
+        Detect markers in a (cropped) frame. With active IDs, the indices into the reduced dictionary get mapped back
+        to the marker IDs.
+
+        Args:
+            frame: The gray scale frame.
+
+        Returns:
+            A tuple consisting of corners, IDs and rejected candidates.
+        '''
+        corners, ids, rejected = self._detect_scaled(frame)
+
+        if self._ids is not None and ids is not None:
+            ids = self._ids[ids]
+
+        return corners, ids, rejected
+
+    def _detect_scaled(self, frame: cv.Mat) -> Tuple[CornerList, IDList, CornerList]:
+        '''
+        Detect markers in a (cropped) frame. In pyramid mode the detection runs on a downscaled copy of the frame and
+        the corners get mapped back to full resolution.
+
+        Args:
+            frame: The gray scale frame.
+
+        Returns:
+            A tuple consisting of corners, IDs and rejected candidates.
+        '''
+        if self._scale == 1:
+            return cv.aruco.detectMarkers(frame, self._dict, parameters=self._params)
+
+        small = cv.resize(frame, None, fx=1 / self._scale, fy=1 / self._scale, interpolation=cv.INTER_AREA)
+        corners, ids, rejected = cv.aruco.detectMarkers(small, self._dict, parameters=self._params)
+
+        # The candidates are only used as hints during refinement, so they don't need sub-pixel accuracy
+        rejected = tuple(c * self._scale for c in rejected)
+        if len(corners) == 0:
+            return corners, ids, rejected
+
+        # Refine all corners at once on the full resolution frame
+        points = np.concatenate(corners).reshape(-1, 1, 2) * self._scale
+        points = cv.cornerSubPix(frame, points, self._subpix_window, (-1, -1), self._subpix_criteria)
+
+        return tuple(points.reshape(-1, 1, 4, 2)), ids, rejected
+
+
+def detector_options_from(cfg: Config) -> DetectorOptions | None:
+    '''
+    Returns the detector options configured in the tracker section.
+
+    Args:
+        cfg: Configuration data.
+
+    Returns:
+        The pyramid mode options or None if pyramid mode is disabled.
+    '''
+    if cfg['capture']['tracker']['pyramid_scale'] <= 1:
+        return None
+
+    return DetectorOptions(
+        scale=cfg['capture']['tracker']['pyramid_scale'],
+        subpix_window=cfg['capture']['tracker']['subpix_window'],
+        subpix_iterations=cfg['capture']['tracker']['subpix_iterations']
+    )
+
+
+def init_worker(
+    dict_type: int,
+    calib_data: CharucoCalibrationData,
+    options: DetectorOptions | None = None,
+    ids: List[int] | None = None
+):
+    '''
+    Initialize the detector of a detection worker process.
+
+    Args:
+        dict_type: Unique ArUco dict identifier.
+        calib_data: Camera calibration data.
+        options: Pyramid mode options.
+        ids: Active marker IDs.
+    '''
+    global _worker_detector
+    _worker_detector = Detector(dict_type, calib_data, options, ids)
+
+
+def detect_in_worker(
+    frame: cv.Mat,
+    rois: List[Roi] | None = None
+) -> Tuple[DetectionResult, Tuple[float, float]]:
+    '''
+    Detect markers with the detector of the current worker process.
+
+    Args:
+        frame: The gray scale frame.
+        rois: Only detect markers in these regions (Default: None => Full frame).
+
+    Returns:
+        The detection result and the durations of the detection and the refinement in seconds.
+    '''
+    result = _worker_detector.detect(frame, rois)
+    return result, _worker_detector.timings
@@ -0,0 +1,168 @@
+import numpy as np
+import time
+
+from capture.geometry import batch_from
+
+from typings.capture.aruco import MarkerBatch
+
+# Variance of the initial velocity estimate of new markers in (px/s)^2
+INITIAL_VELOCITY_VARIANCE = 500.0 ** 2
+
+
+class MarkerFilter:
+    '''
+    This class describes a temporal filter of the detected markers keyed by marker ID. Each corner coordinate gets
+    filtered by a constant velocity Kalman filter. All coordinates of a marker share the same time steps and noise,
+    so one 2x2 covariance per marker is enough and all markers get filtered at once. The center positions and angles
+    are derived from the filtered corners, which keeps them consistent and avoids wrapping angles.
+
+    The filtered corners are additionally predicted forward by the latency between capture and display, so that
+    renderers draw where the markers are now instead of where they were when the frame was captured.
+    '''
+
+    def __init__(
+        self,
+        process_noise: float = 1000.0,
+        measurement_noise: float = 1.0,
+        display_latency: int = 0,
+        timeout: int = 500
+    ) -> None:
+        '''
+        Create a new marker filter.
+
+        Args:
+            process_noise: Standard deviation of the marker acceleration in px/s^2.
+            measurement_noise: Standard deviation of the detected corner positions in px.
+            display_latency: Latency between publishing a result and displaying it in milliseconds.
+            timeout: State of markers which were not detected for this long gets dropped (in milliseconds).
+        '''
+        self._display_latency = display_latency / 1000
+        self._q = process_noise ** 2
+        self._r = measurement_noise ** 2
+        self._timeout = timeout / 1000
+
+        # Filter state sorted by marker ID. Each of the 8 corner coordinates has a position and a velocity
+        self._ids = np.empty(0, dtype=np.int32)
+        self._x = np.empty((0, 8, 2))
+        self._p = np.empty((0, 2, 2))
+        self._t = np.empty(0)
+
+    def apply(self, batch: MarkerBatch, now: float | None = None) -> MarkerBatch:
+        '''
+        Update the filter with the markers of a frame and return the filtered markers. Batches have to be passed in
+        frame order.
+
+        Args:
+            batch: The detected markers.
+            now: Current time (`time.monotonic`) used to measure the latency (Default: None => Now).
+
+        Returns:
+            The filtered and predicted markers. The batch is read-only.
+        '''
+        if now == None:
+            now = time.monotonic()
+
+        t = batch.timestamp
+        n = len(batch)
+
+        # Drop markers which were not seen for too long
+        alive = t - self._t <= self._timeout
+        ids, x, p, last = self._ids[alive], self._x[alive], self._p[alive], self._t[alive]
+
+        z = batch.corners.reshape(n, 8).astype(np.float64)
+        order = np.argsort(batch.ids, kind='stable')
+        batch_ids = batch.ids[order]
+        z = z[order]
+
+        # Match detected markers with known markers
+        idx = np.searchsorted(ids, batch_ids)
+        known = idx < len(ids)
+        known[known] = ids[idx[known]] == batch_ids[known]
+
+        # Initialize new markers at the detected position without velocity
+        new_x = np.zeros((n, 8, 2))
+        new_x[:, :, 0] = z
+        new_p = np.zeros((n, 2, 2))
+        new_p[:, 0, 0] = self._r
+        new_p[:, 1, 1] = INITIAL_VELOCITY_VARIANCE
+
+        # Predict and update known markers
+        if np.any(known):
+            k_idx = idx[known]
+            kx, kp = self._predict(x[k_idx], p[k_idx], t - last[k_idx])
+            new_x[known], new_p[known] = self._update(kx, kp, z[known])
+
+        # Keep the state of undetected markers until they time out
+        missing = np.ones(len(ids), dtype=bool)
+        missing[idx[known]] = False
+
+        all_ids = np.concatenate([ids[missing], batch_ids])
+        merged = np.argsort(all_ids, kind='stable')
+        self._ids = all_ids[merged]
+        self._x = np.concatenate([x[missing], new_x])[merged]
+        self._p = np.concatenate([p[missing], new_p])[merged]
+        self._t = np.concatenate([last[missing], np.full(n, t)])[merged]
+
+        # Predict forward by the capture to display latency
+        lead = max(now - t, 0) + self._display_latency
+        corners = new_x[:, :, 0] + new_x[:, :, 1] * lead
+
+        # Restore the original marker order
+        restore = np.empty(n, dtype=np.intp)
+        restore[order] = np.arange(n)
+
+        filtered = batch_from(corners[restore].reshape(n, 1, 4, 2), batch.ids, batch.frame_no, batch.timestamp)
+        filtered.markers.flags.writeable = False
+        filtered.static = batch.static
+
+        return filtered
+
+    def _predict(self, x: np.ndarray, p: np.ndarray, dt: np.ndarray):
+        '''
+        Predict the state of markers `dt` seconds ahead.
+
+        Args:
+            x: States with shape (N, 8, 2).
+            p: Covariances with shape (N, 2, 2).
+            dt: Time steps with shape (N,).
+
+        Returns:
+            The predicted states and covariances.
+        '''
+        f = np.zeros((len(dt), 2, 2))
+        f[:, 0, 0] = 1
+        f[:, 0, 1] = dt
+        f[:, 1, 1] = 1
+
+        # Process noise of a white noise acceleration
+        q = np.empty((len(dt), 2, 2))
+        q[:, 0, 0] = dt ** 4 / 4
+        q[:, 0, 1] = q[:, 1, 0] = dt ** 3 / 2
+        q[:, 1, 1] = dt ** 2
+
+        x = x.copy()
+        x[:, :, 0] += x[:, :, 1] * dt[:, None]
+        p = f @ p @ f.transpose(0, 2, 1) + q * self._q
+
+        return x, p
+
+    def _update(self, x: np.ndarray, p: np.ndarray, z: np.ndarray):
+        '''
+        Update predicted states with measured corner positions.
+
+        Args:
+            x: Predicted states with shape (N, 8, 2).
+            p: Predicted covariances with shape (N, 2, 2).
+            z: Measured corner coordinates with shape (N, 8).
+
+        Returns:
+            The updated states and covariances.
+        '''
+        # Only the position gets measured, so the gain only depends on the first column of the covariance
+        s = p[:, 0, 0] + self._r
+        k = p[:, :, 0] / s[:, None]
+
+        x = x + k[:, None, :] * (z - x[:, :, 0])[:, :, None]
+        p = p - k[:, :, None] * p[:, 0, :][:, None, :]
+
+        return x, p
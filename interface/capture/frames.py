@@ -0,0 +1,190 @@
+from typing import List
+import threading
+import cv2 as cv
+
+
+class FrameSlot:
+    '''
+    This class describes a single buffer slot of the frame store. Each slot owns a color and a gray scale buffer which
+    get reused for later frames once no reader pins the slot anymore.
+    '''
+
+    def __init__(self) -> None:
+        self.color: cv.Mat | None = None
+        self.gray: cv.Mat | None = None
+        self.timestamp = 0.0
+        self.writing = False
+        self.pins = 0
+        self.seq = 0
+
+
+class Frame:
+    '''
+    This class describes a published frame. The frame pins its slot, so the writer does not overwrite the buffers
+    while the frame is in use. Call `release` (or use the frame as a context manager) when done. The buffers are
+    read-only, copy them before drawing into them.
+    '''
+
+    def __init__(self, store: 'FrameStore', slot: FrameSlot) -> None:
+        self._released = False
+        self._store = store
+        self._slot = slot
+
+        self.timestamp = slot.timestamp
+        self.seq = slot.seq
+
+        self.color = slot.color.view()
+        self.color.flags.writeable = False
+        self.gray = slot.gray.view()
+        self.gray.flags.writeable = False
+
+    def release(self):
+        '''
+        Release the frame. The buffers must not be used afterwards.
+        '''
+        if self._released:
+            return
+
+        self._released = True
+        self._store._unpin(self._slot)
+
+    def __enter__(self) -> 'Frame':
+        return self
+
+    def __exit__(self, *_):
+        self.release()
+
+
+class FrameStore:
+    '''
+    This class describes a multi-buffered frame store. The capture thread writes the next frame into a back slot while
+    readers access the front slot. Publishing a frame only swaps the front slot and increments the sequence number,
+    so checking for new frames is O(1). Slots pinned by readers are never written; if all back slots are pinned, an
+    additional slot is allocated.
+    '''
+
+    def __init__(self, slots: int = 3) -> None:
+        '''
+        Create a new frame store.
+
+        Args:
+            slots: Initial number of slots (Default: 3 => Triple buffering).
+        '''
+        self._slots: List[FrameSlot] = [FrameSlot() for _ in range(max(slots, 2))]
+        self._cond = threading.Condition()
+        self._front: FrameSlot | None = None
+        self._closed = False
+        self._seq = 0
+
+    def begin_write(self) -> FrameSlot:
+        '''
+        Returns a slot the writer can write the next frame into. The slot is neither the front slot nor pinned by any
+        reader. Write the color frame into `slot.color` and the gray scale frame into `slot.gray`, then call `commit`.
+
+        Returns:
+            The back slot.
+        '''
+        with self._cond:
+            for slot in self._slots:
+                if slot is not self._front and slot.pins == 0 and not slot.writing:
+                    slot.writing = True
+                    return slot
+
+            slot = FrameSlot()
+            slot.writing = True
+            self._slots.append(slot)
+            return slot
+
+    def commit(self, slot: FrameSlot, timestamp: float) -> int:
+        '''
+        Publish the written slot as the newest frame.
+
+        Args:
+            slot: The slot returned by `begin_write`.
+            timestamp: Capture timestamp (`time.monotonic`).
+
+        Returns:
+            The sequence number of the published frame.
+        '''
+        with self._cond:
+            self._seq += 1
+            slot.timestamp = timestamp
+            slot.writing = False
+            slot.seq = self._seq
+
+            self._front = slot
+            self._cond.notify_all()
+
+            return self._seq
+
+    def abort(self, slot: FrameSlot):
+        '''
+        Return a slot without publishing it, e.g. when the frame could not be read.
+
+        Args:
+            slot: The slot returned by `begin_write`.
+        '''
+        with self._cond:
+            slot.writing = False
+
+    def seq(self) -> int:
+        '''
+        Returns the sequence number of the newest frame. 0 if no frame was published yet.
+
+        Returns:
+            The sequence number.
+        '''
+        return self._seq
+
+    def latest(self) -> Frame | None:
+        '''
+        Returns the newest frame. The frame has to be released after use.
+
+        Returns:
+            The pinned frame or None if no frame was published yet.
+        '''
+        with self._cond:
+            if self._front == None:
+                return None
+
+            self._front.pins += 1
+            return Frame(self, self._front)
+
+    def wait_newer(self, seq: int, timeout: float | None = None) -> Frame | None:
+        '''
+        Wait for a frame newer than `seq`. The frame has to be released after use.
+
+        Args:
+            seq: The sequence number of the last seen frame.
+            timeout: Maximum time to wait in seconds (Default: None => Unlimited).
+
+        Returns:
+            The pinned frame or None if the timeout expired or the store was closed.
+        '''
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._seq > seq or self._closed, timeout):
+                return None
+
+            if self._front == None or self._seq <= seq:
+                return None
+
+            self._front.pins += 1
+            return Frame(self, self._front)
+
+    def close(self):
+        '''
+        Close the store. This wakes up all waiting readers.
+        '''
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def _unpin(self, slot: FrameSlot):
+        '''
+        Unpin a slot pinned by a frame.
+
+        Args:
+            slot: The slot to unpin.
+        '''
+        with self._cond:
+            slot.pins -= 1
@@ -26,6 +26,28 @@ class Generator:
         self._path = cfg['capture']['path']
         self._type = t
 
+    def draw(self, id: int, res: int) -> cv.Mat:
+        '''
+        Draw a single ArUco marker.
+
+        Args:
+            id: The marker ID.
+            res: Resolution of the marker in pixels (e.g. 300x300).
+
+        Returns:
+            The gray scale marker image.
+        '''
+        # Create a X by Y sized empty 2D array to write the marker to
+        marker = np.zeros((res, res, 1), dtype='uint8')
+
+        # Draw the marker in the above created array. The arguments are:
+        # - The selected ArUco dict
+        # - The marker name (ID)
+        # - The resolution, e.g. 300 x 300 pixels
+        # - The array to write the marker into
+        # - The number of border bits
+        return cv.aruco.drawMarker(self._dict, id, res, marker, 1)
+
     def generate(self, number: int, res: int) -> Error:
         '''
         Generate a variable number of ArUco markers.
@@ -56,16 +78,7 @@ class Generator:
         for i in range(0, number):
             marker_name = 'marker-{:02d}.png'.format(i)
 
-            # Create a X by Y sized empty 2D array to write the marker to
-            marker = np.zeros((res, res, 1), dtype='uint8')
-
-            # Draw the marker in the above created array. The arguments are:
-            # - The selected ArUco dict
-            # - The marker name (ID)
-            # - The resolution, e.g. 300 x 300 pixels
-            # - The array to write the marker into
-            # - The number of border bits
-            cv.aruco.drawMarker(self._dict, i, res, marker, 1)
+            marker = self.draw(i, res)
 
             # Construct file path and save
             marker_path = os.path.join(path, marker_name)
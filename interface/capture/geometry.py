@@ -0,0 +1,42 @@
+import numpy as np
+
+from typings.capture.aruco import MARKER_DTYPE, CornerList, IDList, MarkerBatch
+
+
+def batch_from(corner_list: CornerList, ids: IDList, frame_no: int = 0, timestamp: float = 0.0) -> MarkerBatch:
+    '''
+    This function transforms the list of corners and the list of IDs returned by the ArUco detection into a marker
+    batch. All values get calculated at once for all markers:
+
+    - The center position is the midpoint between the top-left and bottom-right corner.
+    - The angle gets calculated by taking the vector between the center position and the top-left corner. The unit
+      vector then can be used to calculate the angle by using arcsin.
+
+    Args:
+        corner_list: A list of corners, each with shape (1, 4, 2).
+        ids: A list of IDs with shape (N, 1).
+        frame_no: Frame number.
+        timestamp: Capture timestamp.
+
+    Returns:
+        The marker batch.
+    '''
+    n = len(corner_list)
+    markers = np.empty(n, dtype=MARKER_DTYPE)
+    if n == 0:
+        return MarkerBatch(markers, frame_no, timestamp)
+
+    corners = np.asarray(corner_list, dtype=np.float32).reshape(n, 4, 2)
+    centers = (corners[:, 0] + corners[:, 2]) / 2
+
+    # Vec from center to top left corner and its length
+    vec = centers - corners[:, 0]
+    length = np.hypot(vec[:, 0], vec[:, 1])
+    sin = np.divide(vec[:, 1], length, out=np.zeros_like(length), where=length > 0)
+
+    markers['id'] = np.asarray(ids).reshape(n)
+    markers['corners'] = corners
+    markers['center'] = centers
+    markers['angle'] = np.degrees(np.arcsin(sin))
+
+    return MarkerBatch(markers, frame_no, timestamp)
@@ -0,0 +1,66 @@
+import cv2 as cv
+import time
+
+
+class MotionGate:
+    '''
+    This class describes a cheap change detector which decides if a frame needs to be detected at all. Each frame gets
+    downscaled heavily and compared to the last frame which passed the gate. Comparing against this reference instead
+    of the previous frame also catches slow motion which accumulates over multiple frames.
+    '''
+
+    def __init__(self, threshold: float, idle_after: float, idle_fps: int, scale: int = 16) -> None:
+        '''
+        Create a new motion gate.
+
+        Args:
+            threshold: Minimum change of a downscaled pixel (gray levels) which counts as motion.
+            idle_after: Seconds without motion after which the gate reports idle.
+            idle_fps: Frame rate while idle.
+            scale: Downscale factor of the compared frames.
+        '''
+        self._idle_interval = 1 / idle_fps
+        self._idle_after = idle_after
+        self._threshold = threshold
+        self._scale = scale
+
+        self._last_motion = time.monotonic()
+        self._reference = None
+
+    def moved(self, gray: cv.Mat) -> bool:
+        '''
+        Returns if the frame changed compared to the last frame which passed the gate. Frames which changed become the
+        new reference.
+
+        Args:
+            gray: The gray scale frame.
+
+        Returns:
+            If anything moved.
+        '''
+        height, width = gray.shape[:2]
+        small = cv.resize(
+            gray,
+            (max(width // self._scale, 1), max(height // self._scale, 1)),
+            interpolation=cv.INTER_AREA
+        )
+
+        if self._reference is not None and cv.absdiff(small, self._reference).max() <= self._threshold:
+            return False
+
+        self._last_motion = time.monotonic()
+        self._reference = small
+        return True
+
+    def idle_delay(self) -> float:
+        '''
+        Returns how long the capture stage should pause before reading the next frame. This steps down the frame rate
+        after a period without motion.
+
+        Returns:
+            The delay in seconds. 0 if not idle.
+        '''
+        if time.monotonic() - self._last_motion < self._idle_after:
+            return 0
+
+        return self._idle_interval
@@ -0,0 +1,234 @@
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, List, Tuple
+import multiprocessing
+import numpy as np
+import cv2 as cv
+import time
+import os
+
+from capture.detection import detect_in_worker, detector_options_from, init_worker
+from capture.geometry import batch_from
+from capture.recording import RecordingWriter
+from config.config import Config
+import capture.aruco as aruco
+
+from typings.capture.calibration import CharucoCalibrationData
+from typings.capture.offline import ChunkResult, OfflineStats
+from typings.error import Err, Error, Ok, Result
+
+# Chunks per worker. More chunks than workers keep all workers busy when chunks take different amounts of time
+CHUNKS_PER_WORKER = 4
+
+# Frame rate used for the timestamps if neither the video nor the config provide one
+DEFAULT_FPS = 30
+
+# Minimum number of frames per chunk, seeking costs up to one keyframe interval of decoding
+MIN_CHUNK_FRAMES = 30
+
+
+def split_chunks(frames: int, workers: int) -> List[Tuple[int, int]]:
+    '''
+    Split the frames of a video into consecutive chunks. The last chunk is open-ended, because the frame count stored
+    in video containers is only an estimate.
+
+    Args:
+        frames: Estimated number of frames.
+        workers: Number of worker processes.
+
+    Returns:
+        The start and end frame index of each chunk. The end of the last chunk is -1 => Until the end of the video.
+    '''
+    size = max(-(-frames // (workers * CHUNKS_PER_WORKER)), MIN_CHUNK_FRAMES)
+    starts = list(range(0, max(frames, 1), size))
+
+    chunks = [(start, start + size) for start in starts]
+    chunks[-1] = (chunks[-1][0], -1)
+
+    return chunks
+
+
+def _seek(cap: cv.VideoCapture, index: int) -> bool:
+    '''
+    Seek to a frame. The backend decodes from the preceding keyframe. Backends which can't seek precisely get
+    rewound and decode all frames up to `index`.
+    '''
+    if index == 0:
+        return True
+
+    cap.set(cv.CAP_PROP_POS_FRAMES, index)
+    if int(cap.get(cv.CAP_PROP_POS_FRAMES)) == index:
+        return True
+
+    cap.set(cv.CAP_PROP_POS_FRAMES, 0)
+    for _ in range(index):
+        if not cap.grab():
+            return False
+
+    return True
+
+
+def track_chunk(path: str, start: int, end: int) -> ChunkResult:
+    '''
+    Detect the markers of a chunk of frames. This runs in the worker processes, which have to be initialized with
+    `init_worker`.
+
+    Args:
+        path: Path of the video file.
+        start: Index of the first frame.
+        end: Index after the last frame (-1 => Until the end of the video).
+
+    Returns:
+        The detected corners and IDs of each frame. `error` is set if the video couldn't be opened or seeked.
+    '''
+    cap = cv.VideoCapture(path)
+    result = ChunkResult(start=start, corners=[], ids=[], detect_time=0.0, error=None)
+
+    if not cap.isOpened():
+        result['error'] = Error(f'Failed to open video file \'{path}\'')
+    elif not _seek(cap, start):
+        result['error'] = Error(f'Failed to seek to frame {start}')
+
+    if result['error'] != None:
+        cap.release()
+        return result
+
+    frame, gray = None, None
+    index = start
+
+    while end < 0 or index < end:
+        ok, frame = cap.read(frame)
+        if not ok:
+            break
+
+        gray = cv.cvtColor(frame, cv.COLOR_BGR2GRAY, gray)
+
+        (corners, ids, _, _), timings = detect_in_worker(gray)
+        result['detect_time'] += timings[0] + timings[1]
+
+        n = len(corners)
+        result['corners'].append(np.asarray(corners, dtype=np.float32).reshape(n, 4, 2))
+        result['ids'].append(np.asarray(ids, dtype=np.int32).reshape(n) if n > 0 else np.empty(0, dtype=np.int32))
+        index += 1
+
+    cap.release()
+    return result
+
+
+def track_offline(
+    cfg: Config,
+    calib_data: CharucoCalibrationData,
+    path: str,
+    output: str,
+    workers: int = 0,
+    progress: Callable[[int, int, int], None] | None = None
+) -> Result[OfflineStats, Error]:
+    '''
+    Track the markers of a recorded video as fast as possible and write them as recording. The video gets split into
+    chunks which are decoded and detected in parallel worker processes. The chunk results are merged in order, so the
+    recording is the same as the one of a single process. Frame numbers start at 1 and timestamps are the seconds
+    since the start of the video.
+
+    Like the live pipeline, the workers run the detection and the refinement of `Detector`. The motion gate and the
+    marker filter are skipped, they depend on the previous frames of the chunk and would make the results depend on
+    the chunk boundaries.
+
+    The run fails if a chunk can't be opened or seeked, or if frames are missing between two chunks. Only the frames
+    after the actual end of the video may be missing, the frame count of the container is only an estimate.
+
+    Args:
+        cfg: Configuration data.
+        calib_data: Camera calibration data.
+        path: Path of the video file.
+        output: Path of the recording file.
+        workers: Number of worker processes (Default: 0 => Number of CPUs).
+        progress: Called with the number of finished chunks, the number of chunks and the number of tracked frames
+            after each chunk.
+
+    Returns:
+        The stats of the run or an Error.
+    '''
+    if not os.path.isfile(path):
+        return Err(Error(f'Video file \'{path}\' not found'))
+
+    cap = cv.VideoCapture(path)
+    if not cap.isOpened():
+        return Err(Error(f'Failed to open video file \'{path}\''))
+
+    frames = int(cap.get(cv.CAP_PROP_FRAME_COUNT))
+    width = int(cap.get(cv.CAP_PROP_FRAME_WIDTH))
+    height = int(cap.get(cv.CAP_PROP_FRAME_HEIGHT))
+
+    # Prefer the frame rate stored in the video container
+    fps = cap.get(cv.CAP_PROP_FPS) or cfg['capture']['fps'] or DEFAULT_FPS
+    cap.release()
+
+    typ = aruco.type_from(cfg['capture']['aruco']['size'], cfg['capture']['aruco']['uniques'])
+    dict_type, _ = aruco.dict_from(typ)
+
+    workers = workers or os.cpu_count() or 1
+    chunks = split_chunks(frames, workers)
+
+    writer = RecordingWriter(output)
+    writer.width, writer.height = width, height
+    err = writer.open()
+    if err != None:
+        return Err(err)
+
+    stats = OfflineStats(frames=0, markers=0, chunks=len(chunks), workers=workers, elapsed=0.0, detect_time=0.0)
+    start = time.perf_counter()
+
+    # Use spawn to not fork the (multi-threaded) parent process
+    with ProcessPoolExecutor(
+        workers,
+        multiprocessing.get_context('spawn'),
+        init_worker,
+        (dict_type, calib_data, detector_options_from(cfg), cfg['capture']['aruco']['ids'])
+    ) as pool:
+        futures = [pool.submit(track_chunk, path, first, end) for first, end in chunks]
+
+        # Index of the next frame to append and if a chunk stopped before its end => The end of the video
+        next_index, video_ended = 0, False
+
+        # Merge the chunks in order, later chunks are kept by their futures until it's their turn
+        for i, future in enumerate(futures):
+            chunk = future.result()
+            stats['detect_time'] += chunk['detect_time']
+
+            # Chunks after the end of the video are expected to fail seeking or to be empty
+            err = chunk['error'] if not video_ended else None
+            if err == None and len(chunk['corners']) > 0 and chunk['start'] != next_index:
+                err = Error(f'Frames {next_index} to {chunk["start"] - 1} could not be decoded')
+
+            for n, (corners, ids) in enumerate(zip(chunk['corners'], chunk['ids'])):
+                if err != None:
+                    break
+
+                index = chunk['start'] + n
+                batch = batch_from(tuple(corners), ids.reshape(-1, 1), index + 1, index / fps)
+
+                err = writer.append(batch)
+                if err == None:
+                    stats['frames'] += 1
+                    stats['markers'] += len(ids)
+
+            if err != None:
+                for f in futures:
+                    f.cancel()
+                writer.close()
+                return Err(err)
+
+            if len(chunk['corners']) > 0:
+                next_index = chunk['start'] + len(chunk['corners'])
+
+            _, end = chunks[i]
+            video_ended = video_ended or (end >= 0 and next_index < end)
+
+            if progress != None:
+                progress(i + 1, len(chunks), stats['frames'])
+
+    err = writer.close()
+    if err != None:
+        return Err(err)
+
+    stats['elapsed'] = time.perf_counter() - start
+    return Ok(stats)
@@ -0,0 +1,388 @@
+from concurrent.futures import ProcessPoolExecutor
+from queue import Empty, Full, Queue
+from typing import List, Tuple
+import multiprocessing
+import threading
+import heapq
+import time
+
+from capture.detection import Detector, detect_in_worker, init_worker
+from capture.frames import Frame
+from capture.roi import RoiPredictor
+from utils.stats import Stages
+import utils.trace as trace
+
+from typings.capture.pipeline import DropPolicy, EmitFunc, ResultFunc, WorkerMode
+from typings.capture.calibration import CharucoCalibrationData
+from typings.capture.detection import DetectorOptions
+from typings.capture.aruco import DetectionResult
+from typings.error import Error
+
+
+class Resequencer:
+    '''
+    This class re-orders detection results which were finished out of order by multiple workers. Results are emitted
+    in the order in which the frames were dispatched to the workers.
+    '''
+
+    def __init__(self, on_result: EmitFunc) -> None:
+        self._pending: List[Tuple[int, int, float, DetectionResult | None, List[int] | None]] = []
+        self._lock = threading.Lock()
+        self._on_result = on_result
+        self._next = 0
+
+    def emitted(self) -> int:
+        '''
+        Returns the number of results which were passed on (or skipped) so far.
+
+        Returns:
+            Number of emitted results.
+        '''
+        with self._lock:
+            return self._next
+
+    def push(
+        self,
+        seq: int,
+        frame_no: int,
+        timestamp: float,
+        result: DetectionResult | None,
+        expected: List[int] | None = None
+    ):
+        '''
+        Push a finished result. A `None` result marks a frame which was dropped by a worker and only advances the
+        sequence.
+
+        Args:
+            seq: Dispatch sequence number.
+            frame_no: Frame number.
+            timestamp: Capture timestamp.
+            result: The detection result or None.
+            expected: The marker IDs expected by an ROI detection (Default: None => Full frame scan).
+        '''
+        with self._lock:
+            heapq.heappush(self._pending, (seq, frame_no, timestamp, result, expected))
+
+            # Emit all results which are next in line
+            while len(self._pending) > 0 and self._pending[0][0] == self._next:
+                _, frame_no, timestamp, result, expected = heapq.heappop(self._pending)
+                self._next += 1
+
+                if result != None:
+                    self._on_result(frame_no, timestamp, result, expected)
+
+
+class DetectionPipeline:
+    '''
+    This class describes a pipelined marker detection. The capture stage submits frames, which get processed by
+    multiple detection workers. Workers run either as threads or hand the detection off to worker processes to scale
+    without the GIL. Finished results get re-sequenced by frame number before they are passed on. With an ROI
+    predictor, workers only scan the predicted marker regions and fall back to full frame scans periodically or when a
+    marker got lost.
+    '''
+
+    def __init__(
+        self,
+        dict_type: int,
+        calib_data: CharucoCalibrationData,
+        on_result: ResultFunc,
+        workers: int = 1,
+        mode: WorkerMode = WorkerMode.THREAD,
+        policy: DropPolicy = DropPolicy.LATEST,
+        max_frame_age: int = 0,
+        predictor: RoiPredictor | None = None,
+        options: DetectorOptions | None = None,
+        ids: List[int] | None = None,
+        stages: Stages | None = None
+    ) -> None:
+        '''
+        Create a new detection pipeline.
+
+        Args:
+            dict_type: Unique ArUco dict identifier.
+            calib_data: Camera calibration data.
+            on_result: Callback which receives re-sequenced results.
+            workers: Number of detection workers.
+            mode: If workers detect in threads or processes.
+            policy: LATEST only keeps the newest frame, NONE queues every frame and blocks the capture stage.
+            max_frame_age: Frames older than this (in milliseconds) are dropped by workers (Default: 0 => Disabled).
+            predictor: Predicts marker regions for ROI detection (Default: None => Always scan the full frame).
+            options: Pyramid mode options of the detectors (Default: None => Detect on full resolution frames).
+            ids: Active marker IDs (Default: None => All IDs of the dictionary).
+            stages: Records the durations of the queue, detect and refine stages (Default: None => Disabled).
+        '''
+        self._resequencer = Resequencer(self._emit)
+        self._on_result = on_result
+        self._predictor = predictor
+        self._max_frame_age = max_frame_age / 1000
+        self._calib = calib_data
+        self._dict_type = dict_type
+        self._options = options
+        self._stages = stages
+        self._ids = ids
+        self._workers = workers
+        self._policy = policy
+        self._mode = mode
+
+        # Newest frame slot used by the LATEST policy
+        self._cond = threading.Condition()
+        self._slot: Frame | None = None
+
+        # Frame queue used by the NONE policy, frames are queued with their dispatch sequence number
+        self._queue: Queue = Queue(workers * 2)
+
+        # The dispatch sequence is shared by all workers and protected by the condition lock
+        self._seq = 0
+
+        # Counters
+        self.dropped_frames = 0
+        self.stale_frames = 0
+        self.detect_errors = 0
+        self.refinements = 0
+        self.refine_skips = 0
+        self.recovered_markers = 0
+
+        # Misc
+        self._threads: List[threading.Thread] = []
+        self._pool: ProcessPoolExecutor | None = None
+        self._error: Error | None = None
+        self._running = False
+
+    def start(self):
+        '''
+        Start the detection workers.
+        '''
+        if self._running:
+            return
+
+        self._running = True
+
+        if self._mode == WorkerMode.PROCESS:
+            # Use spawn to not fork the (multi-threaded) parent process
+            self._pool = ProcessPoolExecutor(
+                self._workers,
+                multiprocessing.get_context('spawn'),
+                init_worker,
+                (self._dict_type, self._calib, self._options, self._ids)
+            )
+
+        for i in range(self._workers):
+            t = threading.Thread(None, self._work, f'detection-worker-{i}')
+            self._threads.append(t)
+            t.start()
+
+    def stop(self, drain: bool = False) -> Error:
+        '''
+        Stop the detection workers and wait until they terminate.
+
+        Args:
+            drain: If all submitted frames should be processed before stopping.
+
+        Returns:
+            The first error raised while detecting or handling a result, None otherwise.
+        '''
+        if not self._running:
+            return self._error
+
+        # Workers which died can't process the remaining frames
+        while drain and not self._is_idle() and any(t.is_alive() for t in self._threads):
+            time.sleep(0.005)
+
+        self._running = False
+        with self._cond:
+            self._cond.notify_all()
+
+        for t in self._threads:
+            t.join()
+
+        self._threads = []
+
+        # Release frames which were never taken by a worker
+        if self._slot != None:
+            self._slot.release()
+            self._slot = None
+
+        while not self._queue.empty():
+            self._queue.get_nowait()[1].release()
+
+        if self._pool != None:
+            self._pool.shutdown(cancel_futures=True)
+            self._pool = None
+
+        return self._error
+
+    def error(self) -> Error:
+        '''
+        Returns the first error raised while detecting or handling a result, None if there was none. Failed frames
+        are counted in `detect_errors`.
+        '''
+        return self._error
+
+    def _fail(self, e: Exception, stage: str):
+        '''
+        Count a failed frame and keep the first error.
+        '''
+        self.detect_errors += 1
+        if self._error == None:
+            self._error = Error(f'{stage} failed: {type(e).__name__}: {e}')
+
+    def _is_idle(self) -> bool:
+        '''
+        Returns if all submitted frames were processed and emitted.
+
+        Returns:
+            If the pipeline is idle.
+        '''
+        with self._cond:
+            return self._slot == None and self._queue.empty() and self._resequencer.emitted() == self._seq
+
+    def submit(self, frame: Frame):
+        '''
+        Submit a pinned frame for detection. The pipeline releases the frame once it was processed or dropped. With
+        the LATEST policy an unprocessed older frame gets replaced. With the NONE policy this blocks until a worker is
+        ready.
+
+        Args:
+            frame: The pinned frame.
+        '''
+        if self._policy == DropPolicy.LATEST:
+            with self._cond:
+                if self._slot != None:
+                    self._slot.release()
+                    self.dropped_frames += 1
+
+                self._slot = frame
+                self._cond.notify()
+            return
+
+        # Only the capture stage submits, so frames are queued in sequence order
+        while self._running:
+            try:
+                self._queue.put((self._seq, frame), timeout=0.1)
+                with self._cond:
+                    self._seq += 1
+                return
+            except Full:
+                continue
+
+        frame.release()
+
+    def _emit(self, frame_no: int, timestamp: float, result: DetectionResult, expected: List[int] | None):
+        '''
+        Receive re-sequenced results, update the counters and the ROI prediction and pass the results on.
+
+        Args:
+            frame_no: Frame number.
+            timestamp: Capture timestamp.
+            result: The detection result.
+            expected: The marker IDs expected by an ROI detection or None after a full frame scan.
+        '''
+        # Errors must not escape, the re-sequencing has to go on and the worker thread has to keep running
+        try:
+            # Keep track how often the refinement runs and how many markers it recovers
+            if result[3] is None:
+                self.refine_skips += 1
+            else:
+                self.refinements += 1
+                self.recovered_markers += len(result[3])
+
+            if self._predictor != None:
+                self._predictor.update(frame_no, result, expected)
+
+            self._on_result(frame_no, timestamp, result)
+        except Exception as e:
+            self._fail(e, 'Result handling')
+
+    def _take(self) -> Tuple[int, Frame] | None:
+        '''
+        Take the next frame and assign a dispatch sequence number to it.
+
+        Returns:
+            A tuple of sequence number and frame or None if the pipeline stopped.
+        '''
+        if self._policy == DropPolicy.LATEST:
+            with self._cond:
+                while self._running and self._slot == None:
+                    self._cond.wait()
+
+                if not self._running:
+                    return None
+
+                frame = self._slot
+                self._slot = None
+
+                seq = self._seq
+                self._seq += 1
+
+            return seq, frame
+
+        while self._running:
+            try:
+                # The sequence number was assigned when the frame got queued
+                return self._queue.get(timeout=0.1)
+            except Empty:
+                continue
+
+        return None
+
+    def _work(self):
+        '''
+        Run a detection worker loop.
+        '''
+        detector = None
+        if self._mode == WorkerMode.THREAD:
+            detector = Detector(self._dict_type, self._calib, self._options, self._ids)
+
+        while self._running:
+            item = self._take()
+            if item == None:
+                break
+
+            seq, frame = item
+            waited = time.monotonic() - frame.timestamp
+            taken = time.perf_counter()
+            if self._stages != None:
+                self._stages.observe('queue', waited)
+            trace.complete('queue', taken - waited, taken, 'tracker')
+
+            # Drop frames which are already too old to be useful
+            if self._max_frame_age > 0 and time.monotonic() - frame.timestamp > self._max_frame_age:
+                self.stale_frames += 1
+                frame.release()
+                self._resequencer.push(seq, frame.seq, frame.timestamp, None)
+                continue
+
+            result, expected = None, None
+            try:
+                # Plan which regions of the frame get scanned
+                rois = None
+                if self._predictor != None:
+                    height, width = frame.gray.shape[:2]
+                    plan = self._predictor.plan(frame.seq, width, height)
+                    if plan != None:
+                        rois, expected = plan
+
+                if detector != None:
+                    result = detector.detect(frame.gray, rois)
+                    timings = detector.timings
+                else:
+                    result, timings = self._pool.submit(detect_in_worker, frame.gray, rois).result()
+
+                # Detection and refinement ran back to back and just finished
+                detected = time.perf_counter() - timings[1]
+                refined = result[3] is not None
+                trace.complete('detect', detected - timings[0], detected, 'tracker')
+                if refined:
+                    trace.complete('refine', detected, detected + timings[1], 'tracker')
+
+                if self._stages != None:
+                    self._stages.observe('detect', timings[0])
+                    if refined:
+                        self._stages.observe('refine', timings[1])
+            except Exception as e:
+                # The sequence has to advance even if the detection failed
+                result = None
+                self._fail(e, 'Detection')
+
+            frame.release()
+            self._resequencer.push(seq, frame.seq, frame.timestamp, result, expected)
@@ -0,0 +1,183 @@
+from typing import Dict, Tuple
+import threading
+import asyncio
+
+from capture.stream import AsyncSubscriptionQueue, MarkerStream
+from capture.subscription import SubscriptionQueue
+from capture.result import TrackingResult
+
+from typings.capture.aruco import DetectionResult, MarkerBatch, RawSubscription, Subscriber, Subscription
+from typings.capture.subscription import SubscriptionMode, SubscriptionStats
+from typings.error import Err, Error
+
+
+class Publisher:
+    '''
+    This is the base class of everything consumers can subscribe to for tracking results, e.g. the tracker. It
+    manages the subscribers and fans out tracking results to them.
+    '''
+
+    def __init__(self) -> None:
+        self._subscribers: Dict[int, Subscriber] = {}
+        self._subscribers_lock = threading.Lock()
+        self._next_subscription_id = 0
+
+        # Dimensions
+        self._frame_height = 0
+        self._frame_width = 0
+
+    def frame_size(self) -> Tuple[int, int]:
+        '''
+        Returns the frame width and height. Both are 0 until the frame source was opened.
+
+        Returns:
+            The frame width and height.
+        '''
+        return self._frame_width, self._frame_height
+
+    def notify(self, result: TrackingResult):
+        '''
+        Notify subscribers with detected markers. Every subscriber receives the same result instance, so the cost
+        only depends on the number of subscribers. Each subscriber extracts its view (raw or batch) on retrieval.
+
+        Args:
+            result: The tracking result of a frame.
+        '''
+        for _, q in self._subscribers.values():
+            q.put(result)
+
+    def _add_subscriber(
+        self,
+        raw: bool,
+        size: int,
+        mode: SubscriptionMode,
+        q: SubscriptionQueue | None = None
+    ) -> Tuple[int, SubscriptionQueue]:
+        '''
+        Add a new subscriber. The subscriber dict gets replaced instead of modified, so `notify` can iterate over it
+        without holding a lock.
+
+        Args:
+            raw: If the subscriber receives raw tracking data.
+            size: Size of the queue.
+            mode: The subscription mode.
+            q: The queue of the subscriber (Default: None => A new queue with `mode` and `size`).
+
+        Returns:
+            The subscription ID and queue.
+        '''
+        if q == None:
+            q = SubscriptionQueue(mode, size)
+
+        with self._subscribers_lock:
+            id = self._next_subscription_id
+            self._next_subscription_id += 1
+
+            subscribers = dict(self._subscribers)
+            subscribers[id] = (raw, q)
+            self._subscribers = subscribers
+
+        return id, q
+
+    def subscribe(self, size: int = 1, mode: SubscriptionMode = SubscriptionMode.LATEST) -> Subscription:
+        '''
+        External consumers can subscribe to this publisher to get real-time marker positions.
+
+        Args:
+            size: Size of the queue (Ignored in LATEST mode).
+            mode: The subscription mode (Default: LATEST => Only the newest marker batch is kept).
+
+        Returns:
+            subscription: A tuple consisting of the subscription ID, frame widht and height and the retrieve function.
+        '''
+        id, q = self._add_subscriber(False, size, mode)
+
+        def retrieve(block: bool = True, timeout: float | None = None) -> MarkerBatch:
+            return q.get(block, timeout).batch
+
+        return id, (self._frame_width, self._frame_height), retrieve
+
+    def subscribe_raw(self, size: int = 1, mode: SubscriptionMode = SubscriptionMode.LATEST) -> RawSubscription:
+        '''
+        External consumers can subscribe to this publisher to get real-time marker positions. This returns raw tracking
+        data instead of cleaned data via the `subscribe` method.
+
+        Args:
+            size: Size of the queue (Ignored in LATEST mode).
+            mode: The subscription mode (Default: LATEST => Only the newest result is kept).
+
+        Returns:
+            subscription: A tuple consisting of the subscription ID, frame widht and height and the retrieve function.
+        '''
+        id, q = self._add_subscriber(True, size, mode)
+
+        def retrieve(block: bool = True, timeout: float | None = None) -> DetectionResult:
+            return q.get(block, timeout).raw
+
+        return id, (self._frame_width, self._frame_height), retrieve
+
+    def stream(self, size: int = 1, mode: SubscriptionMode = SubscriptionMode.LATEST) -> MarkerStream:
+        '''
+        External consumers running an asyncio event loop can stream real-time marker positions with
+        `async for batch in publisher.stream()`. This has to be called from a coroutine. The stream is bound to the
+        running event loop, which gets woken up by the tracking thread for new batches instead of polling.
+
+        Args:
+            size: Size of the queue (Ignored in LATEST mode).
+            mode: The subscription mode (Default: LATEST => Only the newest marker batch is kept).
+
+        Returns:
+            The marker stream. Close it (or cancel the consuming task) to unsubscribe.
+        '''
+        q = AsyncSubscriptionQueue(asyncio.get_running_loop(), mode, size)
+        id, _ = self._add_subscriber(False, size, mode, q)
+
+        return MarkerStream(q, lambda result: result.batch, lambda: self.unsubscribe(id))
+
+    def stream_raw(self, size: int = 1, mode: SubscriptionMode = SubscriptionMode.LATEST) -> MarkerStream:
+        '''
+        External consumers running an asyncio event loop can stream raw tracking data with
+        `async for raw in publisher.stream_raw()`. See `stream`.
+
+        Args:
+            size: Size of the queue (Ignored in LATEST mode).
+            mode: The subscription mode (Default: LATEST => Only the newest result is kept).
+
+        Returns:
+            The raw stream. Close it (or cancel the consuming task) to unsubscribe.
+        '''
+        q = AsyncSubscriptionQueue(asyncio.get_running_loop(), mode, size)
+        id, _ = self._add_subscriber(True, size, mode, q)
+
+        return MarkerStream(q, lambda result: result.raw, lambda: self.unsubscribe(id))
+
+    def unsubscribe(self, id: int) -> Error:
+        '''
+        External subscribers can unsubscribe from this publisher.
+
+        Args:
+            id: The subscription ID.
+
+        Returns:
+            Non None if an error occured.
+        '''
+        with self._subscribers_lock:
+            if not id in self._subscribers.keys():
+                return Err('Invalid subscription ID')
+
+            subscribers = dict(self._subscribers)
+            _, q = subscribers.pop(id)
+            self._subscribers = subscribers
+
+        # Release the notifying thread if it is blocked by this subscriber
+        q.close()
+        return None
+
+    def subscription_stats(self) -> Dict[int, SubscriptionStats]:
+        '''
+        Returns a snapshot of the drop and lag counters of each subscriber.
+
+        Returns:
+            The subscription stats by subscription ID.
+        '''
+        return {id: sub[1].stats() for id, sub in self._subscribers.items()}
@@ -0,0 +1,527 @@
+from typing import BinaryIO, Dict, List, Tuple
+from queue import Empty
+import numpy as np
+import threading
+import math
+import os
+
+from capture.geometry import batch_from
+from capture.publisher import Publisher
+
+from typings.capture.subscription import SubscriptionMode
+from typings.capture.aruco import MarkerBatch
+from typings.error import Err, Error, Ok, Result
+
+# A recording starts with the file header, followed by chunks of frames. Closed recordings end with the index and the
+# footer. All sections and columns are aligned to 8 bytes, so the columns can be used directly as memory-mapped arrays.
+FILE_MAGIC = b'MKRLOG01'
+CHUNK_MAGIC = b'MKRCHUNK'
+INDEX_MAGIC = b'MKRINDEX'
+
+FILE_HEADER_DTYPE = np.dtype([
+    ('magic', 'S8'),
+    ('chunk_frames', np.uint32),
+    ('corner_scale', np.uint32),
+])
+
+CHUNK_HEADER_DTYPE = np.dtype([
+    ('magic', 'S8'),
+    ('frames', np.uint32),
+    ('markers', np.uint32),
+])
+
+FOOTER_DTYPE = np.dtype([
+    ('chunks', np.uint64),
+    ('seconds', np.uint64),
+    ('width', np.uint32),
+    ('height', np.uint32),
+    ('index_offset', np.uint64),
+    ('magic', 'S8'),
+])
+
+# Corners are stored as fixed point numbers with 1/8 pixel resolution. This covers frames up to 4096 pixels
+CORNER_SCALE = 8
+
+# Number of frames per chunk
+DEFAULT_CHUNK_FRAMES = 1024
+
+
+def _align(n: int) -> int:
+    '''
+    Round `n` up to a multiple of 8.
+    '''
+    return (n + 7) & ~7
+
+
+def _chunk_layout(frames: int, markers: int) -> Tuple[Dict[str, Tuple[int, np.dtype, tuple]], int]:
+    '''
+    Returns the offset, dtype and shape of each column of a chunk relative to the start of the chunk and the total
+    size of the chunk in bytes.
+    '''
+    columns = [
+        ('frame_no', np.dtype(np.int64), (frames,)),
+        ('timestamp', np.dtype(np.float64), (frames,)),
+        ('start', np.dtype(np.uint32), (frames + 1,)),
+        ('static', np.dtype(np.uint8), (frames,)),
+        ('ids', np.dtype(np.uint16), (markers,)),
+        ('corners', np.dtype(np.int16), (markers, 4, 2)),
+    ]
+
+    layout = {}
+    offset = CHUNK_HEADER_DTYPE.itemsize
+    for name, dtype, shape in columns:
+        layout[name] = (offset, dtype, shape)
+        offset = _align(offset + dtype.itemsize * math.prod(shape))
+
+    return layout, offset
+
+
+class RecordingWriter:
+    '''
+    This class appends marker batches to a recording file. Frames are buffered and written one chunk at a time. Each
+    chunk stores its frames column by column: Frame numbers, timestamps, marker offsets, static flags, IDs and the
+    corners as fixed point numbers. Closing the writer appends an index, which allows readers to open the recording
+    without scanning it.
+    '''
+
+    def __init__(self, path: str, chunk_frames: int = DEFAULT_CHUNK_FRAMES) -> None:
+        '''
+        Create a new recording writer.
+
+        Args:
+            path: Path of the recording file.
+            chunk_frames: Number of frames per chunk.
+        '''
+        self._chunk_frames = chunk_frames
+        self._path = path
+        self._file: BinaryIO | None = None
+
+        # Frames of the current chunk
+        self._batches: List[MarkerBatch] = []
+
+        # Index of the written chunks and the first frame of each second
+        self._offsets: List[int] = []
+        self._seconds: List[int] = []
+        self._first_timestamp = 0.0
+        self._frames = 0
+
+        self.width = 0
+        self.height = 0
+
+    def open(self) -> Error:
+        '''
+        Create the recording file and write the file header.
+
+        Returns:
+            Non None if an error occured.
+        '''
+        header = np.zeros(1, dtype=FILE_HEADER_DTYPE)
+        header['magic'] = FILE_MAGIC
+        header['chunk_frames'] = self._chunk_frames
+        header['corner_scale'] = CORNER_SCALE
+
+        try:
+            self._file = open(self._path, 'wb')
+            self._file.write(header.tobytes())
+        except OSError as e:
+            return Error(f'Failed to create recording: {e}')
+
+        return None
+
+    def append(self, batch: MarkerBatch) -> Error:
+        '''
+        Append the markers of a frame. Frames have to be appended in order.
+
+        Args:
+            batch: The markers of the frame.
+
+        Returns:
+            Non None if an error occured.
+        '''
+        if self._frames == 0:
+            self._first_timestamp = batch.timestamp
+
+        # Remember the first frame of each second since the start of the recording
+        second = int(batch.timestamp - self._first_timestamp)
+        while len(self._seconds) <= second:
+            self._seconds.append(self._frames)
+
+        self._batches.append(batch)
+        self._frames += 1
+
+        if len(self._batches) == self._chunk_frames:
+            return self._flush()
+
+        return None
+
+    def _flush(self) -> Error:
+        '''
+        Write the buffered frames as chunk.
+
+        Returns:
+            Non None if an error occured.
+        '''
+        frames = len(self._batches)
+        counts = np.array([len(batch) for batch in self._batches], dtype=np.uint32)
+        markers = int(counts.sum())
+
+        layout, size = _chunk_layout(frames, markers)
+        chunk = np.zeros(size, dtype=np.uint8)
+
+        header = np.frombuffer(chunk, CHUNK_HEADER_DTYPE, 1)
+        header['magic'] = CHUNK_MAGIC
+        header['frames'] = frames
+        header['markers'] = markers
+
+        columns = {name: _column(chunk, *spec) for name, spec in layout.items()}
+        columns['frame_no'][:] = [batch.frame_no for batch in self._batches]
+        columns['timestamp'][:] = [batch.timestamp for batch in self._batches]
+        columns['static'][:] = [batch.static for batch in self._batches]
+        columns['start'][1:] = np.cumsum(counts)
+
+        if markers > 0:
+            corners = np.concatenate([batch.corners for batch in self._batches])
+            columns['ids'][:] = np.concatenate([batch.ids for batch in self._batches])
+            columns['corners'][:] = np.clip(np.rint(corners * CORNER_SCALE), -32768, 32767)
+
+        try:
+            self._offsets.append(self._file.tell())
+            self._file.write(chunk.tobytes())
+        except OSError as e:
+            return Error(f'Failed to write recording: {e}')
+
+        self._batches = []
+        return None
+
+    def close(self) -> Error:
+        '''
+        Write the remaining frames, the index and the footer and close the file.
+
+        Returns:
+            Non None if an error occured.
+        '''
+        if self._file == None:
+            return None
+
+        if len(self._batches) > 0:
+            err = self._flush()
+            if err != None:
+                return err
+
+        footer = np.zeros(1, dtype=FOOTER_DTYPE)
+        footer['chunks'] = len(self._offsets)
+        footer['seconds'] = len(self._seconds)
+        footer['width'] = self.width
+        footer['height'] = self.height
+        footer['magic'] = INDEX_MAGIC
+
+        try:
+            footer['index_offset'] = self._file.tell()
+            self._file.write(np.array(self._offsets, dtype=np.uint64).tobytes())
+            self._file.write(np.array(self._seconds, dtype=np.uint64).tobytes())
+            self._file.write(footer.tobytes())
+            self._file.close()
+        except OSError as e:
+            return Error(f'Failed to write recording index: {e}')
+
+        self._file = None
+        return None
+
+
+class Recording:
+    '''
+    This class describes a memory-mapped recording. Opening a recording only reads the index, the chunks are read
+    by the OS on access. Frames are addressed by their index in the recording. Accessing a frame by index is O(1),
+    because all chunks except the last one contain the same number of frames. Seeking to a point in time uses the
+    per-second index and then searches the frames of that second.
+    '''
+
+    def __init__(
+        self,
+        data: np.ndarray,
+        chunk_frames: int,
+        offsets: np.ndarray,
+        seconds: np.ndarray,
+        width: int,
+        height: int
+    ) -> None:
+        self._chunk_frames = chunk_frames
+        self._offsets = offsets
+        self._seconds = seconds
+        self._data = data
+
+        self.width = width
+        self.height = height
+
+        self._chunks: Dict[int, Dict[str, np.ndarray]] = {}
+        self._frames = 0
+        if len(offsets) > 0:
+            self._frames = (len(offsets) - 1) * chunk_frames + len(self._chunk(len(offsets) - 1)['frame_no'])
+
+    def __len__(self) -> int:
+        return self._frames
+
+    def _chunk(self, index: int) -> Dict[str, np.ndarray]:
+        '''
+        Returns the columns of a chunk as views into the memory-mapped file.
+        '''
+        columns = self._chunks.get(index)
+        if columns != None:
+            return columns
+
+        offset = int(self._offsets[index])
+        header = np.frombuffer(self._data, CHUNK_HEADER_DTYPE, 1, offset)[0]
+        layout, _ = _chunk_layout(int(header['frames']), int(header['markers']))
+
+        columns = {name: _column(self._data, offset + o, dtype, shape) for name, (o, dtype, shape) in layout.items()}
+        self._chunks[index] = columns
+        return columns
+
+    def start_time(self) -> float:
+        '''
+        Returns the timestamp of the first frame.
+        '''
+        return float(self._chunk(0)['timestamp'][0]) if self._frames > 0 else 0.0
+
+    def end_time(self) -> float:
+        '''
+        Returns the timestamp of the last frame.
+        '''
+        return self.timestamp(self._frames - 1) if self._frames > 0 else 0.0
+
+    def timestamp(self, index: int) -> float:
+        '''
+        Returns the capture timestamp of a frame.
+
+        Args:
+            index: Index of the frame.
+
+        Returns:
+            The timestamp.
+        '''
+        chunk, local = divmod(index, self._chunk_frames)
+        return float(self._chunk(chunk)['timestamp'][local])
+
+    def batch(self, index: int) -> MarkerBatch:
+        '''
+        Returns the markers of a frame.
+
+        Args:
+            index: Index of the frame.
+
+        Returns:
+            The markers.
+        '''
+        chunk, local = divmod(index, self._chunk_frames)
+        columns = self._chunk(chunk)
+
+        start, end = columns['start'][local], columns['start'][local + 1]
+        corners = columns['corners'][start:end].astype(np.float32) / CORNER_SCALE
+        ids = columns['ids'][start:end].astype(np.int32)
+
+        batch = batch_from(
+            corners.reshape(-1, 1, 4, 2),
+            ids.reshape(-1, 1),
+            int(columns['frame_no'][local]),
+            float(columns['timestamp'][local])
+        )
+        batch.static = bool(columns['static'][local])
+
+        return batch
+
+    def seek(self, offset: float) -> int:
+        '''
+        Returns the index of the first frame captured at or after `offset` seconds since the start of the recording.
+
+        Args:
+            offset: Seconds since the first frame.
+
+        Returns:
+            The frame index. Equals the number of frames if `offset` is after the last frame.
+        '''
+        if self._frames == 0 or offset <= 0:
+            return 0
+
+        second = int(offset)
+        if second >= len(self._seconds):
+            return self._frames
+
+        # Search the frames of this second only
+        target = self.start_time() + offset
+        index = int(self._seconds[second])
+        end = int(self._seconds[second + 1]) if second + 1 < len(self._seconds) else self._frames
+        while index < end and self.timestamp(index) < target:
+            index += 1
+
+        return index
+
+
+def _column(data: np.ndarray, offset: int, dtype: np.dtype, shape: tuple) -> np.ndarray:
+    '''
+    Returns a view of a column stored at `offset`.
+    '''
+    count = math.prod(shape)
+    return np.frombuffer(data, dtype, count, offset).reshape(shape)
+
+
+def open_recording(path: str) -> Result[Recording, Error]:
+    '''
+    Open a recording. Recordings which were not closed properly (e.g. after a crash) have no index. The index of
+    these recordings gets rebuilt by reading the chunk headers and timestamps.
+
+    Args:
+        path: Path of the recording file.
+
+    Returns:
+        The recording or an Error.
+    '''
+    if not os.path.exists(path):
+        return Err(Error('File not found'))
+
+    if os.path.getsize(path) < FILE_HEADER_DTYPE.itemsize:
+        return Err(Error('Invalid recording'))
+
+    data = np.memmap(path, dtype=np.uint8, mode='r')
+    header = np.frombuffer(data, FILE_HEADER_DTYPE, 1)[0]
+    if header['magic'] != FILE_MAGIC or header['corner_scale'] != CORNER_SCALE:
+        return Err(Error('Invalid recording'))
+
+    chunk_frames = int(header['chunk_frames'])
+
+    # Use the index of closed recordings
+    if len(data) >= FILE_HEADER_DTYPE.itemsize + FOOTER_DTYPE.itemsize:
+        footer = np.frombuffer(data, FOOTER_DTYPE, 1, len(data) - FOOTER_DTYPE.itemsize)[0]
+        if footer['magic'] == INDEX_MAGIC:
+            offset = int(footer['index_offset'])
+            chunks, seconds = int(footer['chunks']), int(footer['seconds'])
+
+            return Ok(Recording(
+                data,
+                chunk_frames,
+                np.frombuffer(data, np.uint64, chunks, offset),
+                np.frombuffer(data, np.uint64, seconds, offset + chunks * 8),
+                int(footer['width']),
+                int(footer['height'])
+            ))
+
+    # Rebuild the index from the complete chunks
+    offsets = []
+    offset = FILE_HEADER_DTYPE.itemsize
+    while offset + CHUNK_HEADER_DTYPE.itemsize <= len(data):
+        chunk = np.frombuffer(data, CHUNK_HEADER_DTYPE, 1, offset)[0]
+        if chunk['magic'] != CHUNK_MAGIC:
+            break
+
+        _, size = _chunk_layout(int(chunk['frames']), int(chunk['markers']))
+        if offset + size > len(data):
+            break
+
+        offsets.append(offset)
+        offset += size
+
+    recording = Recording(data, chunk_frames, np.array(offsets, dtype=np.uint64), np.zeros(0, np.uint64), 0, 0)
+    if len(recording) > 0:
+        timestamps = np.concatenate([recording._chunk(i)['timestamp'] for i in range(len(offsets))])
+        seconds = (timestamps - timestamps[0]).astype(np.int64)
+        recording._seconds = np.searchsorted(seconds, np.arange(seconds[-1] + 1)).astype(np.uint64)
+
+    return Ok(recording)
+
+
+class Recorder:
+    '''
+    This class records the tracking results of a publisher (e.g. the tracker) into a recording file. The recorder
+    subscribes like any other consumer and writes the batches in a separate thread.
+    '''
+
+    def __init__(self, publisher: Publisher, path: str, chunk_frames: int = DEFAULT_CHUNK_FRAMES) -> None:
+        '''
+        Create a new recorder.
+
+        Args:
+            publisher: The publisher to record.
+            path: Path of the recording file.
+            chunk_frames: Number of frames per chunk.
+        '''
+        self._writer = RecordingWriter(path, chunk_frames)
+        self._publisher = publisher
+        self._subscription_id = -1
+        self._thread = None
+        self._running = False
+        self._error: Error = None
+
+    def start(self) -> Error:
+        '''
+        Create the recording file and start recording.
+
+        Returns:
+            Non None if an error occured.
+        '''
+        if self._running:
+            return Error('Already running')
+
+        err = self._writer.open()
+        if err != None:
+            return err
+
+        # Buffer a few seconds of results, so that slow disks don't drop frames
+        id, _, retrieve = self._publisher.subscribe(1024, SubscriptionMode.DROP_OLDEST)
+        self._subscription_id = id
+        self._running = True
+
+        t = threading.Thread(None, self._record, 'marker-recorder', (retrieve,))
+        self._thread = t
+        t.start()
+
+        return None
+
+    def _record(self, retrieve):
+        '''
+        Write received batches until the recorder gets stopped.
+        '''
+        while self._running:
+            try:
+                batch = retrieve(True, 0.1)
+            except Empty:
+                continue
+
+            err = self._writer.append(batch)
+            if err != None:
+                self._error = err
+                self._running = False
+                return
+
+        # Write the results which were received before stopping
+        while True:
+            try:
+                batch = retrieve(False)
+            except Empty:
+                break
+
+            err = self._writer.append(batch)
+            if err != None:
+                self._error = err
+                return
+
+    def stop(self) -> Error:
+        '''
+        Stop recording and close the recording file.
+
+        Returns:
+            Non None if an error occured while recording or closing.
+        '''
+        if self._thread == None:
+            return self._error
+
+        self._running = False
+        self._thread.join()
+        self._thread = None
+        self._publisher.unsubscribe(self._subscription_id)
+
+        self._writer.width, self._writer.height = self._publisher.frame_size()
+
+        err = self._writer.close()
+        if err != None:
+            return err
+
+        return self._error
@@ -0,0 +1,180 @@
+from typing import Tuple
+import threading
+import time
+import cv2 as cv
+
+from capture.recording import Recording
+from capture.publisher import Publisher
+from capture.result import TrackingResult
+
+from typings.capture.stats import TrackerStats
+from typings.error import Err, Error
+
+
+class ReplayTracker(Publisher):
+    '''
+    This class replays a recording and provides the same consumer interface as `Tracker`. Subscribers receive the
+    recorded marker batches at the recorded pace scaled by the replay speed. Timestamps get shifted to the time of
+    the replay, so that consumers which measure latencies or predict motion behave as if the markers were live.
+    Recordings don't contain frames, so frame related methods never return a frame.
+    '''
+
+    def __init__(self, recording: Recording, speed: float = 1.0, start: float = 0.0, loop: bool = False) -> None:
+        '''
+        Create a new replay tracker instance.
+
+        Args:
+            recording: The recording to replay.
+            speed: Replay speed relative to the recorded pace (Default: 1.0 => Real-time, 0 => As fast as possible).
+            start: Start offset in seconds since the start of the recording.
+            loop: If the replay should start over after the last frame.
+        '''
+        super().__init__()
+        self._recording = recording
+        self._start = start
+        self._speed = speed
+        self._loop = loop
+
+        self._frame_width = recording.width
+        self._frame_height = recording.height
+
+        self._thread = None
+        self._running = False
+        self._frames = 0
+
+    def _run(self):
+        '''
+        Notify subscribers with the recorded batches until the recording ends or the replay gets stopped.
+        '''
+        first = self._recording.seek(self._start)
+
+        while self._running:
+            begin = time.monotonic()
+            recorded_begin = self._recording.timestamp(first) if first < len(self._recording) else 0.0
+
+            for index in range(first, len(self._recording)):
+                if not self._running:
+                    return
+
+                batch = self._recording.batch(index)
+
+                # Wait until the frame is due and shift its timestamp to the replay time
+                if self._speed > 0:
+                    due = begin + (batch.timestamp - recorded_begin) / self._speed
+                    delay = due - time.monotonic()
+                    if delay > 0:
+                        time.sleep(delay)
+                    batch.timestamp = due
+                else:
+                    batch.timestamp = time.monotonic()
+
+                batch.markers.flags.writeable = False
+                self.notify(TrackingResult(None, batch.frame_no, batch.timestamp, batch, batch.static))
+                self._frames += 1
+
+            if not self._loop or len(self._recording) == 0:
+                break
+
+            first = 0
+
+        self._running = False
+
+    def start(self) -> Error:
+        '''
+        Start replaying.
+
+        Returns:
+            Non None if an error occured.
+        '''
+        if self._running:
+            return Err('Already running')
+
+        self._running = True
+
+        t = threading.Thread(None, self._run, 'replay-thread')
+        self._thread = t
+        t.start()
+
+        return None
+
+    def stop(self):
+        '''
+        Stop replaying and wait until the replay thread terminates.
+        '''
+        self._running = False
+        if self._thread != None:
+            self._thread.join()
+            self._thread = None
+
+    def is_running(self) -> bool:
+        '''
+        Returns if the replay is still running. This turns False after the last frame unless looping.
+        '''
+        return self._running
+
+    def stats(self) -> TrackerStats:
+        '''
+        Returns the replay stats. Only the frame counter and the subscriptions are available.
+
+        Returns:
+            The stats.
+        '''
+        return TrackerStats(
+            frames=self._frames, fps=0.0, failed_reads=0, dropped_frames=0, stale_frames=0, static_frames=0,
+            detect_errors=0, refinements=0, refine_skips=0, recovered_markers=0, full_scans=0, roi_scans=0, stages={},
+            subscriptions=self.subscription_stats(), overhead=0.0
+        )
+
+    def frame_seq(self) -> int:
+        '''
+        Returns the sequence number of the newest frame. Recordings don't contain frames.
+
+        Returns:
+            Always 0.
+        '''
+        return 0
+
+    def latest_frame(self) -> None:
+        '''
+        Recordings don't contain frames.
+
+        Returns:
+            Always None.
+        '''
+        return None
+
+    def wait_for_frame(self, seq: int, timeout: float | None = None) -> None:
+        '''
+        Recordings don't contain frames. This waits for the timeout to keep polling consumers from spinning.
+
+        Args:
+            seq: The sequence number of the last seen frame.
+            timeout: Maximum time to wait in seconds (Default: None => Until the replay stops).
+
+        Returns:
+            Always None.
+        '''
+        if self._thread != None:
+            self._thread.join(timeout)
+
+        return None
+
+    def get_frame(self) -> Tuple[bool, cv.Mat]:
+        '''
+        Recordings don't contain frames.
+
+        Returns:
+            ok: Always False.
+            frame: Always None.
+        '''
+        return False, None
+
+    def get_color_frame(self) -> Tuple[bool, cv.Mat]:
+        '''
+        Recordings don't contain frames.
+
+        Returns:
+            ok: Always False.
+            frame: Always None.
+        '''
+        return False, None
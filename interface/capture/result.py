@@ -0,0 +1,94 @@
+import threading
+import numpy as np
+
+from capture.geometry import batch_from
+
+from typings.capture.aruco import DetectionResult, MarkerBatch
+
+
+class TrackingResult:
+    '''
+    This class describes the immutable tracking result of a single frame. The tracker creates one instance per frame
+    and hands the same instance to every subscriber. Derived views like the marker batch are computed lazily by the
+    first consumer which needs them and at most once.
+    '''
+
+    def __init__(
+        self,
+        detection: DetectionResult | None,
+        frame_no: int,
+        timestamp: float,
+        batch: MarkerBatch | None = None,
+        static: bool = False
+    ) -> None:
+        '''
+        Create a new tracking result. Either the raw detection result or an already computed marker batch has to be
+        provided.
+
+        Args:
+            detection: The raw detection result.
+            frame_no: Frame number.
+            timestamp: Capture timestamp.
+            batch: Already computed marker batch (Default: None => Computed from the detection result).
+            static: If the result was reused from an earlier frame, because nothing moved since.
+        '''
+        self._lock = threading.Lock()
+        self._detection = detection
+        self._timestamp = timestamp
+        self._frame_no = frame_no
+        self._static = static
+        self._batch = batch
+
+    @property
+    def frame_no(self) -> int:
+        '''
+        Returns the frame number.
+        '''
+        return self._frame_no
+
+    @property
+    def timestamp(self) -> float:
+        '''
+        Returns the capture timestamp.
+        '''
+        return self._timestamp
+
+    @property
+    def static(self) -> bool:
+        '''
+        Returns if the result was reused from an earlier frame, because nothing moved since.
+        '''
+        return self._static
+
+    @property
+    def raw(self) -> DetectionResult:
+        '''
+        Returns the raw detection result consisting of corners, IDs, rejected and recovered candidates. Results
+        created from a marker batch only contain the corners and IDs.
+        '''
+        if self._detection != None:
+            return self._detection
+
+        with self._lock:
+            if self._detection == None:
+                corners = self._batch.corners.reshape(-1, 1, 4, 2)
+                self._detection = (tuple(corners), self._batch.ids.reshape(-1, 1), (), np.array([]))
+
+        return self._detection
+
+    @property
+    def batch(self) -> MarkerBatch:
+        '''
+        Returns the marker batch. The batch is shared by all subscribers and therefore read-only.
+        '''
+        if self._batch != None:
+            return self._batch
+
+        with self._lock:
+            if self._batch == None:
+                batch = batch_from(self._detection[0], self._detection[1], self._frame_no, self._timestamp)
+                batch.markers.flags.writeable = False
+                batch.static = self._static
+                self._batch = batch
+
+        return self._batch
@@ -0,0 +1,141 @@
+from typing import List
+import numpy as np
+import threading
+
+from typings.capture.aruco import DetectionResult
+from typings.capture.roi import Roi, RoiPlan
+
+
+class RoiPredictor:
+    '''
+    This class predicts the regions of interest (ROIs) in which the known markers will appear in the next frame. The
+    prediction extrapolates the last corner positions of each marker with its velocity in pixels per frame. Requesting
+    a plan returns None whenever the full frame has to be scanned: Every `rescan_interval` frames, when a marker got
+    lost or when no marker is known. New markers are only picked up by full frame scans.
+    '''
+
+    def __init__(self, rescan_interval: int = 30, padding: float = 0.5) -> None:
+        '''
+        Create a new ROI predictor.
+
+        Args:
+            rescan_interval: Scan the full frame every N frames.
+            padding: Padding added on each side of a predicted box, relative to the marker size.
+        '''
+        self._rescan_interval = rescan_interval
+        self._padding = padding
+        self._lock = threading.Lock()
+
+        # Last known state of each marker. All arrays share the same order
+        self._ids = np.empty(0, dtype=np.int32)
+        self._corners = np.empty((0, 4, 2), dtype=np.float32)
+        self._velocity = np.empty((0, 2), dtype=np.float32)
+        self._frame_nos = np.empty(0, dtype=np.int64)
+
+        self._last_full_scan = 0
+        self._rescan = True
+
+        # Counters
+        self.full_scans = 0
+        self.roi_scans = 0
+
+    def plan(self, frame_no: int, width: int, height: int) -> RoiPlan | None:
+        '''
+        Plan the detection of a frame.
+
+        Args:
+            frame_no: Frame number.
+            width: Frame width.
+            height: Frame height.
+
+        Returns:
+            The ROIs and the expected marker IDs or None if the full frame has to be scanned.
+        '''
+        with self._lock:
+            if self._rescan or len(self._ids) == 0 or frame_no - self._last_full_scan >= self._rescan_interval:
+                self._last_full_scan = frame_no
+                self._rescan = False
+                self.full_scans += 1
+                return None
+
+            # Extrapolate the corners of all markers at once
+            steps = (frame_no - self._frame_nos).astype(np.float32)
+            motion = self._velocity * steps[:, None]
+            corners = self._corners + motion[:, None, :]
+
+            mins = corners.min(axis=1)
+            maxs = corners.max(axis=1)
+
+            # Pad by the marker size and the uncertainty of the extrapolated motion
+            pad = (maxs - mins).max(axis=1, keepdims=True) * self._padding + np.abs(motion)
+            mins = np.clip(np.floor(mins - pad), 0, [width, height]).astype(int)
+            maxs = np.clip(np.ceil(maxs + pad), 0, [width, height]).astype(int)
+
+            boxes = [(x0, y0, x1, y1) for (x0, y0), (x1, y1) in zip(mins.tolist(), maxs.tolist())]
+            self.roi_scans += 1
+
+            return merge_rois(boxes), self._ids.tolist()
+
+    def update(self, frame_no: int, result: DetectionResult, expected: List[int] | None):
+        '''
+        Update the marker state with a detection result. Results have to be passed in frame order.
+
+        Args:
+            frame_no: Frame number.
+            result: The detection result.
+            expected: The marker IDs expected by an ROI detection or None after a full frame scan.
+        '''
+        # The detection returns None instead of an empty ID list if no marker was found
+        n = len(result[1]) if result[1] is not None else 0
+        ids = np.asarray(result[1] if n > 0 else [], dtype=np.int32).reshape(n)
+        corners = np.asarray(result[0], dtype=np.float32).reshape(n, 4, 2)
+
+        with self._lock:
+            # Velocity of markers which were already known
+            velocity = np.zeros((n, 2), dtype=np.float32)
+            known, new_idx, old_idx = np.intersect1d(ids, self._ids, return_indices=True)
+            if len(known) > 0:
+                steps = np.maximum(frame_no - self._frame_nos[old_idx], 1).astype(np.float32)
+                delta = corners[new_idx].mean(axis=1) - self._corners[old_idx].mean(axis=1)
+                velocity[new_idx] = delta / steps[:, None]
+
+            # A marker expected by an ROI detection was not found. Rescan the full frame to find it again
+            if expected != None and len(np.setdiff1d(expected, ids)) > 0:
+                self._rescan = True
+
+            self._ids = ids
+            self._corners = corners
+            self._velocity = velocity
+            self._frame_nos = np.full(n, frame_no, dtype=np.int64)
+
+
+def merge_rois(rois: List[Roi]) -> List[Roi]:
+    '''
+    Merge overlapping ROIs into their bounding boxes, so that no frame area gets scanned twice.
+
+    Args:
+        rois: The ROIs.
+
+    Returns:
+        Non overlapping ROIs.
+    '''
+    merged: List[Roi] = []
+
+    for roi in rois:
+        x0, y0, x1, y1 = roi
+
+        # Merging may create new overlaps, so repeat until the box is disjoint from all others
+        overlap = True
+        while overlap:
+            overlap = False
+            for i, (a0, b0, a1, b1) in enumerate(merged):
+                if x0 < a1 and a0 < x1 and y0 < b1 and b0 < y1:
+                    x0, y0, x1, y1 = min(x0, a0), min(y0, b0), max(x1, a1), max(y1, b1)
+                    merged.pop(i)
+                    overlap = True
+                    break
+
+        if x1 > x0 and y1 > y0:
+            merged.append((x0, y0, x1, y1))
+
+    return merged
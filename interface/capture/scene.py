@@ -0,0 +1,288 @@
+from typing import List, Tuple
+import numpy as np
+import cv2 as cv
+import math
+
+from capture.generator import Generator
+from capture.geometry import batch_from
+from config.config import Config
+
+from typings.capture.scene import SceneAccuracy, SceneOptions
+from typings.capture.aruco import MarkerBatch
+from typings.error import Error
+
+SCENE_MOTIONS = ['static', 'circle', 'bounce']
+
+DEFAULT_SCENE_OPTIONS = SceneOptions(
+    width=1920,
+    height=1080,
+    number=10,
+    marker_size=0,
+    motion='circle',
+    speed=4.0,
+    rotation=30.0,
+    perspective=0.1,
+    blur=0.8,
+    noise=4.0,
+    lighting=0.4,
+    seed=0
+)
+
+# Gray level of the background before the lighting gradient is applied
+BACKGROUND_LEVEL = 210
+
+
+def validate_scene(options: SceneOptions) -> Error:
+    '''
+    Validate scene options. Returns an error if validation failed.
+
+    Args:
+        options: Scene options to validate.
+
+    Returns:
+        An Error if an error was encountered, None if otherwise.
+    '''
+    if options['width'] <= 0 or options['height'] <= 0:
+        return Error('Invalid scene dimensions')
+
+    if options['number'] <= 0:
+        return Error('Invalid number of scene markers. Choose value > 0')
+
+    if options['marker_size'] < 0:
+        return Error('Invalid scene marker size. Choose value >= 0')
+
+    if not options['motion'] in SCENE_MOTIONS:
+        return Error(f'Invalid scene motion. Choose one of {", ".join(SCENE_MOTIONS)}')
+
+    if options['speed'] < 0 or options['rotation'] < 0 or options['blur'] < 0 or options['noise'] < 0:
+        return Error('Invalid scene speed, rotation, blur or noise. Choose values >= 0')
+
+    if options['perspective'] < 0 or options['perspective'] >= 0.5:
+        return Error('Invalid scene perspective. Choose value between 0 and 0.5')
+
+    if options['lighting'] < 0 or options['lighting'] > 1:
+        return Error('Invalid scene lighting. Choose value between 0 and 1')
+
+    return None
+
+
+class SceneGenerator:
+    '''
+    This class renders synthetic scenes of ArUco markers at known poses. Each marker lives in its own cell of a
+    regular grid, gets rotated and perspectively distorted and moves along its motion path without ever leaving its
+    cell. The composited frame is then degraded by a lighting gradient, blur and sensor noise. Every frame is fully
+    determined by the options and the frame number, so scenes are reproducible across runs and machines.
+
+    Along with each frame the generator returns the ground truth corners of all markers, which makes it possible to
+    measure the tracking accuracy.
+    '''
+
+    def __init__(self, cfg: Config, options: SceneOptions = DEFAULT_SCENE_OPTIONS) -> None:
+        '''
+        Create a new scene generator. Use `validate_scene` to check the options first.
+
+        Args:
+            cfg: Configuration data.
+            options: Scene options.
+        '''
+        self._options = options
+        self._width = options['width']
+        self._height = options['height']
+        self._number = options['number']
+
+        cols = math.ceil(math.sqrt(self._number * self._width / self._height))
+        rows = math.ceil(self._number / cols)
+        cell_width = self._width / cols
+        cell_height = self._height / rows
+
+        # Leave enough room to rotate, distort and move the marker inside its cell
+        size = options['marker_size']
+        if size == 0:
+            size = int(min(cell_width, cell_height) / 3)
+
+        self._size = size
+        self._padding = max(size // 6, 2)
+
+        # Maximum distance of the (padded) marker outline from its center
+        extent = (size / 2 + self._padding) * math.sqrt(2) + options['perspective'] * size
+        self._range_x = max(cell_width / 2 - extent - 1, 0)
+        self._range_y = max(cell_height / 2 - extent - 1, 0)
+
+        # Draw the markers once with a white quiet zone around them
+        generator = Generator(cfg)
+        self._markers: List[cv.Mat] = []
+        for i in range(self._number):
+            inner = slice(self._padding, self._padding + size)
+            marker = np.full((size + 2 * self._padding,) * 2, 255, dtype=np.uint8)
+            marker[inner, inner] = generator.draw(i, size)[:, :, 0]
+            self._markers.append(marker)
+
+        # Random but fixed pose of each marker
+        rng = np.random.default_rng(options['seed'])
+        n = self._number
+        self._cells = np.stack([
+            (np.arange(n) % cols + 0.5) * cell_width,
+            (np.arange(n) // cols + 0.5) * cell_height
+        ], axis=1)
+        self._angles = np.radians(rng.uniform(-options['rotation'], options['rotation'], n))
+        self._jitter = rng.uniform(-options['perspective'], options['perspective'], (n, 4, 2)) * size
+        self._phases = rng.uniform(0, 2 * math.pi, n)
+        self._directions = self._phases + rng.uniform(0.2, 0.8, n)
+
+        # The lighting gradient falls off from a random corner towards the opposite corner
+        x = np.linspace(0, 1, self._width, dtype=np.float32)
+        y = np.linspace(0, 1, self._height, dtype=np.float32)
+        if rng.random() < 0.5:
+            x = x[::-1]
+        if rng.random() < 0.5:
+            y = y[::-1]
+        self._lighting = 1 - options['lighting'] * (x[None, :] + y[:, None]) / 2
+
+    def marker_size(self) -> int:
+        '''
+        Returns the side length of the markers (including the border bits) in pixels.
+        '''
+        return self._size
+
+    def centers(self, n: int) -> np.ndarray:
+        '''
+        Returns the marker center positions in frame `n`.
+
+        Args:
+            n: Frame number.
+
+        Returns:
+            The center positions with shape (N, 2).
+        '''
+        speed = self._options['speed']
+
+        match self._options['motion']:
+            case 'circle':
+                radius = min(self._range_x, self._range_y)
+                if radius == 0:
+                    return self._cells.copy()
+
+                angle = self._phases + n * speed / radius
+                return self._cells + radius * np.stack([np.cos(angle), np.sin(angle)], axis=1)
+            case 'bounce':
+                # The phase spreads the start positions over the whole path
+                start = self._phases / (2 * math.pi) * 4
+                offsets = np.stack([
+                    _triangle(start * self._range_x + n * speed * np.cos(self._directions), self._range_x),
+                    _triangle(start * self._range_y + n * speed * np.sin(self._directions), self._range_y)
+                ], axis=1)
+                return self._cells + offsets
+            case _:
+                return self._cells.copy()
+
+    def corners(self, n: int) -> np.ndarray:
+        '''
+        Returns the ground truth marker corners in frame `n` (top-left, top-right, bottom-right, bottom-left).
+
+        Args:
+            n: Frame number.
+
+        Returns:
+            The corners with shape (N, 4, 2).
+        '''
+        half = self._size / 2
+        square = np.array([[-half, -half], [half, -half], [half, half], [-half, half]])
+
+        cos, sin = np.cos(self._angles), np.sin(self._angles)
+        rotation = np.stack([np.stack([cos, -sin], axis=1), np.stack([sin, cos], axis=1)], axis=1)
+        local = (square + self._jitter) @ rotation.transpose(0, 2, 1)
+
+        return (local + self.centers(n)[:, None, :]).astype(np.float32)
+
+    def render(self, n: int) -> Tuple[cv.Mat, MarkerBatch]:
+        '''
+        Render frame `n`.
+
+        Args:
+            n: Frame number.
+
+        Returns:
+            The BGR frame and the ground truth markers.
+        '''
+        frame = np.full((self._height, self._width), BACKGROUND_LEVEL, dtype=np.float32)
+        corners = self.corners(n)
+
+        # Marker corners lie on pixel edges, OpenCV places pixel centers at integer coordinates
+        p, s = self._padding, self._size
+        inner = np.float32([[p, p], [p + s, p], [p + s, p + s], [p, p + s]]) - 0.5
+        outer = np.float32([[0, 0], [s + 2 * p, 0], [s + 2 * p, s + 2 * p], [0, s + 2 * p]]) - 0.5
+
+        for marker, quad in zip(self._markers, corners):
+            m = cv.getPerspectiveTransform(inner, quad)
+            outline = cv.perspectiveTransform(outer[None], m)[0]
+
+            # Only warp into the bounding box of the marker
+            x0, y0 = np.maximum(np.floor(outline.min(axis=0)).astype(int), 0)
+            x1, y1 = np.minimum(np.ceil(outline.max(axis=0)).astype(int) + 1, (self._width, self._height))
+            if x1 <= x0 or y1 <= y0:
+                continue
+
+            m = np.array([[1, 0, -x0], [0, 1, -y0], [0, 0, 1]]) @ m
+            size = (int(x1 - x0), int(y1 - y0))
+            warped = cv.warpPerspective(marker, m, size, flags=cv.INTER_LINEAR).astype(np.float32)
+            alpha = cv.warpPerspective(np.full(marker.shape, 1, np.float32), m, size, flags=cv.INTER_LINEAR)
+
+            roi = frame[y0:y1, x0:x1]
+            roi += (warped - roi) * alpha
+
+        frame *= self._lighting
+
+        if self._options['blur'] > 0:
+            frame = cv.GaussianBlur(frame, (0, 0), self._options['blur'])
+
+        if self._options['noise'] > 0:
+            rng = np.random.default_rng((self._options['seed'], n))
+            frame += rng.normal(0, self._options['noise'], frame.shape).astype(np.float32)
+
+        frame = np.clip(frame, 0, 255).astype(np.uint8)
+        truth = batch_from(corners.reshape(-1, 1, 4, 2), np.arange(self._number).reshape(-1, 1), n)
+
+        return cv.cvtColor(frame, cv.COLOR_GRAY2BGR), truth
+
+
+def compare(detected: MarkerBatch, truth: MarkerBatch) -> SceneAccuracy:
+    '''
+    Compare detected markers with the ground truth markers of the same frame.
+
+    Args:
+        detected: The detected markers.
+        truth: The ground truth markers.
+
+    Returns:
+        The accuracy of the detection.
+    '''
+    ids, first = np.unique(detected.ids, return_index=True)
+    found = np.isin(ids, truth.ids)
+
+    matched = ids[found]
+    rms_error = 0.0
+    if len(matched) > 0:
+        # searchsorted returns positions in the sorted order, map them back to the truth order
+        order = np.argsort(truth.ids)
+        expected = truth.corners[order[np.searchsorted(truth.ids, matched, sorter=order)]]
+        errors = detected.corners[first[found]] - expected
+        rms_error = float(np.sqrt(np.mean(np.sum(errors ** 2, axis=2))))
+
+    return SceneAccuracy(
+        expected=len(truth),
+        matched=len(matched),
+        false_positives=int(np.count_nonzero(~found)),
+        rms_error=rms_error
+    )
+
+
+def _triangle(x: np.ndarray, amplitude: float) -> np.ndarray:
+    '''
+    Triangle wave which bounces between -amplitude and amplitude with slope 1.
+    '''
+    if amplitude == 0:
+        return np.zeros_like(x)
+
+    period = 4 * amplitude
+    phase = np.mod(x, period)
+    return amplitude - np.abs(phase - 2 * amplitude)
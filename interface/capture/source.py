@@ -0,0 +1,460 @@
+from typing import List, Tuple
+import numpy as np
+import cv2 as cv
+import glob
+import math
+import time
+import os
+
+from config.config import Config
+import capture.aruco as aruco
+from capture.scene import DEFAULT_SCENE_OPTIONS, SceneGenerator, validate_scene
+
+from typings.capture.scene import SceneOptions
+from typings.capture.aruco import MarkerBatch
+from typings.error import Err, Error, Ok, Result
+
+
+class FrameSource:
+    '''
+    This is the base class of each frame source. A frame source delivers BGR frames to the tracker and the
+    calibration. File based sources can either be replayed as fast as possible or paced at their native frame rate.
+    '''
+
+    def __init__(self, fps: float = 0, realtime: bool = False) -> None:
+        self._realtime = realtime
+        self._next_frame = 0.0
+        self._fps = fps
+
+        # Dimensions
+        self._height = 0
+        self._width = 0
+
+    def open(self) -> Error:
+        '''
+        Open the frame source.
+
+        Returns:
+            An Error if an error was encountered, None if otherwise.
+        '''
+        return None
+
+    def read(self, image: cv.Mat | None = None) -> Tuple[bool, cv.Mat]:
+        '''
+        Read the next frame. This mirrors `cv.VideoCapture.read`.
+
+        Args:
+            image: Optional buffer the frame gets written into.
+
+        Returns:
+            ok: If a frame could be read.
+            frame: The frame.
+        '''
+        return False, None
+
+    def eof(self) -> bool:
+        '''
+        Returns if the source is exhausted. Live sources are never exhausted.
+
+        Returns:
+            If there are no more frames to read.
+        '''
+        return False
+
+    def release(self):
+        '''
+        Release the frame source.
+        '''
+        pass
+
+    def size(self) -> Tuple[int, int]:
+        '''
+        Returns the frame dimensions. Only valid after the source was opened.
+
+        Returns:
+            Frame width and height.
+        '''
+        return self._width, self._height
+
+    def fps(self) -> float:
+        '''
+        Returns the (native) frame rate of the source.
+
+        Returns:
+            Frames per second. 0 if unknown.
+        '''
+        return self._fps
+
+    def _pace(self):
+        '''
+        Sleep until the next frame is due when the source is paced in real-time.
+        '''
+        if not self._realtime or self._fps <= 0:
+            return
+
+        now = time.monotonic()
+        if self._next_frame > now:
+            time.sleep(self._next_frame - now)
+            now = self._next_frame
+
+        self._next_frame = now + 1 / self._fps
+
+
+class CameraSource(FrameSource):
+    '''
+    This frame source reads frames from a live camera device.
+    '''
+
+    def __init__(self, camera_id: int, width: int = 0, height: int = 0) -> None:
+        super().__init__()
+        self._camera_id = camera_id
+        self._height = height
+        self._width = width
+        self._cap = None
+
+    def open(self) -> Error:
+        cap = cv.VideoCapture(self._camera_id)
+        if not cap.isOpened():
+            return Error(f'Failed to open camera with ID {self._camera_id}')
+
+        cap.set(cv.CAP_PROP_AUTOFOCUS, 0)
+        cap.set(cv.CAP_PROP_AUTO_WB, 0)
+        cap.set(cv.CAP_PROP_FRAME_HEIGHT, self._height)
+        cap.set(cv.CAP_PROP_FRAME_WIDTH, self._width)
+
+        # Retrieve frame height and width
+        self._height = int(cap.get(cv.CAP_PROP_FRAME_HEIGHT))
+        self._width = int(cap.get(cv.CAP_PROP_FRAME_WIDTH))
+        self._fps = cap.get(cv.CAP_PROP_FPS)
+        self._cap = cap
+
+        return None
+
+    def read(self, image: cv.Mat | None = None) -> Tuple[bool, cv.Mat]:
+        return self._cap.read(image)
+
+    def release(self):
+        if self._cap != None:
+            self._cap.release()
+
+
+class VideoFileSource(FrameSource):
+    '''
+    This frame source reads frames from a recorded video file.
+    '''
+
+    def __init__(self, path: str, realtime: bool = False, fps: float = 0) -> None:
+        super().__init__(fps, realtime)
+        self._path = path
+        self._eof = False
+        self._cap = None
+
+    def open(self) -> Error:
+        if not os.path.isfile(self._path):
+            return Error(f'Video file \'{self._path}\' not found')
+
+        cap = cv.VideoCapture(self._path)
+        if not cap.isOpened():
+            return Error(f'Failed to open video file \'{self._path}\'')
+
+        self._height = int(cap.get(cv.CAP_PROP_FRAME_HEIGHT))
+        self._width = int(cap.get(cv.CAP_PROP_FRAME_WIDTH))
+
+        # Prefer the frame rate stored in the video container
+        native_fps = cap.get(cv.CAP_PROP_FPS)
+        if native_fps > 0:
+            self._fps = native_fps
+
+        self._cap = cap
+        return None
+
+    def read(self, image: cv.Mat | None = None) -> Tuple[bool, cv.Mat]:
+        self._pace()
+
+        ok, frame = self._cap.read(image)
+        if not ok:
+            self._eof = True
+
+        return ok, frame
+
+    def eof(self) -> bool:
+        return self._eof
+
+    def release(self):
+        if self._cap != None:
+            self._cap.release()
+
+
+class ImageDirectorySource(FrameSource):
+    '''
+    This frame source reads PNG images from a directory in lexicographical order.
+    '''
+
+    def __init__(self, path: str, realtime: bool = False, fps: float = 0) -> None:
+        super().__init__(fps, realtime)
+        self._paths: List[str] = []
+        self._index = 0
+        self._path = path
+
+    def open(self) -> Error:
+        if not os.path.isdir(self._path):
+            return Error(f'Image directory \'{self._path}\' not found')
+
+        self._paths = sorted(glob.glob(os.path.join(self._path, '*.png')))
+        if len(self._paths) == 0:
+            return Error(f'No PNG images found in \'{self._path}\'')
+
+        first = cv.imread(self._paths[0])
+        if first is None:
+            return Error(f'Failed to read image \'{self._paths[0]}\'')
+
+        self._height, self._width = first.shape[:2]
+        return None
+
+    def read(self, image: cv.Mat | None = None) -> Tuple[bool, cv.Mat]:
+        if self.eof():
+            return False, None
+
+        self._pace()
+
+        frame = cv.imread(self._paths[self._index])
+        self._index += 1
+
+        if frame is None:
+            return False, None
+
+        if image is not None and image.shape == frame.shape:
+            np.copyto(image, frame)
+            return True, image
+
+        return True, frame
+
+    def eof(self) -> bool:
+        return self._index >= len(self._paths)
+
+
+class SyntheticSource(FrameSource):
+    '''
+    This frame source renders ArUco markers moving on circular paths. All frames are rendered into memory when the
+    source gets opened, so reading frames costs (almost) nothing. This makes it possible to measure the detection
+    throughput without a camera.
+    '''
+
+    def __init__(
+        self,
+        cfg: Config,
+        number: int = 10,
+        frames: int = 120,
+        width: int = 1920,
+        height: int = 1080,
+        realtime: bool = False,
+        loop: bool = True
+    ) -> None:
+        super().__init__(cfg['capture']['fps'], realtime)
+        typ = aruco.type_from(
+            cfg['capture']['aruco']['size'],
+            cfg['capture']['aruco']['uniques']
+        )
+        t, ok = aruco.dict_from(typ)
+        if not ok:
+            raise Exception('Failed to instantiate SyntheticSource object')
+
+        self._dict = cv.aruco.Dictionary_get(t)
+        self._frames: List[cv.Mat] = []
+        self._number_frames = frames
+        self._number = number
+        self._height = height
+        self._width = width
+        self._loop = loop
+        self._index = 0
+
+    def _render(self, n: int, markers: List[cv.Mat]) -> cv.Mat:
+        '''
+        Render frame `n`. Each marker moves on its own circle around a point on a regular grid.
+
+        Args:
+            n: Frame number.
+            markers: Pre-rendered marker images.
+
+        Returns:
+            The rendered BGR frame.
+        '''
+        frame = np.full((self._height, self._width), 255, dtype=np.uint8)
+
+        res = markers[0].shape[0]
+        cols = math.ceil(math.sqrt(self._number))
+        rows = math.ceil(self._number / cols)
+        cell_width = self._width // cols
+        cell_height = self._height // rows
+        radius = max(0, min(cell_width, cell_height) // 2 - res) // 2
+
+        for i, marker in enumerate(markers):
+            phase = 2 * math.pi * (n / self._number_frames + i / self._number)
+            x = (i % cols) * cell_width + (cell_width - res) // 2 + int(radius * math.cos(phase))
+            y = (i // cols) * cell_height + (cell_height - res) // 2 + int(radius * math.sin(phase))
+            frame[y:y + res, x:x + res] = marker
+
+        return cv.cvtColor(frame, cv.COLOR_GRAY2BGR)
+
+    def open(self) -> Error:
+        if self._number <= 0 or self._number_frames <= 0:
+            return Error('Invalid number of synthetic markers or frames')
+
+        cols = math.ceil(math.sqrt(self._number))
+        rows = math.ceil(self._number / cols)
+        res = min(self._width // cols, self._height // rows) // 3
+        if res < 20:
+            return Error('Synthetic frame too small for the number of markers')
+
+        markers: List[cv.Mat] = []
+        for i in range(self._number):
+            # Draw the marker with a white quiet zone around it
+            marker = np.full((res, res), 255, dtype=np.uint8)
+            inner = res - res // 4
+            offset = (res - inner) // 2
+            marker[offset:offset + inner, offset:offset + inner] = cv.aruco.drawMarker(self._dict, i, inner)
+            markers.append(marker)
+
+        self._frames = [self._render(n, markers) for n in range(self._number_frames)]
+        return None
+
+    def read(self, image: cv.Mat | None = None) -> Tuple[bool, cv.Mat]:
+        if self.eof():
+            return False, None
+
+        self._pace()
+
+        frame = self._frames[self._index % self._number_frames]
+        self._index += 1
+
+        if image is not None and image.shape == frame.shape:
+            np.copyto(image, frame)
+            return True, image
+
+        return True, frame.copy()
+
+    def eof(self) -> bool:
+        return not self._loop and self._index >= self._number_frames
+
+    def release(self):
+        self._frames = []
+
+
+class SceneSource(FrameSource):
+    '''
+    This frame source replays a synthetic scene. All frames are rendered into memory when the source gets opened, so
+    reading frames costs (almost) nothing. The ground truth of each frame stays available via `ground_truth`.
+    '''
+
+    def __init__(
+        self,
+        cfg: Config,
+        options: SceneOptions = DEFAULT_SCENE_OPTIONS,
+        frames: int = 120,
+        realtime: bool = False,
+        loop: bool = True
+    ) -> None:
+        super().__init__(cfg['capture']['fps'], realtime)
+        self._frames: List[cv.Mat] = []
+        self._truth: List[MarkerBatch] = []
+        self._number_frames = frames
+        self._options = options
+        self._loop = loop
+        self._cfg = cfg
+        self._index = 0
+
+    def ground_truth(self, index: int) -> MarkerBatch:
+        '''
+        Returns the ground truth markers of a frame. The tracker numbers frames starting at 1, so the ground truth of
+        tracker frame `frame_no` is at index `frame_no - 1`.
+
+        Args:
+            index: Index of the frame in read order.
+
+        Returns:
+            The ground truth markers.
+        '''
+        return self._truth[index % self._number_frames]
+
+    def open(self) -> Error:
+        if self._number_frames <= 0:
+            return Error('Invalid number of scene frames')
+
+        err = validate_scene(self._options)
+        if err != None:
+            return err
+
+        scene = SceneGenerator(self._cfg, self._options)
+        for n in range(self._number_frames):
+            frame, truth = scene.render(n)
+            self._frames.append(frame)
+            self._truth.append(truth)
+
+        return None
+
+    def read(self, image: cv.Mat | None = None) -> Tuple[bool, cv.Mat]:
+        if self.eof():
+            return False, None
+
+        self._pace()
+
+        frame = self._frames[self._index % self._number_frames]
+        self._index += 1
+
+        if image is not None and image.shape == frame.shape:
+            np.copyto(image, frame)
+            return True, image
+
+        return True, frame.copy()
+
+    def eof(self) -> bool:
+        return not self._loop and self._index >= self._number_frames
+
+    def release(self):
+        self._frames = []
+
+
+def source_from(cfg: Config, spec: str = '', realtime: bool = False) -> Result[FrameSource, Error]:
+    '''
+    Returns a frame source described by `spec`. The spec has the form <kind>:<value>. Supported are:
+
+    - `camera:<id>`: Live camera with device ID. An empty spec uses the camera ID from the config.
+    - `video:<path>`: Recorded video file.
+    - `images:<dir>`: Directory of PNG images.
+    - `synthetic:<number>`: In-memory synthetic frames with a number of markers (Default: 10).
+    - `scene:<number>`: In-memory synthetic scene with distorted, blurred and noisy markers (Default: 10).
+
+    Args:
+        cfg: Configuration data.
+        spec: Source spec.
+        realtime: If file based sources should be paced at their native frame rate.
+
+    Returns:
+        A result consisting of a FrameSource or an Error.
+    '''
+    if not spec:
+        return Ok(CameraSource(cfg['capture']['camera_id']))
+
+    kind, _, value = spec.partition(':')
+    fps = cfg['capture']['fps']
+
+    match kind.lower():
+        case 'camera':
+            if not value.isdigit():
+                return Err(Error(f'Invalid camera device ID \'{value}\''))
+            return Ok(CameraSource(int(value)))
+        case 'video':
+            return Ok(VideoFileSource(value, realtime, fps))
+        case 'images':
+            return Ok(ImageDirectorySource(value, realtime, fps))
+        case 'synthetic':
+            if value and not value.isdigit():
+                return Err(Error(f'Invalid number of synthetic markers \'{value}\''))
+            return Ok(SyntheticSource(cfg, int(value) if value else 10, realtime=realtime))
+        case 'scene':
+            if value and not value.isdigit():
+                return Err(Error(f'Invalid number of scene markers \'{value}\''))
+            options = SceneOptions(DEFAULT_SCENE_OPTIONS, number=int(value) if value else 10)
+            return Ok(SceneSource(cfg, options, realtime=realtime))
+        case _:
+            return Err(Error(f'Invalid frame source \'{spec}\'. Use camera, video, images, synthetic or scene'))
@@ -0,0 +1,153 @@
+from typing import Any, Callable
+from queue import Empty
+import asyncio
+
+from capture.subscription import SubscriptionQueue
+
+from typings.capture.subscription import SubscriptionMode
+
+
+class AsyncSubscriptionQueue(SubscriptionQueue):
+    '''
+    This class describes a subscription queue which is consumed by an asyncio event loop. The producer thread puts
+    items like into any other subscription queue and wakes up the loop via `call_soon_threadsafe`. Wake-ups are
+    coalesced: While one is pending, further items don't schedule another one, so a slow loop doesn't pile up
+    callbacks.
+
+    BLOCK mode blocks the producer thread until the loop retrieved an item, so it must never be used if the
+    producer runs on the loop thread.
+    '''
+
+    def __init__(
+        self,
+        loop: asyncio.AbstractEventLoop,
+        mode: SubscriptionMode = SubscriptionMode.LATEST,
+        size: int = 1
+    ) -> None:
+        '''
+        Create a new async subscription queue.
+
+        Args:
+            loop: The event loop of the consumer.
+            mode: The subscription mode.
+            size: Maximum number of items (Ignored in LATEST mode). Values <= 0 mean unlimited.
+        '''
+        super().__init__(mode, size)
+        self._loop = loop
+        self._event = asyncio.Event()
+        self._wake_pending = False
+
+    def _wake(self):
+        '''
+        Wake up the consumer. This runs on the loop thread.
+        '''
+        with self._cond:
+            self._wake_pending = False
+
+        self._event.set()
+
+    def _schedule_wake(self):
+        '''
+        Schedule a wake-up of the consumer unless one is pending already. This runs on the producer thread.
+        '''
+        with self._cond:
+            if self._wake_pending:
+                return
+            self._wake_pending = True
+
+        try:
+            self._loop.call_soon_threadsafe(self._wake)
+        except RuntimeError:
+            # The loop was closed, nobody is left to wake up
+            pass
+
+    def put(self, item: Any):
+        super().put(item)
+        self._schedule_wake()
+
+    def close(self):
+        super().close()
+        self._schedule_wake()
+
+    async def get_async(self) -> Any:
+        '''
+        Wait for the next item.
+
+        Returns:
+            The item.
+
+        Raises:
+            StopAsyncIteration: If the queue was closed and all items were retrieved.
+        '''
+        while True:
+            # Clear before checking, so that a wake-up between the check and the wait doesn't get lost
+            self._event.clear()
+
+            try:
+                return self.get(False)
+            except Empty:
+                pass
+
+            with self._cond:
+                if self._closed:
+                    raise StopAsyncIteration
+
+            await self._event.wait()
+
+
+class MarkerStream:
+    '''
+    This class describes an asynchronous stream of tracking results. It is returned by `Publisher.stream` and
+    `Publisher.stream_raw` and is consumed with `async for`. The stream ends once it gets closed. It gets closed
+    (unsubscribed) when the consuming task gets cancelled, when leaving an `async with` block and via `close`.
+
+    Example:
+        async with tracker.stream() as stream:
+            async for batch in stream:
+                ...
+    '''
+
+    def __init__(
+        self,
+        queue: AsyncSubscriptionQueue,
+        view: Callable[[Any], Any],
+        unsubscribe: Callable[[], Any]
+    ) -> None:
+        '''
+        Create a new marker stream.
+
+        Args:
+            queue: The subscription queue.
+            view: Extracts the streamed value from a tracking result.
+            unsubscribe: Removes the subscription from the publisher.
+        '''
+        self._queue = queue
+        self._view = view
+        self._unsubscribe = unsubscribe
+        self._closed = False
+
+    def __aiter__(self) -> 'MarkerStream':
+        return self
+
+    async def __anext__(self) -> Any:
+        try:
+            return self._view(await self._queue.get_async())
+        except (asyncio.CancelledError, StopAsyncIteration):
+            self.close()
+            raise
+
+    async def __aenter__(self) -> 'MarkerStream':
+        return self
+
+    async def __aexit__(self, *_):
+        self.close()
+
+    def close(self):
+        '''
+        Unsubscribe from the publisher. This ends the stream after the remaining items were retrieved.
+        '''
+        if self._closed:
+            return
+
+        self._closed = True
+        self._unsubscribe()
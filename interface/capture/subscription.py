@@ -0,0 +1,133 @@
+from typing import Any, Deque, Tuple
+from collections import deque
+from queue import Empty
+import threading
+import time
+
+from typings.capture.subscription import SubscriptionMode, SubscriptionStats
+
+
+class SubscriptionQueue:
+    '''
+    This class describes the queue of a single subscriber. The mode decides what happens when the consumer is slower
+    than the producer:
+
+    - LATEST: Only the newest item is kept (conflating slot). Older items get dropped.
+    - DROP_OLDEST: Up to `size` items are kept. When full, the oldest item gets dropped.
+    - BLOCK: Up to `size` items are kept. When full, `put` blocks the producer until the consumer catches up. Only use
+      this mode if no item may ever be lost.
+
+    Items are stamped with the time of `put`, which is used to track the lag between producer and consumer.
+    '''
+
+    def __init__(self, mode: SubscriptionMode = SubscriptionMode.LATEST, size: int = 1) -> None:
+        '''
+        Create a new subscription queue.
+
+        Args:
+            mode: The subscription mode.
+            size: Maximum number of items (Ignored in LATEST mode). Values <= 0 mean unlimited.
+        '''
+        if mode == SubscriptionMode.LATEST or size == 0:
+            size = 1
+
+        self._items: Deque[Tuple[Any, float]] = deque(maxlen=size if size > 0 else None)
+        self._cond = threading.Condition()
+        self._closed = False
+        self._mode = mode
+        self._size = size
+
+        # Counters
+        self._published = 0
+        self._delivered = 0
+        self._dropped = 0
+        self._last_lag = 0.0
+        self._max_lag = 0.0
+
+    def mode(self) -> SubscriptionMode:
+        '''
+        Returns the subscription mode.
+        '''
+        return self._mode
+
+    def put(self, item: Any):
+        '''
+        Put an item into the queue. This never blocks, except in BLOCK mode when the queue is full.
+
+        Args:
+            item: The item.
+        '''
+        with self._cond:
+            full = self._size > 0 and len(self._items) >= self._size
+
+            if full and self._mode == SubscriptionMode.BLOCK:
+                while not self._closed and len(self._items) >= self._size:
+                    self._cond.wait()
+            elif full:
+                # The deque drops the oldest item on append
+                self._dropped += 1
+
+            if self._closed:
+                return
+
+            self._items.append((item, time.monotonic()))
+            self._published += 1
+            self._cond.notify_all()
+
+    def get(self, block: bool = True, timeout: float | None = None) -> Any:
+        '''
+        Get the next item. This mirrors `Queue.get`.
+
+        Args:
+            block: If the call should block until an item is available.
+            timeout: Maximum time to block in seconds (Default: None => Unlimited).
+
+        Returns:
+            The item.
+
+        Raises:
+            Empty: If no item is available.
+        '''
+        with self._cond:
+            if block:
+                if not self._cond.wait_for(lambda: len(self._items) > 0 or self._closed, timeout):
+                    raise Empty
+
+            if len(self._items) == 0:
+                raise Empty
+
+            item, put_at = self._items.popleft()
+
+            lag = time.monotonic() - put_at
+            self._max_lag = max(self._max_lag, lag)
+            self._last_lag = lag
+            self._delivered += 1
+
+            # Wake up a producer blocked in BLOCK mode
+            self._cond.notify_all()
+            return item
+
+    def close(self):
+        '''
+        Close the queue. This releases blocked producers and consumers.
+        '''
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def stats(self) -> SubscriptionStats:
+        '''
+        Returns a snapshot of the subscription counters.
+
+        Returns:
+            The subscription stats.
+        '''
+        with self._cond:
+            return SubscriptionStats(
+                published=self._published,
+                delivered=self._delivered,
+                dropped=self._dropped,
+                depth=len(self._items),
+                last_lag=self._last_lag,
+                max_lag=self._max_lag,
+            )
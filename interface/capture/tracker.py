@@ -1,40 +1,43 @@
-from typing import List, Tuple
-from queue import Queue
-import numpy as np
+from typing import Tuple
 import cv2 as cv
 import threading
-import math
-
+import time
+
+from capture.detection import detector_options_from
+from capture.pipeline import DetectionPipeline
+from capture.result import TrackingResult
+from capture.frames import Frame, FrameStore
+from capture.filter import MarkerFilter
+from capture.motion import MotionGate
+from capture.publisher import Publisher
+from capture.roi import RoiPredictor
+from capture.source import CameraSource, FrameSource
 from config.config import Config
+from utils.stats import Stages, observe_cost
 import capture.aruco as aruco
+import utils.trace as trace
 import utils.fmt as fmt
 
+from typings.capture.pipeline import DropPolicy, WorkerMode
 from typings.capture.calibration import CharucoCalibrationData
-from typings.capture.aruco import (
-    MarkerBordersList,
-    MarkerCenterList,
-    RawSubscription,
-    Subscription,
-    Subscriber,
-    CornerList,
-    Corners,
-    IDList,
-)
+from typings.capture.stats import TrackerStats
+from typings.capture.aruco import DetectionResult, MarkerBatch
 from typings.error import Err, Error
 
 
-class Tracker:
+class Tracker(Publisher):
     '''
     This class describes a tracker which is able to track ArUco markers.
     '''
 
-    def __init__(self, cfg: Config, calib_data: CharucoCalibrationData) -> None:
+    def __init__(self, cfg: Config, calib_data: CharucoCalibrationData, source: FrameSource | None = None) -> None:
         '''
         Create a new tracker instance.
 
         Args:
             cfg: Configuration data.
             calib_data: Camera calibration data.
+            source: The frame source (Default: None => Camera with the configured device ID).
         '''
         typ = aruco.type_from(
             cfg['capture']['aruco']['size'],
@@ -44,54 +47,123 @@ class Tracker:
         if not ok:
             raise Exception('Failed to instantiate Tracker object')
 
+        mode_result = WorkerMode.from_str(cfg['capture']['tracker']['worker_mode'])
+        if mode_result.is_err():
+            raise Exception('Failed to instantiate Tracker object')
+
+        policy_result = DropPolicy.from_str(cfg['capture']['tracker']['drop_policy'])
+        if policy_result.is_err():
+            raise Exception('Failed to instantiate Tracker object')
+
+        super().__init__()
+
+        # Durations of each stage. Latency is the time between capturing a frame and notifying its result
+        self._stages = Stages(['read', 'convert', 'gate', 'queue', 'detect', 'refine', 'filter', 'notify', 'latency'])
+        self._frame_interval = 0.0
+
         # These values keep track how many frames failed to read
         self._max_failed_read = cfg['capture']['tracker']['max_failed_read']
         self._failed_reads = 0
 
         # ArUco marker related values
-        self._dict = cv.aruco.Dictionary_get(t)
-        self._board = aruco.board_from(3, 3, self._dict, marker_length=0.09, marker_separation=0.01)
         self._path = cfg['capture']['path']
         self._type = t
 
         # Tracking
         self._delay = fmt.fps_to_ms(cfg['capture']['fps'])
-        self._camera_id = cfg['capture']['camera_id']
-        self._subscribers: List[Subscriber] = []
+        self._source = source if source != None else CameraSource(cfg['capture']['camera_id'])
         self.found_rect = False
 
-        # Current frames
-        self._color_frame = np.array([])
-        self._frame = np.array([])
+        # ROI tracking only scans the regions around the predicted marker positions
+        self._predictor = None
+        if cfg['capture']['tracker']['roi']:
+            self._predictor = RoiPredictor(
+                cfg['capture']['tracker']['roi_rescan'],
+                cfg['capture']['tracker']['roi_padding']
+            )
+
+        # Pyramid mode detects on downscaled frames and refines the corners on the full resolution frame
+        options = detector_options_from(cfg)
+
+        # Detection runs in a separate pipeline with one or more workers
+        self._pipeline = DetectionPipeline(
+            t,
+            calib_data,
+            self._on_result,
+            cfg['capture']['tracker']['workers'],
+            mode_result.unwrap(),
+            policy_result.unwrap(),
+            cfg['capture']['tracker']['max_frame_age'],
+            self._predictor,
+            options,
+            cfg['capture']['aruco']['ids'],
+            self._stages
+        )
+
+        # Motion gating skips the detection of frames in which nothing moved and reuses the last result instead
+        self._gate = None
+        if cfg['capture']['tracker']['motion_gate']:
+            self._gate = MotionGate(
+                cfg['capture']['tracker']['motion_threshold'],
+                cfg['capture']['tracker']['idle_after'],
+                cfg['capture']['tracker']['idle_fps']
+            )
+
+        # Temporal filtering of the marker positions, predicted forward to compensate the latency
+        self._filter = None
+        if cfg['capture']['filter']['enabled']:
+            self._filter = MarkerFilter(
+                cfg['capture']['filter']['process_noise'],
+                cfg['capture']['filter']['measurement_noise'],
+                cfg['capture']['filter']['display_latency'],
+                cfg['capture']['filter']['timeout']
+            )
 
-        # Dimensions
-        self._frame_height = 0
-        self._frame_width = 0
+        self._last_result: TrackingResult | None = None
+        self._detect_seq = 0
+        self.static_frames = 0
+
+        # Current frames
+        self._frames = FrameStore()
 
         # Misc
         self._calib = calib_data
+        self._error: Error | None = None
         self._running = False
         self._thread = None
 
-    def _setup(self) -> Tuple[any, any]:
+    def _setup(self) -> Tuple[FrameSource, Error]:
         '''
-        Setup ArUco detection params, capture device and wait delay.
+        Open the frame source and start the detection pipeline.
 
         Returns:
-            The capture device, ArUco detection params and wait delay.
+            The frame source and an Error if the source could not be opened.
         '''
-        params = cv.aruco.DetectorParameters_create()
-        cap = cv.VideoCapture(self._camera_id)
-        cap.set(cv.CAP_PROP_AUTOFOCUS, 0)
-        cap.set(cv.CAP_PROP_AUTO_WB, 0)
-        cap.set(cv.CAP_PROP_FRAME_HEIGHT, self._frame_height)
-        cap.set(cv.CAP_PROP_FRAME_WIDTH, self._frame_width)
+        err = self._source.open()
+        if err != None:
+            return self._source, err
 
         # Retrieve frame height and width
-        self._frame_height = int(cap.get(cv.CAP_PROP_FRAME_HEIGHT))
-        self._frame_width = int(cap.get(cv.CAP_PROP_FRAME_WIDTH))
+        self._frame_width, self._frame_height = self._source.size()
+        self._pipeline.start()
+
+        return self._source, None
+
+    def is_running(self) -> bool:
+        '''
+        Returns if the tracker is running. This turns False when a finite frame source reached its end.
+        '''
+        return self._running
+
+    def error(self) -> Error:
+        '''
+        Returns the error which stopped the tracker (e.g. the frame source could not be opened) or the first error of
+        the detection pipeline, None if there was none. The number of failed frames is part of the stats.
+        '''
+        if self._error != None:
+            return self._error
 
-        return cap, params
+        return self._pipeline.error()
 
     def _is_running(self) -> bool:
         '''
@@ -106,251 +178,262 @@ class Tracker:
         self._running = True
         return False
 
-    def _transform_markers_to_center(self, corner_list: CornerList, ids: IDList) -> MarkerCenterList:
+    def _on_result(self, frame_no: int, timestamp: float, result: DetectionResult):
         '''
-        This functions transforms the list or corners and the list of IDs into a combined list of tuples consisting
-        of the center position <x,y>, the rotation angle and the ID.
+        Receive re-sequenced detection results from the detection pipeline.
 
         Args:
-            corner_list: A list of corners.
-            ids: A list of IDs.
-
-        Returns:
-            A list of markers.
+            frame_no: Frame number.
+            timestamp: Capture timestamp.
+            result: The detection result.
         '''
-        marker_list: MarkerCenterList = []
-        for i, corners_per_marker in enumerate(corner_list):
-            if len(corners_per_marker[0]) != 4:
-                continue
+        tracking_result = TrackingResult(result, frame_no, timestamp)
+        if self._filter != None:
+            start = time.perf_counter()
+            tracking_result = TrackingResult(result, frame_no, timestamp, self._filter.apply(tracking_result.batch))
+            end = time.perf_counter()
+            self._stages.observe('filter', end - start)
+            trace.complete('filter', start, end, 'tracker')
 
-            center = self._extract_center_position(corners_per_marker[0])
-            angle = self._extract_angle(corners_per_marker[0], center)
-            marker_list.append((center, angle, ids[i][0]))
+        self._last_result = tracking_result
 
-        return marker_list
+        if len(result[0]) > 0:
+            start = time.perf_counter()
+            self.notify(tracking_result)
+            end = time.perf_counter()
+            self._stages.observe('notify', end - start)
+            trace.complete('notify', start, end, 'tracker')
+            self._stages.observe('latency', time.monotonic() - timestamp)
 
-    def _transform_markers_to_borders(self, corner_list: CornerList, ids: IDList) -> MarkerBordersList:
+    def _republish(self, frame_no: int, timestamp: float):
         '''
-        This functions transforms the list or corners and the list of IDs into a combined list of tuples consisting
-        of corner positions <x,y>, the center position <x,y>, the rotation angle and the ID.
+        Republish the last detection result for a static frame. Nothing is republished while the detection of the last
+        frame which moved is still pending.
 
         Args:
-            corner_list: A list of corners.
-            ids: A list of IDs.
-
-        Returns:
-            A list of markers.
+            frame_no: Frame number of the static frame.
+            timestamp: Capture timestamp of the static frame.
         '''
-        marker_list: MarkerBordersList = []
-        for i, corners_per_marker in enumerate(corner_list):
-            if len(corners_per_marker[0]) != 4:
-                continue
-
-            center = self._extract_center_position(corners_per_marker[0])
-            angle = self._extract_angle(corners_per_marker[0], center)
-            borders = self._extract_borders(corners_per_marker[0])
-            marker_list.append((borders, center, angle, ids[i][0]))
-
-        return marker_list
-
-    def _extract_center_position(self, corners: Corners) -> Tuple[int, int]:
-        '''
-        Extract the marker center position based on the top-left and bottom-right corner.
-
-        Args:
-            corners: List or corners.
-
-        Returns:
-            Marker center position (x,y).
-        '''
-        center_x = int((corners[0][0] + corners[2][0]) / 2)
-        center_y = int((corners[0][1] + corners[2][1]) / 2)
-
-        return center_x, center_y
-
-    def _extract_borders(
-        self,
-        corners: Corners
-    ) -> Tuple[
-        Tuple[int, int],
-        Tuple[int, int],
-        Tuple[int, int],
-        Tuple[int, int]
-    ]:
-        '''
-        Extract marker corners. Basically this function only converts the position values from floats to integers.
-
-        Args:
-            corners: List of corners.
-
-        Returns:
-            A 4-tuple of corner positions (x,y).
-        '''
-        (tl, tr, br, bl) = corners
-        # NOTE (Techassi): This is giga ugly but I don't know of a better way to achieve this
-        return (int(tl[0]), int(tl[1])), (int(tr[0]), int(tr[1])), (int(br[0]), int(br[1])), (int(bl[0]), int(bl[1]))
-
-    def _extract_angle(self, corners: Corners, center: Tuple[int, int]) -> float:
-        '''
-        Extract the angle from a single marker. The angle gets calculated by first calculating the vector between the
-        center position and the top left corner position. Then we calculate the length to then calculate the unit vector
-        which then can be used to calculate the angle by using arcsin.
-
-        Args:
-            corners: List of corners.
-            center: Marker center position (x,y).
+        cached = self._last_result
+        if cached == None or cached.frame_no < self._detect_seq or len(cached.raw[0]) == 0:
+            return
 
-        Returns:
-            The calculated angle of the marker.
-        '''
-        x, y = center[0] - corners[0][0], center[1] - corners[0][1]  # Vec from center to top left corner
-        len = math.sqrt(math.pow(x, 2) + math.pow(y, 2))  # Calculate length of vec
-        deg = math.degrees(math.asin(y / len))  # Use unit vec to calculate angle
-        return deg
+        batch = MarkerBatch(cached.batch.markers, frame_no, timestamp, True)
+        self.notify(TrackingResult(cached.raw, frame_no, timestamp, batch, True))
 
     def _run(self) -> Error:
         '''
-        Run the main tracking loop. This sets up the ArUco detection params, the video capture and starts tracking.
+        Run the capture stage of the tracking loop. This opens the frame source and submits frames to the detection
+        pipeline.
 
         Returns:
             Non None if an error occured.
         '''
         self._running = True
 
-        # Setup video capture and ArUco detection params
-        cap, params = self._setup()
+        # Setup frame source and detection pipeline
+        source, err = self._setup()
+        if err != None:
+            self._error = err
+            self._running = False
+            return err
 
+        drain = False
+        last_capture = 0.0
         while self._running:
             if self._failed_reads >= self._max_failed_read:
-                return Err('Too many failed frame reads')
-
-            ok, frame = cap.read()
+                self._pipeline.stop()
+                self._frames.close()
+                source.release()
+                self._error = Error('Too many failed frame reads')
+                self._running = False
+                return self._error
+
+            # Read and convert the frame directly into the buffers of a back slot
+            slot = self._frames.begin_write()
+            start = time.perf_counter()
+            ok, frame = source.read(slot.color)
+            read = time.perf_counter()
             if not ok:
+                self._frames.abort(slot)
+
+                # File based sources are done after the last frame. Let the pipeline finish the remaining frames
+                if source.eof():
+                    drain = True
+                    break
+
                 # We don't immediatly quit this loop. We return with an
                 # error when the treshold is reached
                 self._failed_reads += 1
                 continue
 
-            self._color_frame = frame
-            frame = cv.cvtColor(frame, cv.COLOR_BGR2GRAY)
-            self._frame = frame
+            timestamp = time.monotonic()
+            slot.color = frame
+            slot.gray = cv.cvtColor(frame, cv.COLOR_BGR2GRAY, slot.gray)
+            seq = self._frames.commit(slot, timestamp)
+            converted = time.perf_counter()
+
+            self._stages.observe('read', read - start)
+            self._stages.observe('convert', converted - read)
+            trace.complete('read', start, read, 'tracker')
+            trace.complete('convert', read, converted, 'tracker')
+
+            # Smoothed interval between two captured frames
+            if last_capture > 0:
+                self._frame_interval += (timestamp - last_capture - self._frame_interval) * 0.1
+            last_capture = timestamp
+
+            # Skip the detection if nothing moved and step down the frame rate while idle
+            moved = True
+            if self._gate != None:
+                moved = self._gate.moved(slot.gray)
+                gated = time.perf_counter()
+                self._stages.observe('gate', gated - converted)
+                trace.complete('gate', converted, gated, 'tracker')
+
+            if not moved:
+                self.static_frames += 1
+                self._republish(seq, timestamp)
+                time.sleep(self._gate.idle_delay())
+                continue
 
-            # Detect the markers
-            corners, ids, rejected = cv.aruco.detectMarkers(frame, self._dict, parameters=params)
+            # Hand the frame off to the detection workers
+            self._detect_seq = seq
+            self._pipeline.submit(self._frames.latest())
 
-            # Refine markers
-            corners, ids, rejected, recovered = cv.aruco.refineDetectedMarkers(
-                frame, self._board, corners, ids, rejected,
-                cameraMatrix=self._calib[0],
-                distCoeffs=self._calib[1]
-            )
+        # Cleanup
+        err = self._pipeline.stop(drain)
+        self._frames.close()
+        self._running = False
+        source.release()
 
-            if len(corners) > 0:
-                self.notify(corners, ids, rejected, recovered)
+        return err
 
-        # Cleanup
-        cap.release()
+    def stats(self) -> TrackerStats:
+        '''
+        Returns a snapshot of the tracker stats. Taking the snapshot never blocks the tracking loop.
+
+        Returns:
+            The stats.
+        '''
+        frames = self._frames.seq()
+        interval = self._frame_interval
+
+        # The recording cost per frame relative to the frame time
+        overhead = 0.0
+        if frames > 0 and interval > 0:
+            overhead = observe_cost() * self._stages.observations() / frames / interval
+
+        full_scans, roi_scans = 0, 0
+        if self._predictor != None:
+            full_scans, roi_scans = self._predictor.full_scans, self._predictor.roi_scans
+
+        return TrackerStats(
+            frames=frames,
+            fps=1 / interval if interval > 0 else 0.0,
+            failed_reads=self._failed_reads,
+            dropped_frames=self._pipeline.dropped_frames,
+            stale_frames=self._pipeline.stale_frames,
+            static_frames=self.static_frames,
+            detect_errors=self._pipeline.detect_errors,
+            refinements=self._pipeline.refinements,
+            refine_skips=self._pipeline.refine_skips,
+            recovered_markers=self._pipeline.recovered_markers,
+            full_scans=full_scans,
+            roi_scans=roi_scans,
+            stages=self._stages.snapshot(),
+            subscriptions=self.subscription_stats(),
+            overhead=overhead
+        )
 
     def get_frame(self) -> Tuple[bool, cv.Mat]:
         '''
-        Get the current gray scale frame from the tracker.
+        Get a copy of the current gray scale frame from the tracker.
 
         Returns:
             ok: If current frame is available.
             frame: Current frame.
         '''
-        return self._frame.any(), self._frame
+        frame = self._frames.latest()
+        if frame == None:
+            return False, None
+
+        with frame:
+            return True, frame.gray.copy()
 
     def get_color_frame(self) -> Tuple[bool, cv.Mat]:
         '''
-        Get the current color frame from the tracker.
+        Get a copy of the current color frame from the tracker.
 
         Returns:
             ok: If current frame is available.
             frame: Current frame.
         '''
-        return self._frame.any(), self._color_frame
+        frame = self._frames.latest()
+        if frame == None:
+            return False, None
 
-    def start(self) -> Error:
+        with frame:
+            return True, frame.color.copy()
+
+    def frame_seq(self) -> int:
         '''
-        Start the main tracking loop. This sets up the ArUco detection params, the video capture and starts tracking.
+        Returns the sequence number of the newest frame. This is an O(1) availability check.
 
         Returns:
-            Non None if an error occured.
+            The sequence number. 0 if no frame was captured yet.
         '''
-        if self._is_running():
-            return Err('Already running')
+        return self._frames.seq()
 
-        # Construct a new thread
-        t = threading.Thread(None, self._run, 'tracking-thread')
-        self._thread = t
-        t.start()
-
-        return None
-
-    def stop(self):
-        '''
-        Stop the tracker. This stops the tracking loop and joins the thread to wait until it terminates.
+    def latest_frame(self) -> Frame | None:
         '''
-        if not self._running:
-            return
+        Returns the newest frame without copying it. The frame has to be released after use.
 
-        self._running = False
-        self._thread.join()
-
-    def notify(self, corners: CornerList, ids: IDList, rejected, recovered):
+        Returns:
+            The frame or None if no frame was captured yet.
         '''
-        Notify subscribers with detected markers.
+        return self._frames.latest()
 
-        Args:
-            corners: A list of corners of detected markers.
-            ids: A list of recovered markers.
+    def wait_for_frame(self, seq: int, timeout: float | None = None) -> Frame | None:
         '''
-        for sub in self._subscribers:
-            # If the subription is raw, just pass raw values without any processing
-            if sub[0]:
-                sub[1].put((corners, ids, rejected, recovered))
-            else:
-                markers = self._transform_markers_to_borders(corners, ids)
-                sub[1].put(markers)
+        Wait for a frame newer than `seq` without copying it. The frame has to be released after use.
 
-    def subscribe(self, size: int) -> Subscription:
-        '''
-        External consumers can subscribe to this tracker to get real-time marker positions.
+        Args:
+            seq: The sequence number of the last seen frame (Use 0 to wait for the first frame).
+            timeout: Maximum time to wait in seconds (Default: None => Unlimited).
 
         Returns:
-            subscription: A tuple consisting of the subscription ID, frame widht and height and the retrieve function.
+            The frame or None if the timeout expired or the tracker stopped.
         '''
-        q = Queue(size)
-        self._subscribers.append((False, q))
-
-        return len(self._subscribers) - 1, (self._frame_width, self._frame_height), q.get
+        return self._frames.wait_newer(seq, timeout)
 
-    def subscribe_raw(self, size: int) -> RawSubscription:
+    def start(self) -> Error:
         '''
-        External consumers can subscribe to this tracker to get real-time marker positions. This returns raw tracking
-        data instead of cleaned data via the `subscribe` method.
+        Start the main tracking loop. This opens the frame source, starts the detection pipeline and starts tracking.
 
         Returns:
-            subscription: A tuple consisting of the subscription ID, frame widht and height and the retrieve function.
+            Non None if an error occured.
         '''
-        q = Queue(size)
-        self._subscribers.append((True, q))
+        if self._is_running():
+            return Err('Already running')
 
-        return len(self._subscribers) - 1, (self._frame_width, self._frame_height), q.get
+        # Running from here on, so that waiting for the first frame doesn't race with the thread start
+        self._error = None
+        self._running = True
 
-    def unsubscribe(self, index: int) -> Error:
-        '''
-        External subscribers can unsubscribe from this tracker.
+        # Construct a new thread
+        t = threading.Thread(None, self._run, 'tracking-thread')
+        self._thread = t
+        t.start()
 
-        Args:
-            index: The subscription ID.
+        return None
 
-        Returns:
-            Non None if an error occured.
+    def stop(self):
         '''
-        if index < 0 or index > len(self._subscribers) - 1:
-            return Err('Invalid index')
+        Stop the tracker. This stops the tracking loop and joins the thread to wait until it terminates.
+        '''
+        if not self._running:
+            return
 
-        self._subscribers.pop(index)
-        return None
+        self._running = False
+        self._thread.join()
@@ -1,14 +1,17 @@
 # Std and external imports
 from typing import Tuple
 import requests
+import time
 
 # Local imports
+from utils.stats import Histogram
 import config.config as config
 import utils.fmt as fmt
 
 # Local typing imports
 from typings.client import BaseResponse, GraphResponse, RequestResult, Error
 from typings.graph import Graph
+from typings.stats import MetricValues
 
 
 class Client:
@@ -32,6 +35,23 @@ class Client:
             cfg['backend']['port']
         )
 
+        # Metrics
+        self.request_times = {'GET': Histogram(), 'POST': Histogram()}
+        self.request_errors = 0
+
+    def metrics(self) -> MetricValues:
+        '''
+        Returns the metric values of the client.
+
+        Returns:
+            The metric values.
+        '''
+        values: MetricValues = {'client_request_errors_total': self.request_errors}
+        for method, h in self.request_times.items():
+            values[f'client_request_seconds{{method="{method}"}}'] = h.snapshot()
+
+        return values
+
     def _post(self, *paths: str, params: dict = {}, data: any = None):
         '''
         Internal method to create HTTP POST requests.
@@ -48,8 +68,18 @@ class Client:
         if not url:
             return RequestResult(None, -1, 'Unexpected empty URL', True)
 
-        res = requests.post(url, params=params, data=data)
+        start = time.perf_counter()
+        try:
+            res = requests.post(url, params=params, data=data)
+        except requests.RequestException:
+            # Connection errors and timeouts never get a status code
+            self.request_errors += 1
+            raise
+        finally:
+            self.request_times['POST'].observe(time.perf_counter() - start)
+
         if res.status_code >= 400:
+            self.request_errors += 1
             return RequestResult(None, res.status_code, 'Unexpected status code', True)
 
         try:
@@ -74,8 +104,18 @@ class Client:
         if not url:
             return RequestResult(None, -1, 'Unexpected empty URL', True)
 
-        res = requests.get(url, params=params, data=data)
+        start = time.perf_counter()
+        try:
+            res = requests.get(url, params=params, data=data)
+        except requests.RequestException:
+            # Connection errors and timeouts never get a status code
+            self.request_errors += 1
+            raise
+        finally:
+            self.request_times['GET'].observe(time.perf_counter() - start)
+
         if res.status_code >= 400:
+            self.request_errors += 1
             return RequestResult(None, res.status_code, 'Unexpected status code', True)
 
         try:
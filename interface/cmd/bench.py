@@ -0,0 +1,66 @@
+from typing import List
+import click
+import json
+
+from bench.runner import compare_reports, format_report, read_report, run_suites, write_report
+from config.config import read_config
+
+from typings.bench import BenchOptions
+
+
+def execute(
+    config_path: str,
+    suites: List[str],
+    options: BenchOptions,
+    output: str = '',
+    baseline: str = '',
+    tolerance: float = 0.1
+) -> bool:
+    '''
+    Run benchmark suites, print or save the report and compare it against a baseline.
+
+    Returns:
+        False if the benchmarks failed or regressed compared to the baseline.
+    '''
+    config_result = read_config(config_path, True)
+    if config_result.is_err():
+        click.echo(f'Error while reading config: {config_result.error().string()}')
+        return False
+    cfg = config_result.unwrap()
+
+    click.echo(f'Running benchmark suites: {", ".join(suites)}', err=True)
+
+    report_result = run_suites(cfg, suites, options)
+    if report_result.is_err():
+        click.echo(f'Error while benchmarking: {report_result.error().string()}')
+        return False
+    report = report_result.unwrap()
+
+    click.echo('\n'.join(format_report(report)), err=True)
+
+    if output:
+        err = write_report(output, report)
+        if err != None:
+            click.echo(err.string())
+            return False
+    else:
+        click.echo(json.dumps(report, indent=2))
+
+    if not baseline:
+        return True
+
+    baseline_result = read_report(baseline)
+    if baseline_result.is_err():
+        click.echo(f'Error while reading baseline: {baseline_result.error().string()}')
+        return False
+
+    regressions = compare_reports(report, baseline_result.unwrap(), tolerance)
+    if len(regressions) == 0:
+        click.echo(f'No regressions compared to \'{baseline}\'', err=True)
+        return True
+
+    click.echo(f'Regressions compared to \'{baseline}\':', err=True)
+    for regression in regressions:
+        click.echo(f'  {regression}', err=True)
+
+    return False
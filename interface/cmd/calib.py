@@ -2,11 +2,12 @@ import click
 import os
 
 from capture.calibration import Calibration, dump_calibration_result
+from capture.source import source_from
 from utils.input import confirmation_prompt
 from config.config import read_config
 
 
-def execute(config_path: str, verbose: bool):
+def execute(config_path: str, verbose: bool, source: str = '', realtime: bool = False):
     config_result = read_config(config_path)
     if config_result.is_err():
         click.echo(f'Error while reading config: {err.message}')
@@ -20,7 +21,12 @@ def execute(config_path: str, verbose: bool):
         if not confirmation_prompt('A calibration file already exists. Overide?'):
             return
 
-    c = Calibration(cfg, verbose)
+    source_result = source_from(cfg, source, realtime)
+    if source_result.is_err():
+        click.echo(f'Error while opening frame source: {source_result.error().string()}')
+        return
+
+    c = Calibration(cfg, verbose, source_result.unwrap())
 
     calib_result = c.calibrate()
     if calib_result.is_err():
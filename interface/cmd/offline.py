@@ -0,0 +1,41 @@
+import click
+
+from capture.offline import track_offline
+from utils.input import handle_calibration
+from config.config import read_config
+
+
+def execute(config_path: str, calib_mode: str, input_path: str, output_path: str, workers: int):
+    click.echo('Reading TOML config file...')
+
+    config_result = read_config(config_path, True)
+    if config_result.is_err():
+        click.echo(f'Error while reading config: {config_result.error().string()}')
+        return
+    cfg = config_result.unwrap()
+
+    click.echo('Reading / capturing calibration data...')
+
+    calib_result = handle_calibration(cfg, calib_mode, f'video:{input_path}')
+    if calib_result.is_err():
+        click.echo(f'Error while calibration: {calib_result.error().string()}')
+        return
+    calib_data = calib_result.unwrap()
+
+    click.echo(f'Tracking \'{input_path}\'...')
+
+    def progress(done: int, chunks: int, frames: int):
+        click.echo(f'Chunk {done}/{chunks} done, {frames} frames tracked')
+
+    result = track_offline(cfg, calib_data, input_path, output_path, workers, progress)
+    if result.is_err():
+        click.echo(f'Error while tracking: {result.error().string()}')
+        return
+    stats = result.unwrap()
+
+    fps = stats['frames'] / stats['elapsed'] if stats['elapsed'] > 0 else 0.0
+    click.echo(
+        f'Tracked {stats["frames"]} frames with {stats["markers"]} markers in {stats["elapsed"]:.1f}s '
+        f'({fps:.1f} fps, {stats["workers"]} workers)'
+    )
+    click.echo(f'Wrote trajectories to \'{output_path}\'')
@@ -1,6 +1,11 @@
 import click
 
+from bench.suites import SUITES
+from typings.bench import BenchOptions
+
+import cmd.offline as offline
 import cmd.track as track
+import cmd.bench as bench
 import cmd.calib as calib
 import cmd.gen as gen
 import cmd.run as run
@@ -46,32 +51,117 @@ def gen_board(config_path: str, cols: int, rows: int, width, height):
 @cli.command('run')
 @click.option('-c', '--config', 'config_path', default='config.toml', help='Path to the TOML config file', type=str, show_default=True)
 @click.option('-m', '--mode', default='auto', help="The calibration mode. Can be 'auto', 'semi' or 'manual'", type=str, show_default=True)
-def run_cmd(config_path: str, mode: str):
+@click.option('-s', '--source', default='', help="Frame source: 'camera:<id>', 'video:<path>', 'images:<dir>', 'synthetic:<n>' or 'scene:<n>' (Default: configured camera)", type=str)
+@click.option('--realtime', default=False, help='Replay file based frame sources at their native frame rate', type=bool, show_default=True, is_flag=True)
+@click.option('-p', '--processes', default=False, help='Run the tracker in a separate process connected via shared memory', type=bool, show_default=True, is_flag=True)
+@click.option('--trace', 'trace_path', default='', help='Record trace events and write them as Chrome trace JSON to this path on exit', type=str)
+@click.option('--record', 'record_path', default='', help='Record the tracked markers to this path', type=str)
+@click.option('--replay', 'replay_path', default='', help='Replay a marker recording instead of tracking', type=str)
+@click.option('--speed', default=1.0, help='Replay speed relative to the recorded pace (0 => As fast as possible)', type=float, show_default=True)
+def run_cmd(
+    config_path: str,
+    mode: str,
+    source: str,
+    realtime: bool,
+    processes: bool,
+    trace_path: str,
+    record_path: str,
+    replay_path: str,
+    speed: float
+):
     '''
     Run the main application.
     '''
-    run.execute(config_path, mode)
+    run.execute(config_path, mode, source, realtime, processes, trace_path, record_path, replay_path, speed)
 
 
 @cli.command('track')
 @click.option('-c', '--config', 'config_path', default='config.toml', help='Path to the TOML config file', type=str, show_default=True)
 @click.option('-m', '--mode', default='auto', help="The calibration mode. Can be 'auto', 'semi' or 'manual'", type=str, show_default=True)
 @click.option('--color', default=False, help='Display the debug renderer in color mode', type=bool, show_default=True, is_flag=True)
-def track_cmd(config_path: str, mode: str, color: bool):
+@click.option('-s', '--source', default='', help="Frame source: 'camera:<id>', 'video:<path>', 'images:<dir>', 'synthetic:<n>' or 'scene:<n>' (Default: configured camera)", type=str)
+@click.option('--realtime', default=False, help='Replay file based frame sources at their native frame rate', type=bool, show_default=True, is_flag=True)
+@click.option('-p', '--processes', default=False, help='Run the tracker in a separate process connected via shared memory', type=bool, show_default=True, is_flag=True)
+@click.option('--stats', default=False, help='Periodically print tracker stage timings and counters', type=bool, show_default=True, is_flag=True)
+@click.option('--trace', 'trace_path', default='', help='Record trace events and write them as Chrome trace JSON to this path on exit', type=str)
+@click.option('--record', 'record_path', default='', help='Record the tracked markers to this path', type=str)
+def track_cmd(
+    config_path: str,
+    mode: str,
+    color: bool,
+    source: str,
+    realtime: bool,
+    processes: bool,
+    stats: bool,
+    trace_path: str,
+    record_path: str
+):
     '''
     Run tracking in debug mode.
     '''
-    track.execute(config_path, mode, color)
+    track.execute(config_path, mode, color, source, realtime, processes, stats, trace_path, record_path)
+
+
+@cli.command('track-offline')
+@click.option('-c', '--config', 'config_path', default='config.toml', help='Path to the TOML config file', type=str, show_default=True)
+@click.option('-m', '--mode', default='auto', help="The calibration mode. Can be 'auto', 'semi' or 'manual'", type=str, show_default=True)
+@click.option('-i', '--input', 'input_path', required=True, help='Path to the video file', type=str)
+@click.option('-o', '--output', 'output_path', default='trajectory.mkr', help='Write the marker recording to this path', type=str, show_default=True)
+@click.option('-w', '--workers', default=0, help='Number of worker processes (Default: number of CPUs)', type=int)
+def track_offline_cmd(config_path: str, mode: str, input_path: str, output_path: str, workers: int):
+    '''
+    Track the markers of a recorded video in parallel as fast as possible.
+    '''
+    offline.execute(config_path, mode, input_path, output_path, workers)
 
 
 @cli.command('calib')
 @click.option('-c', '--config', 'config_path', default='config.toml', help='Path to the TOML config file', type=str, show_default=True)
 @click.option('-v', '--verbose', default=False, help='Use verbose output', type=bool, show_default=True)
-def calibrate_cmd(config_path: str, verbose: bool):
+@click.option('-s', '--source', default='', help="Frame source: 'camera:<id>', 'video:<path>', 'images:<dir>', 'synthetic:<n>' or 'scene:<n>' (Default: configured camera)", type=str)
+@click.option('--realtime', default=False, help='Replay file based frame sources at their native frame rate', type=bool, show_default=True, is_flag=True)
+def calibrate_cmd(config_path: str, verbose: bool, source: str, realtime: bool):
     '''
     Calibrate the camera in manual mode.
     '''
-    calib.execute(config_path, verbose)
+    calib.execute(config_path, verbose, source, realtime)
+
+
+@cli.group('bench')
+def bench_group():
+    '''
+    Benchmark tracking, rendering and the backend client.
+    '''
+    pass
+
+
+@bench_group.command('run')
+@click.option('-c', '--config', 'config_path', default='config.toml', help='Path to the TOML config file', type=str, show_default=True)
+@click.option('--suite', 'suites', multiple=True, help='Suite to run, can be repeated (Default: all suites)', type=click.Choice(list(SUITES.keys())))
+@click.option('-n', '--iterations', default=200, help='Number of measured iterations per case', type=int, show_default=True)
+@click.option('-s', '--source', default='', help="Frame source spec of the tracker suite (Default: synthetic scene with ground truth)", type=str)
+@click.option('--markers', default=10, help='Number of markers in the synthetic scene', type=int, show_default=True)
+@click.option('--objects', default=100, help='Number of render objects and graph nodes', type=int, show_default=True)
+@click.option('-o', '--output', default='', help='Write the JSON report to this path (Default: print to stdout)', type=str)
+@click.option('-b', '--baseline', default='', help='Compare against this JSON report and fail on regressions', type=str)
+@click.option('--tolerance', default=0.1, help='Allowed relative p95 latency and throughput change compared to the baseline', type=float, show_default=True)
+def bench_run(
+    config_path: str,
+    suites: tuple,
+    iterations: int,
+    source: str,
+    markers: int,
+    objects: int,
+    output: str,
+    baseline: str,
+    tolerance: float
+):
+    '''
+    Run benchmark suites and report latency percentiles, throughput and peak RSS as JSON.
+    '''
+    options = BenchOptions(iterations=iterations, source=source, markers=markers, objects=objects)
+    if not bench.execute(config_path, list(suites) or list(SUITES.keys()), options, output, baseline, tolerance):
+        raise click.exceptions.Exit(1)
 
 
 def execute():
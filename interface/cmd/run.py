@@ -4,10 +4,24 @@ import click
 from utils.input import handle_calibration
 from renderer.renderer import Renderer
 from config.config import read_config
-from capture.tracker import Tracker
+from capture.recording import Recorder, open_recording
+from capture.replay import ReplayTracker
+from capture.bus import tracker_from
+from utils.metrics import server_from, tracker_metrics
+import utils.trace as trace
 
 
-def execute(config_path: str, calib_mode: str):
+def execute(
+    config_path: str,
+    calib_mode: str,
+    source: str = '',
+    realtime: bool = False,
+    processes: bool = False,
+    trace_path: str = '',
+    record_path: str = '',
+    replay_path: str = '',
+    speed: float = 1.0
+):
     # Load config
     config_result = read_config(config_path, True)
     if config_result.is_err():
@@ -18,25 +32,82 @@ def execute(config_path: str, calib_mode: str):
     # Check if the user already calibrated the camera via the separate command. If yes, we prompt the user to either use
     # the existing data or re-do the calibration. If no, we prompt the user to do the calibration or exit the
     # application.
-    calib_result = handle_calibration(cfg, calib_mode)
+    calib_result = handle_calibration(cfg, calib_mode, source, realtime)
     if calib_result.is_err():
         click.echo(f'Error while calibration: {calib_result.error().string()}')
         return
     calib_data = calib_result.unwrap()
 
-    # Create tracker
-    tracker = Tracker(cfg, calib_data)
+    # Record trace events of all threads from here on
+    if trace_path:
+        trace.enable()
+
+    # Create tracker or replay a recording instead
+    if replay_path:
+        recording_result = open_recording(replay_path)
+        if recording_result.is_err():
+            click.echo(f'Error while opening recording: {recording_result.error().string()}')
+            return
+
+        tracker = ReplayTracker(recording_result.unwrap(), speed)
+    else:
+        tracker_result = tracker_from(cfg, calib_data, source, realtime, processes)
+        if tracker_result.is_err():
+            click.echo(f'Error while opening frame source: {tracker_result.error().string()}')
+            return
+
+        tracker = tracker_result.unwrap()
+
     err = tracker.start()
     if err != None:
-        click.echo(err.message)
+        click.echo(err.string())
+        return
+
+    # Record the tracking results
+    recorder = None
+    if record_path:
+        recorder = Recorder(tracker, record_path)
+        err = recorder.start()
+        if err != None:
+            click.echo(err.string())
+            recorder = None
 
     click.echo('Tracking running...')
     click.echo('Start rendering...')
 
     # Create renderer
     renderer = Renderer(cfg, calib_data, tracker)
+
+    # Export tracker and renderer metrics
+    metrics = server_from(cfg, [lambda: tracker_metrics(tracker.stats()), renderer.metrics])
+    if metrics != None:
+        err = metrics.start()
+        if err != None:
+            click.echo(err.string())
+            metrics = None
+
     err = renderer.start()
     if err != None:
         click.echo(err.message)
 
+    if renderer.scheduler != None:
+        stats = renderer.scheduler.stats()
+        click.echo(
+            f'Presented {stats["presented"]} frames, missed {stats["missed"]} deadlines, '
+            f'{stats["render_errors"]} render errors'
+        )
+
+    if metrics != None:
+        metrics.stop()
+
+    if recorder != None:
+        err = recorder.stop()
+        if err != None:
+            click.echo(err.string())
+
+    if trace_path:
+        err = trace.flush(trace_path)
+        if err != None:
+            click.echo(err.string())
+
     # TODO (Techassi): Handle interupts and call t.stop()
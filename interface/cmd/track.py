@@ -1,12 +1,27 @@
+import threading
 import click
 
 from utils.input import handle_calibration
 from renderer.debug import DebugRenderer
 from config.config import read_config
-from capture.tracker import Tracker
+from capture.recording import Recorder
+from capture.bus import tracker_from
+from utils.stats import dump_periodically
+from utils.metrics import server_from, tracker_metrics
+import utils.trace as trace
 
 
-def execute(config_path: str, calib_mode: str, use_color: bool):
+def execute(
+    config_path: str,
+    calib_mode: str,
+    use_color: bool,
+    source: str = '',
+    realtime: bool = False,
+    processes: bool = False,
+    stats: bool = False,
+    trace_path: str = '',
+    record_path: str = ''
+):
     click.echo('Reading TOML config file...')
 
     config_result = read_config(config_path, True)
@@ -17,7 +32,7 @@ def execute(config_path: str, calib_mode: str, use_color: bool):
 
     click.echo('Reading / capturing calibration data...')
 
-    calib_result = handle_calibration(cfg, calib_mode)
+    calib_result = handle_calibration(cfg, calib_mode, source, realtime)
     if calib_result.is_err():
         click.echo(f'Error while calibration: {calib_result.error().string()}')
         return
@@ -25,13 +40,69 @@ def execute(config_path: str, calib_mode: str, use_color: bool):
 
     click.echo('Tracking running in debug mode...')
 
+    # Record trace events of all threads from here on
+    if trace_path:
+        trace.enable()
+
     # Create tracker, force debugging
-    tracker = Tracker(cfg, calib_data)
+    tracker_result = tracker_from(cfg, calib_data, source, realtime, processes)
+    if tracker_result.is_err():
+        click.echo(f'Error while opening frame source: {tracker_result.error().string()}')
+        return
+
+    tracker = tracker_result.unwrap()
     err = tracker.start()
     if err != None:
         click.echo(err.string())
+        return
+
+    # Record the tracking results
+    recorder = None
+    if record_path:
+        recorder = Recorder(tracker, record_path)
+        err = recorder.start()
+        if err != None:
+            click.echo(err.string())
+            recorder = None
+
+    # Periodically dump the tracker stats to the console
+    stop_stats = threading.Event()
+    if stats:
+        t = threading.Thread(None, dump_periodically, 'stats-printer', (tracker.stats, stop_stats), daemon=True)
+        t.start()
 
     renderer = DebugRenderer(cfg, tracker, use_color)
+
+    # Export tracker and renderer metrics
+    metrics = server_from(cfg, [lambda: tracker_metrics(tracker.stats()), renderer.metrics])
+    if metrics != None:
+        err = metrics.start()
+        if err != None:
+            click.echo(err.string())
+            metrics = None
+
     err = renderer.start()
     if err != None:
         click.echo(err.string())
+
+    if renderer.scheduler != None:
+        stats = renderer.scheduler.stats()
+        click.echo(
+            f'Presented {stats["presented"]} frames, missed {stats["missed"]} deadlines, '
+            f'{stats["render_errors"]} render errors'
+        )
+
+    if metrics != None:
+        metrics.stop()
+
+    if recorder != None:
+        err = recorder.stop()
+        if err != None:
+            click.echo(err.string())
+
+    if trace_path:
+        err = trace.flush(trace_path)
+        if err != None:
+            click.echo(err.string())
+
+    stop_stats.set()
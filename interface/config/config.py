@@ -1,4 +1,4 @@
-from typing import TypedDict
+from typing import List, TypedDict
 import toml
 import os
 
@@ -8,6 +8,9 @@ from typings.error import Result, Error, Err, Ok
 
 ARUCO_ALLOWED_UNIQUES = [50, 100, 250, 1000]
 ARUCO_ALLOWED_SIZES = [4, 5, 6, 7]
+TRACKER_ALLOWED_WORKER_MODES = ['thread', 'process']
+TRACKER_ALLOWED_DROP_POLICIES = ['latest', 'none']
+TRACKER_ALLOWED_PYRAMID_SCALES = [1, 2, 4]
 
 
 class BackendOptions(TypedDict):
@@ -17,9 +20,31 @@ class BackendOptions(TypedDict):
 
 class TrackerOptions(TypedDict):
     max_failed_read: int
+    max_frame_age: int
+    drop_policy: str
+    worker_mode: str
+    workers: int
+    roi: bool
+    roi_rescan: int
+    roi_padding: float
+    pyramid_scale: int
+    subpix_window: int
+    subpix_iterations: int
+    motion_gate: bool
+    motion_threshold: float
+    idle_after: float
+    idle_fps: int
     debug: bool
 
 
+class FilterOptions(TypedDict):
+    measurement_noise: float
+    display_latency: int
+    process_noise: float
+    enabled: bool
+    timeout: int
+
+
 class CalibrationOptions(TypedDict):
     number_images: int
     interval: float
@@ -32,11 +57,13 @@ class CalibrationOptions(TypedDict):
 class ArUcoOtions(TypedDict):
     uniques: int
     size: int
+    ids: List[int]
 
 
 class CaptureOptions(TypedDict):
     calibration: CalibrationOptions
     tracker: TrackerOptions
+    filter: FilterOptions
     aruco: ArUcoOtions
     camera_id: int
     path: str
@@ -45,14 +72,75 @@ class CaptureOptions(TypedDict):
 
 class RendererOptions(TypedDict):
     transform_interval: float
+    fps: int
     height: int
     width: int
 
 
+class MetricsOptions(TypedDict):
+    enabled: bool
+    host: str
+    port: int
+
+
 class Config(TypedDict):
     renderer: RendererOptions
     backend: BackendOptions
     capture: CaptureOptions
+    metrics: MetricsOptions
+
+
+# Defaults of optional config keys. Config files written before these keys existed keep working, a missing [metrics]
+# section disables the metrics export
+DEFAULTS = {
+    'capture': {
+        'aruco': {
+            'ids': [],
+        },
+        'tracker': {
+            'workers': 1,
+            'worker_mode': 'thread',
+            'drop_policy': 'latest',
+            'max_frame_age': 0,
+            'roi': False,
+            'roi_rescan': 30,
+            'roi_padding': 0.5,
+            'pyramid_scale': 1,
+            'subpix_window': 5,
+            'subpix_iterations': 20,
+            'motion_gate': False,
+            'motion_threshold': 8.0,
+            'idle_after': 2.0,
+            'idle_fps': 5,
+        },
+        'filter': {
+            'enabled': False,
+            'process_noise': 1000.0,
+            'measurement_noise': 1.0,
+            'display_latency': 0,
+            'timeout': 500,
+        },
+    },
+    'renderer': {
+        'fps': 60,
+    },
+    'metrics': {
+        'enabled': False,
+        'host': '127.0.0.1',
+        'port': 9464,
+    },
+}
+
+
+def _fill_defaults(cfg: dict, defaults: dict):
+    '''
+    Add missing keys to the config (in place). Sections get filled recursively.
+    '''
+    for key, value in defaults.items():
+        if isinstance(value, dict):
+            _fill_defaults(cfg.setdefault(key, {}), value)
+        elif key not in cfg:
+            cfg[key] = list(value) if isinstance(value, list) else value
 
 
 def read_config(path: str, auto_validate: bool = False) -> Result[Config, Error]:
@@ -74,6 +162,7 @@ def read_config(path: str, auto_validate: bool = False) -> Result[Config, Error]
 
     try:
         config = toml.load(path, Config)
+        _fill_defaults(config, DEFAULTS)
 
         if not auto_validate:
             return Ok(config)
@@ -86,6 +175,8 @@ def read_config(path: str, auto_validate: bool = False) -> Result[Config, Error]
 
     except toml.TomlDecodeError:
         return Err(Error('TOML decode error'))
+    except KeyError as e:
+        return Err(Error(f'Missing config key {e}'))
 
 
 def validate(cfg: Config) -> Error:
@@ -116,9 +207,61 @@ def validate(cfg: Config) -> Error:
     if not checks.is_in(cfg['capture']['aruco']['size'], ARUCO_ALLOWED_SIZES):
         return Error(f'Invalid ArUco size. Allowed are: {ARUCO_ALLOWED_SIZES}')
 
+    for id in cfg['capture']['aruco']['ids']:
+        if id < 0 or id >= cfg['capture']['aruco']['uniques']:
+            return Error(f'Invalid ArUco ID {id}. Choose value >= 0 and < uniques')
+
     if cfg['capture']['tracker']['max_failed_read'] < 0:
         return Error('Invalid max failed read amount')
 
+    if cfg['capture']['tracker']['workers'] <= 0:
+        return Error('Invalid number of tracker workers. Choose value > 0')
+
+    if not checks.is_in(cfg['capture']['tracker']['worker_mode'], TRACKER_ALLOWED_WORKER_MODES):
+        return Error(f'Invalid tracker worker mode. Allowed are: {TRACKER_ALLOWED_WORKER_MODES}')
+
+    if not checks.is_in(cfg['capture']['tracker']['drop_policy'], TRACKER_ALLOWED_DROP_POLICIES):
+        return Error(f'Invalid tracker drop policy. Allowed are: {TRACKER_ALLOWED_DROP_POLICIES}')
+
+    if cfg['capture']['tracker']['max_frame_age'] < 0:
+        return Error('Invalid max frame age. Choose value >= 0')
+
+    if cfg['capture']['tracker']['roi_rescan'] <= 0:
+        return Error('Invalid ROI rescan interval. Choose value > 0')
+
+    if cfg['capture']['tracker']['roi_padding'] < 0:
+        return Error('Invalid ROI padding. Choose value >= 0')
+
+    if not checks.is_in(cfg['capture']['tracker']['pyramid_scale'], TRACKER_ALLOWED_PYRAMID_SCALES):
+        return Error(f'Invalid tracker pyramid scale. Allowed are: {TRACKER_ALLOWED_PYRAMID_SCALES}')
+
+    if cfg['capture']['tracker']['subpix_window'] <= 0:
+        return Error('Invalid sub-pixel window size. Choose value > 0')
+
+    if cfg['capture']['tracker']['subpix_iterations'] <= 0:
+        return Error('Invalid number of sub-pixel iterations. Choose value > 0')
+
+    if cfg['capture']['tracker']['motion_threshold'] < 0:
+        return Error('Invalid motion threshold. Choose value >= 0')
+
+    if cfg['capture']['tracker']['idle_after'] < 0:
+        return Error('Invalid idle delay. Choose value >= 0')
+
+    if cfg['capture']['tracker']['idle_fps'] <= 0:
+        return Error('Invalid idle FPS. Choose value > 0')
+
+    if cfg['capture']['filter']['process_noise'] <= 0:
+        return Error('Invalid filter process noise. Choose value > 0')
+
+    if cfg['capture']['filter']['measurement_noise'] <= 0:
+        return Error('Invalid filter measurement noise. Choose value > 0')
+
+    if cfg['capture']['filter']['display_latency'] < 0:
+        return Error('Invalid display latency. Choose value >= 0')
+
+    if cfg['capture']['filter']['timeout'] < 0:
+        return Error('Invalid filter timeout. Choose value >= 0')
+
     if cfg['capture']['calibration']['number_images'] <= 0:
         return Error('Invalid number of calibration images. Choose value > 0. More than 5 recommended')
 
@@ -140,10 +283,19 @@ def validate(cfg: Config) -> Error:
     if cfg['renderer']['transform_interval'] <= 0:
         return Error('Invalid transform interval. Choose value > 0')
 
+    if cfg['renderer']['fps'] <= 0:
+        return Error('Invalid renderer FPS. Choose value > 0')
+
     if cfg['renderer']['height'] < 0:
         return Error('Invalid renderer height')
 
     if cfg['renderer']['width'] < 0:
         return Error('Invalid renderer width')
 
+    if not cfg['metrics']['host']:
+        return Error('Invalid metrics host')
+
+    if cfg['metrics']['port'] < 0 or cfg['metrics']['port'] > 65535:
+        return Error('Invalid metrics port')
+
     return None
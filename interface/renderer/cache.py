@@ -0,0 +1,180 @@
+from typing import List, Tuple, TypeAlias
+import numpy as np
+import cv2 as cv
+
+from capture.roi import merge_rois
+
+from typings.renderer import Rect, RenderLayer
+
+# Padding in pixels around redrawn regions. OpenCV rasterizes shapes which get clipped by the image border slightly
+# differently, so regions get drawn into padded buffers and only the region itself gets copied back.
+CLIP_PADDING = 8
+
+# Pre-rendered pixels of a region and the mask of the pixels which were drawn
+Stamp: TypeAlias = Tuple[Rect, np.ndarray, np.ndarray]
+
+
+class LayerCache:
+    '''
+    This class caches static render layers pre-composited with the background. Static layers which are drawn before
+    the first dynamic layer get composited into the base frame. Static layers which are drawn after a dynamic layer
+    can't be part of the base, because they have to stay on top. These get cached as stamps: The pixels of their
+    objects and a mask of the drawn pixels, which get copied over the dynamic layers.
+
+    The cache gets rebuilt when the background or the set of layers changes or when a static layer changed. Without
+    baking, the base is the background itself and all static layers get cached as stamps. This is used for
+    backgrounds which change in place, e.g. the warped output.
+    '''
+
+    def __init__(self, bake: bool = True) -> None:
+        '''
+        Create a new layer cache.
+
+        Args:
+            bake: If static layers may be composited into a copy of the background.
+        '''
+        self._key: Tuple | None = None
+        self._bake = bake
+
+        # The background with all static layers before the first dynamic layer
+        self.base: np.ndarray | None = None
+
+        # The remaining layers in draw order. Static layers are replaced by their stamps
+        self._steps: List[RenderLayer | List[Stamp]] = []
+
+        # Frame sized buffer which redrawn regions get drawn into, each region uses its top left corner
+        self._scratch: np.ndarray | None = None
+
+        # Counters
+        self.rebuilds = 0
+
+    def valid(self, background: cv.Mat, layers: List[RenderLayer]) -> bool:
+        '''
+        Returns if the cache matches the background and the layers and no static layer changed.
+
+        Args:
+            background: The frame without any objects.
+            layers: The render layers in draw order.
+        '''
+        if self._key != self._key_of(background, layers):
+            return False
+
+        return not any(layer.changed() for layer in layers if layer._static)
+
+    def rebuild(self, background: cv.Mat, layers: List[RenderLayer]):
+        '''
+        Composite the static layers.
+
+        Args:
+            background: The frame without any objects.
+            layers: The render layers in draw order.
+        '''
+        self._key = self._key_of(background, layers)
+        self.base = background.copy() if self._bake else background
+        self._steps = []
+        self.rebuilds += 1
+
+        below = self._bake
+        for layer in layers:
+            if not layer._static:
+                below = False
+                self._steps.append(layer)
+            elif below:
+                layer.render(self.base)
+            else:
+                self._steps.append(self._stamps(layer, background.shape))
+                layer.mark_rendered()
+
+    def render(self, frame: cv.Mat):
+        '''
+        Render the full frame: The base followed by the dynamic layers and the stamps of the static layers on top.
+
+        Args:
+            frame: The frame to render in.
+        '''
+        np.copyto(frame, self.base)
+
+        for step in self._steps:
+            if isinstance(step, RenderLayer):
+                step.render(frame)
+            else:
+                for rect, pixels, mask in step:
+                    x0, y0, x1, y1 = rect
+                    np.copyto(frame[y0:y1, x0:x1], pixels, where=mask)
+
+    def render_region(self, frame: cv.Mat, rect: Rect):
+        '''
+        Redraw a region of the frame. The region gets drawn into a padded copy of the base in the scratch buffer and
+        then copied back.
+
+        Args:
+            frame: The frame to render in.
+            rect: The region to redraw.
+        '''
+        fh, fw = frame.shape[:2]
+        x0, y0, x1, y1 = rect
+        px0, py0 = max(x0 - CLIP_PADDING, 0), max(y0 - CLIP_PADDING, 0)
+        px1, py1 = min(x1 + CLIP_PADDING, fw), min(y1 + CLIP_PADDING, fh)
+
+        if self._scratch is None or self._scratch.shape != self.base.shape:
+            self._scratch = np.empty_like(self.base)
+
+        scratch = self._scratch[:py1 - py0, :px1 - px0]
+        np.copyto(scratch, self.base[py0:py1, px0:px1])
+        for step in self._steps:
+            if isinstance(step, RenderLayer):
+                step.render_region(scratch, (px0, py0), rect)
+                continue
+
+            for (sx0, sy0, sx1, sy1), pixels, mask in step:
+                # Intersect the stamp with the scratch buffer
+                ix0, iy0, ix1, iy1 = max(sx0, px0), max(sy0, py0), min(sx1, px1), min(sy1, py1)
+                if ix1 <= ix0 or iy1 <= iy0:
+                    continue
+
+                np.copyto(
+                    scratch[iy0 - py0:iy1 - py0, ix0 - px0:ix1 - px0],
+                    pixels[iy0 - sy0:iy1 - sy0, ix0 - sx0:ix1 - sx0],
+                    where=mask[iy0 - sy0:iy1 - sy0, ix0 - sx0:ix1 - sx0]
+                )
+
+        frame[y0:y1, x0:x1] = scratch[y0 - py0:y1 - py0, x0 - px0:x1 - px0]
+
+    def _stamps(self, layer: RenderLayer, shape: Tuple[int, ...]) -> List[Stamp]:
+        '''
+        Pre-render the objects of a static layer. The drawn pixels are found by rendering each region on a black and
+        on a white buffer: Only pixels which were drawn are the same in both.
+        '''
+        fh, fw = shape[:2]
+        rects = []
+        for obj in layer._objects.values():
+            bounds = obj.bounds()
+            if bounds != None:
+                x0, y0, x1, y1 = bounds
+                rects.append((max(x0, 0), max(y0, 0), min(x1, fw), min(y1, fh)))
+
+        stamps = []
+        for rect in merge_rois(rects):
+            x0, y0, x1, y1 = rect
+            px0, py0 = max(x0 - CLIP_PADDING, 0), max(y0 - CLIP_PADDING, 0)
+            px1, py1 = min(x1 + CLIP_PADDING, fw), min(y1 + CLIP_PADDING, fh)
+
+            black = np.zeros((py1 - py0, px1 - px0) + tuple(shape[2:]), dtype=np.uint8)
+            white = np.full_like(black, 255)
+            layer.render_region(black, (px0, py0), rect)
+            layer.render_region(white, (px0, py0), rect)
+
+            inner = (slice(y0 - py0, y1 - py0), slice(x0 - px0, x1 - px0))
+            mask = black[inner] == white[inner]
+            if mask.ndim == 3:
+                mask = mask.all(axis=2, keepdims=True)
+
+            stamps.append((rect, black[inner].copy(), mask))
+
+        return stamps
+
+    def _key_of(self, background: cv.Mat, layers: List[RenderLayer]) -> Tuple:
+        '''
+        Returns the identity of the background and the layers.
+        '''
+        return (id(background), background.shape, tuple(id(layer) for layer in layers))
@@ -1,12 +1,11 @@
 from typing import Tuple
+import numpy as np
 import cv2 as cv
 
 from capture.tracker import Tracker
 from renderer.shared import Shared
 from config.config import Config
-import utils.wait as wait
-
-from typings.capture.aruco import MarkerBordersList
+from typings.capture.aruco import MarkerBatch, RetrieveFunc
 from typings.error import Error
 
 
@@ -18,13 +17,58 @@ class DebugRenderer(Shared):
     def __init__(self, cfg: Config, tracker: Tracker, use_color: bool) -> None:
         super().__init__(cfg, tracker, 'debug-tracking')
         self._use_color = use_color
+        self._frame_seq = 0
+
+    def _get_frame(self, out: np.ndarray | None = None) -> Tuple[bool, cv.Mat]:
+        '''
+        Wait for a frame newer than the last rendered one and return a copy of it to draw into.
+
+        Args:
+            out: Copy into this buffer if it has the right shape (Default: None => A pooled buffer).
+
+        Returns:
+            ok: If a new frame is available.
+            frame: Copy of the new frame.
+        '''
+        frame = self.tracker.wait_for_frame(self._frame_seq, self.wait_delay / 1000)
+        if frame == None:
+            return False, None
+
+        with frame:
+            self._frame_seq = frame.seq
+            src = frame.color if self._use_color else frame.gray
+
+            if out is not None and out.shape == src.shape:
+                np.copyto(out, src)
+                return True, out
+
+            return True, self.buffers.acquire_like(src)
+
+    def _render_frame(self, retrieve: RetrieveFunc, back: np.ndarray | None) -> np.ndarray | None:
+        '''
+        Draw the newest markers into the next frame. This runs on the render thread.
+
+        Args:
+            retrieve: Function to retrieve the newest marker batch.
+            back: The back buffer.
+
+        Returns:
+            The frame to present or None if there is no new frame.
+        '''
+        ok, frame = self._get_frame(back)
+        if not ok:
+            return None
 
-    def _get_frame(self) -> Tuple[bool, cv.Mat]:
-        ''''''
-        if self._use_color:
-            return self.tracker.get_color_frame()
+        try:
+            batch: MarkerBatch = retrieve(False)
+            corners = batch.corners.astype(np.int32)
+            self.draw_borders(corners, frame)
+            self.draw_angle(corners, batch.angles, frame, with_text=False)
+            self.draw_center_point(batch.centers.astype(np.int32), batch.ids, frame)
+        except:
+            pass
 
-        return self.tracker.get_frame()
+        return frame
 
     def start(self) -> Error:
         '''
@@ -35,29 +79,8 @@ class DebugRenderer(Shared):
 
         retrieve = self.subscribe()
 
-        while self.running:
-            ok, frame = self._get_frame()
-            if not ok:
-                continue
-
-            try:
-                markers = retrieve(False)
-                for marker in markers:
-                    self.draw_borders(marker[0], frame)
-                    self.draw_angle(marker[0], marker[2], frame, with_text=False)
-                    self.draw_center_point(marker[1], marker[3], frame)
-            except:
-                pass
-
-            cv.imshow(self.window_name, frame)
-
-            idx = wait.multi_wait_or(self.wait_delay, 'q', 'f')
-            if idx == -1:
-                continue
-            elif idx == 0:
-                break
-            else:
-                self.toggle_fullscreen()
+        # Render on the render thread, present at the capture rate on this thread
+        self.present(lambda back: self._render_frame(retrieve, back), self.cfg['capture']['fps'])
 
         # Cleanup
         self.stop()
@@ -10,11 +10,12 @@ from capture.tracker import Tracker
 from utils.colors import COLOR_RED
 from config.config import Config
 
+import utils.trace as trace
 import utils.wait as wait
 
 from typings.renderer import ArUcoMarker, Node, RenderObject, Corner
 from typings.capture.calibration import CharucoCalibrationData
-from typings.capture.aruco import MarkerCenterList
+from typings.capture.aruco import MarkerBatch
 from typings.error import Error
 
 
@@ -94,29 +95,31 @@ class Renderer(Transformer):
         x, y = self._corner_coords(Corner.BOTTOM_LEFT, self._marker_images[3], 0.5)
         self.add_object_to_layer(10, ArUcoMarker(y, x, self._marker_images[3], '', 0.5))
 
-    def _update_markers(self, markers: MarkerCenterList):
+    def _update_markers(self, batch: MarkerBatch):
         '''
-        Update the amrker objects in the render tree.
+        Update the marker objects in the render tree.
 
         Args:
-            markers: List of markers.
+            batch: The marker batch.
         '''
-        for marker in markers:
-            if marker[2] in [0, 1, 2, 3]:
+        # Scale all center positions at once
+        positions = (batch.centers * (self.scaling_x, self.scaling_y)).astype(np.int32)
+
+        for id, (x, y) in zip(batch.ids.tolist(), positions.tolist()):
+            if id in [0, 1, 2, 3]:
                 continue
 
-            result = self.get_object_on_layer_by_index(0, marker[2])
+            result = self.get_object_on_layer_by_index(0, id)
             if result.is_err():
-                self.add_object_to_layer_at_index(0, marker[2], Node(
-                    int(marker[0][0] * self.scaling_x), int(marker[0][1] * self.scaling_y), 20, 'test', COLOR_RED))
+                self.add_object_to_layer_at_index(0, id, Node(x, y, 20, 'test', COLOR_RED))
             else:
-                result.unwrap().update(int(marker[0][0] * self.scaling_x), int(marker[0][1] * self.scaling_y))
+                result.unwrap().update(x, y)
 
     def _initialize(self):
         '''
         Prepare multiple things before starting the renderer.
         '''
-        self.add_render_layer(10, 'corner-markers', False)
+        self.add_render_layer(10, 'corner-markers', False, True)
         self.add_render_layer(0, 'default')
 
         self._load_aruco_marker_images()
@@ -133,7 +136,7 @@ class Renderer(Transformer):
 
         self._initialize()
 
-        retrieve = self.subscribe_raw()
+        retrieve = self.subscribe()
 
         # White frame sized width x height
         initial_frame = 255 * np.ones((self._frame_height, self._frame_width, 3), dtype=np.uint8)
@@ -159,11 +162,12 @@ class Renderer(Transformer):
         cv.setWindowProperty('reference', cv.WND_PROP_FULLSCREEN, cv.WINDOW_FULLSCREEN)
 
         while self.running:
-            cv.imshow('reference', ref_frame)
+            with trace.span('imshow', 'renderer'):
+                cv.imshow('reference', ref_frame)
 
             try:
-                (corners, ids, rejected, recovered) = retrieve(False)
-                scaling = self.get_reference_scaling_naive(corners, ids, self._frame_width, self._frame_height)
+                batch: MarkerBatch = retrieve(False)
+                scaling = self.get_reference_scaling_naive(batch, self._frame_width, self._frame_height)
                 if len(scaling) == 2:
                     self.scaling_x = scaling[0]
                     self.scaling_y = scaling[1]
@@ -183,35 +187,32 @@ class Renderer(Transformer):
             else:
                 self.toggle_fullscreen()
 
-        while self.running:
-            frame = np.copy(initial_frame)
+        # The frame persists across iterations, only regions of changed objects get redrawn
+        frame = np.copy(initial_frame)
 
-            # First try to retrieve the list of tuples consisting of marker coordinates (position and angle) and IDs.
-            # This can faile, because the retrieval of items from the queue can raise the Empty exception when there
-            # currently is no item in the queue
+        def render(back: np.ndarray | None) -> np.ndarray | None:
+            # Wait for the next batch of markers consisting of marker coordinates (position and angle) and IDs. This
+            # can fail, because the retrieval of items from the queue raises the Empty exception when no batch arrived
+            # within the timeout
             try:
-                (corners, ids, _, _) = retrieve(False)
-                markers = self.tracker._transform_markers_to_center(corners, ids)
-                self._update_markers(markers)
+                batch: MarkerBatch = retrieve(True, self.wait_delay / 1000)
+                self._update_markers(batch)
             except Empty:
                 pass
-            except Exception as e:
-                print(e)
-                break
 
-            super().render(frame, self.transform_matrix, self._frame_width, self._frame_width)
-            # frame = cv.warpPerspective(frame, self.transform_matrix, (self._frame_width, self._frame_width))
-            # print(frame.shape)
+            matrix = self.transform_matrix
+            rects = self.render_dirty(frame, initial_frame, matrix, self._frame_width, self._frame_height)
+            if len(rects) == 0:
+                return None
 
-            cv.imshow(self.window_name, frame)
+            if back is None:
+                return self.buffers.acquire_like(frame)
 
-            idx = wait.multi_wait_or(self.wait_delay, 'q', 'f')
-            if idx == -1:
-                continue
-            elif idx == 0:
-                break
-            else:
-                self.toggle_fullscreen()
+            np.copyto(back, frame)
+            return back
+
+        # Render on the render thread, present at the display rate on this thread
+        self.present(render)
 
         # Cleanup
         self.stop()
@@ -0,0 +1,184 @@
+from typing import Callable, List
+import numpy as np
+import cv2 as cv
+import threading
+import time
+
+from utils.stats import Histogram
+import utils.trace as trace
+
+from typings.stats import SchedulerStats
+
+# Remaining time before a deadline in seconds below which input polling stops and the presenter sleeps instead.
+# `cv.waitKey(1)` regularly takes longer than a millisecond
+POLL_MARGIN = 0.003
+
+# Renders a frame into the back buffer (None until the first frame) and returns the frame to present, which may be a
+# new array. Returns None if there is nothing new to present
+RenderFunc = Callable[[np.ndarray | None], np.ndarray | None]
+
+
+class FrameScheduler:
+    '''
+    This class paces the presentation of rendered frames to a fixed display rate. Rendering runs on a separate render
+    thread, while presenting (`cv.imshow`) and input polling run on the calling thread, because HighGUI windows have to
+    be driven by the thread which created them.
+
+    The output is double-buffered: The render thread renders the next frame into the back buffer while the front
+    buffer waits for its deadline. The render thread starts the next frame as soon as the presenter took the last
+    one, so frames are at most one display period old when they are shown. Between deadlines the presenter polls for
+    key presses with short `cv.waitKey` calls.
+
+    Deadlines without a new frame repeat the previous frame. A deadline counts as missed if the render thread was
+    still rendering at the deadline, if the frame got presented more than half a display period late or if the
+    deadline got skipped entirely.
+    '''
+
+    def __init__(self, window_name: str, fps: float, render: RenderFunc) -> None:
+        '''
+        Create a new frame scheduler.
+
+        Args:
+            window_name: Name of the window to present in.
+            fps: Target display rate.
+            render: The render function, see `RenderFunc`.
+        '''
+        self._window_name = window_name
+        self._period = 1 / fps
+        self._render = render
+
+        self._cond = threading.Condition()
+        self._buffers: List[np.ndarray | None] = [None, None]
+        self._back = 0
+        self._fresh = False
+        self._busy = False
+        self._running = False
+        self._thread = None
+
+        # Counters
+        self.lateness = Histogram()
+        self._presented = 0
+        self._repeated = 0
+        self._missed = 0
+        self._render_errors = 0
+
+    def _render_loop(self):
+        '''
+        Render frames into the back buffer and swap it to the front once the presenter took the last frame.
+        '''
+        while self._running:
+            self._busy = True
+            with trace.span('render', 'scheduler'):
+                try:
+                    frame = self._render(self._buffers[self._back])
+                except Exception:
+                    self._render_errors += 1
+                    frame = None
+            self._busy = False
+
+            if frame is None:
+                continue
+
+            with self._cond:
+                self._buffers[self._back] = frame
+                self._back = 1 - self._back
+                self._fresh = True
+                self._cond.notify_all()
+
+                # Render at most one frame ahead
+                self._cond.wait_for(lambda: not self._fresh or not self._running)
+
+    def _present(self, deadline: float):
+        '''
+        Present the front buffer at the deadline.
+        '''
+        with self._cond:
+            fresh = self._fresh
+            frame = self._buffers[1 - self._back]
+            self._fresh = False
+            self._cond.notify_all()
+
+        if not fresh:
+            self._repeated += 1
+            if self._busy:
+                self._missed += 1
+            return
+
+        start = time.perf_counter()
+        cv.imshow(self._window_name, frame)
+        end = time.perf_counter()
+        trace.complete('imshow', start, end, 'scheduler')
+
+        lateness = max(time.monotonic() - deadline, 0.0)
+        self.lateness.observe(lateness)
+        if lateness > self._period / 2:
+            self._missed += 1
+
+        self._presented += 1
+
+    def run(self, on_key: Callable[[int], bool], on_present: Callable[[], None] | None = None):
+        '''
+        Run the presenter on the calling thread until `on_key` returns False or `stop` gets called. The render thread
+        runs in the meantime.
+
+        Args:
+            on_key: Called with the key code of each key press. Returns if the scheduler should keep running.
+            on_present: Called after each presented frame.
+        '''
+        self._running = True
+        self._thread = threading.Thread(None, self._render_loop, 'render-thread')
+        self._thread.start()
+
+        deadline = time.monotonic() + self._period
+
+        while self._running:
+            # Poll for input until shortly before the deadline, then sleep the rest
+            while (remaining := deadline - time.monotonic()) > POLL_MARGIN:
+                code = cv.waitKey(1)
+                if code != -1 and not on_key(code):
+                    self.stop()
+                    return
+
+            if remaining > 0:
+                time.sleep(remaining)
+
+            presented = self._presented
+            self._present(deadline)
+            if on_present != None and self._presented > presented:
+                on_present()
+
+            # Skip deadlines which already passed instead of presenting back to back to catch up
+            deadline += self._period
+            behind = time.monotonic() - deadline
+            if behind > 0:
+                skipped = int(behind / self._period) + 1
+                deadline += skipped * self._period
+                self._missed += skipped
+
+        self.stop()
+
+    def stop(self):
+        '''
+        Stop presenting and wait until the render thread terminates.
+        '''
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+
+        if self._thread != None and self._thread != threading.current_thread():
+            self._thread.join()
+            self._thread = None
+
+    def stats(self) -> SchedulerStats:
+        '''
+        Returns the presentation counters.
+
+        Returns:
+            The scheduler stats.
+        '''
+        return SchedulerStats(
+            presented=self._presented,
+            repeated=self._repeated,
+            missed=self._missed,
+            render_errors=self._render_errors,
+        )
@@ -1,15 +1,25 @@
-from typing import Dict, List
+from typing import Dict, List, Tuple
 import numpy as np
 import cv2 as cv
+import time
 
 from utils.colors import COLOR_GREEN, COLOR_RED
 from capture.tracker import Tracker
+from capture.roi import merge_rois
+from renderer.cache import LayerCache
+from renderer.scheduler import FrameScheduler, RenderFunc
+from renderer.warp import Warp
 from config.config import Config
 from utils.fmt import fps_to_ms
+from utils.pool import BufferPool
+from utils.stats import Histogram
+import utils.trace as trace
 
+from typings.capture.subscription import SubscriptionMode
 from typings.capture.aruco import RawRetrieveFunc, RetrieveFunc
-from typings.renderer import RenderLayer, RenderObject
+from typings.renderer import Rect, RenderLayer, RenderObject
 from typings.error import Error, Ok, Result
+from typings.stats import MetricValues
 
 
 class Shared:
@@ -30,6 +40,31 @@ class Shared:
         # Render layers
         self.render_layers: Dict[int, RenderLayer] = {}
 
+        # Incremental rendering redraws everything after layer and transform changes
+        self._full_redraw = True
+        self._last_matrix: np.ndarray | None = None
+        self._layer_cache = LayerCache()
+
+        # Projection warp. The unwarped layers get rendered on top of the warped frame, which changes in place
+        self.warp = Warp()
+        self._warp_cache = LayerCache(False)
+        self._warp_source: np.ndarray | None = None
+        self._warped: np.ndarray | None = None
+        self._warp_version = 0
+        self.dirty_rects = 0
+
+        # Frame pacing of the render loop
+        self.scheduler: FrameScheduler | None = None
+
+        # Reusable output and intermediate frames
+        self.buffers = BufferPool()
+
+        # Metrics
+        self.frame_intervals = Histogram()
+        self.render_times = Histogram()
+        self.frames_shown = 0
+        self._last_shown = 0.0
+
     def is_running(self) -> bool:
         '''
         Returns if the renderer is already running.
@@ -43,80 +78,147 @@ class Shared:
         self.running = True
         return False
 
-    def subscribe(self, size: int = -1) -> RetrieveFunc:
+    def subscribe(self, size: int = 1, mode: SubscriptionMode = SubscriptionMode.LATEST) -> RetrieveFunc:
         '''
         Subscribe to the tracker.
 
         Args:
-            size: Size of the queue (Default: -1 => Unlimited).
+            size: Size of the queue (Ignored in LATEST mode).
+            mode: The subscription mode (Default: LATEST => Only the newest marker batch is kept).
 
         Returns:
             A function to retrieve new marker positions.
         '''
-        id, params, retrieve = self.tracker.subscribe(size)
+        id, params, retrieve = self.tracker.subscribe(size, mode)
         self.camera_frame_height = params[1]
         self.camera_frame_width = params[0]
         self.subscription_id = id
 
         return retrieve
 
-    def subscribe_raw(self, size: int = -1) -> RawRetrieveFunc:
+    def subscribe_raw(self, size: int = 1, mode: SubscriptionMode = SubscriptionMode.LATEST) -> RawRetrieveFunc:
         '''
         Subscribe to the tracker in raw mode.
 
         Args:
-            size: Size of the queue (Default: -1 => Unlimited).
+            size: Size of the queue (Ignored in LATEST mode).
+            mode: The subscription mode (Default: LATEST => Only the newest result is kept).
 
         Returns:
             A function to retrieve new marker positions.
         '''
-        id, params, retrieve = self.tracker.subscribe_raw(size)
+        id, params, retrieve = self.tracker.subscribe_raw(size, mode)
         self.camera_frame_height = params[1]
         self.camera_frame_width = params[0]
         self.raw_subscription_id = id
 
         return retrieve
 
-    def draw_borders(self, corners: tuple, frame: cv.Mat):
+    def draw_borders(self, corners: np.ndarray, frame: cv.Mat):
         '''
-        Draw the border around a marker.
+        Draw the borders around all markers.
 
         Args:
-            corners: List of corner positions.
+            corners: Integer corner positions with shape (N, 4, 2).
             frame: Frame to render in.
         '''
-        cv.line(frame, corners[0], corners[1], COLOR_GREEN, 2)  # Top left to top right
-        cv.line(frame, corners[1], corners[2], COLOR_GREEN, 2)  # Top right to bottom right
-        cv.line(frame, corners[2], corners[3], COLOR_GREEN, 2)  # Bottom right to bottom left
-        cv.line(frame, corners[3], corners[0], COLOR_GREEN, 2)  # Bottom left to top left
+        cv.polylines(frame, corners, True, COLOR_GREEN, 2)
 
-    def draw_angle(self, corners: tuple, angle: float, frame: cv.Mat, with_text: bool = True):
+    def draw_angle(self, corners: np.ndarray, angles: np.ndarray, frame: cv.Mat, with_text: bool = True):
         '''
-        Draw a circle in the top-left corner and attach the angle as text to it.
+        Draw a circle in the top-left corner of each marker and attach the angle as text to it.
 
         Args:
-            corners: List of corner positions.
-            angle: The angle in degrees.
+            corners: Integer corner positions with shape (N, 4, 2).
+            angles: The angles in degrees with shape (N,).
             frame: Frame to render in.
             with_text: If the angle should be displayed as text.
         '''
-        cv.circle(frame, corners[0], 4, COLOR_RED, -1)  # Top left corner
-        if with_text:
-            cv.putText(frame, '{:.2f}'.format(angle),  corners[0], cv.FONT_HERSHEY_SIMPLEX, 0.8, COLOR_RED, 2)
+        for corner, angle in zip(corners[:, 0].tolist(), angles.tolist()):
+            cv.circle(frame, corner, 4, COLOR_RED, -1)  # Top left corner
+            if with_text:
+                cv.putText(frame, '{:.2f}'.format(angle), corner, cv.FONT_HERSHEY_SIMPLEX, 0.8, COLOR_RED, 2)
 
-    def draw_center_point(self, pos: tuple, id: int, frame: cv.Mat, with_text: bool = True):
+    def draw_center_point(self, centers: np.ndarray, ids: np.ndarray, frame: cv.Mat, with_text: bool = True):
         '''
-        Draw a center point with the ID as text attached to it.
+        Draw the center point of each marker with the ID as text attached to it.
 
         Args:
-            pos: Marker center position.
-            id: Marker ID.
+            centers: Integer center positions with shape (N, 2).
+            ids: Marker IDs with shape (N,).
             frame: Frame to render in.
             with_text: If the marker ID should be displayed as text.
         '''
-        cv.circle(frame, pos, 4, COLOR_RED, -1)
-        if with_text:
-            cv.putText(frame, str(id), (pos[0] - 10, pos[1] - 45), cv.FONT_HERSHEY_SIMPLEX, 0.8, COLOR_RED, 2)
+        for (x, y), id in zip(centers.tolist(), ids.tolist()):
+            cv.circle(frame, (x, y), 4, COLOR_RED, -1)
+            if with_text:
+                cv.putText(frame, str(id), (x - 10, y - 45), cv.FONT_HERSHEY_SIMPLEX, 0.8, COLOR_RED, 2)
+
+    def frame_shown(self):
+        '''
+        Record that a frame was shown. Call this after each `cv.imshow` of the render loop.
+        '''
+        now = time.perf_counter()
+        if self._last_shown > 0:
+            self.frame_intervals.observe(now - self._last_shown)
+
+        self._last_shown = now
+        self.frames_shown += 1
+
+    def metrics(self) -> MetricValues:
+        '''
+        Returns the metric values of the renderer.
+
+        Returns:
+            The metric values.
+        '''
+        values = {
+            'renderer_frames_total': self.frames_shown,
+            'renderer_frame_interval_seconds': self.frame_intervals.snapshot(),
+            'renderer_render_seconds': self.render_times.snapshot(),
+            'renderer_dirty_rects_total': self.dirty_rects,
+            'renderer_layer_cache_rebuilds_total': self._layer_cache.rebuilds,
+            'renderer_warp_rebuilds_total': self.warp.rebuilds,
+            'renderer_buffer_allocations_total': self.buffers.allocations,
+            'renderer_buffer_reuses_total': self.buffers.reuses,
+        }
+
+        scheduler = self.scheduler
+        if scheduler != None:
+            stats = scheduler.stats()
+            values['renderer_repeated_frames_total'] = stats['repeated']
+            values['renderer_missed_deadlines_total'] = stats['missed']
+            values['renderer_render_errors_total'] = stats['render_errors']
+            values['renderer_present_lateness_seconds'] = scheduler.lateness.snapshot()
+
+        return values
+
+    def present(self, render: RenderFunc, fps: float = 0):
+        '''
+        Run the render loop paced by a frame scheduler until 'q' is pressed. `render` runs on the render thread,
+        presenting and key handling ('f' toggles fullscreen) run on the calling thread.
+
+        Args:
+            render: The render function, see `RenderFunc`.
+            fps: Display rate (Default: 0 => The configured renderer FPS).
+        '''
+        self.scheduler = FrameScheduler(self.window_name, fps or self.cfg['renderer']['fps'], render)
+        self.scheduler.run(self._on_key, self.frame_shown)
+
+    def _on_key(self, code: int) -> bool:
+        '''
+        Handle a key press of the render loop.
+
+        Returns:
+            False if the render loop should stop.
+        '''
+        if code == ord('q'):
+            return False
+
+        if code == ord('f'):
+            self.toggle_fullscreen()
+
+        return True
 
     def toggle_fullscreen(self):
         '''
@@ -129,14 +231,16 @@ class Shared:
             self.fullscreen = True
             cv.setWindowProperty(self.window_name, cv.WND_PROP_FULLSCREEN, cv.WINDOW_FULLSCREEN)
 
-    def add_render_layer(self, index: int, name: str, should_warp: bool = True) -> Error:
+    def add_render_layer(self, index: int, name: str, should_warp: bool = True, static: bool = False) -> Error:
         '''
         Add a render layer.
 
         Args:
             index: Layer index. Higher indices render later.
             name: Name of the render layer.
-            should_warp: If this layer should be warped by the projection transformation (Broken).
+            should_warp: If this layer should be warped by the projection transformation.
+            static: If the objects of this layer rarely change. Static layers get pre-composited with the background
+                by `render_dirty`.
 
         Returns:
             An Error if an error was encountered, None if otherwise.
@@ -144,7 +248,8 @@ class Shared:
         if index in self.render_layers.keys():
             return Error(f'A render layer with index {index} ({self.render_layers[index]._name}) already exists')
 
-        self.render_layers[index] = RenderLayer(index, name, should_warp)
+        self.render_layers[index] = RenderLayer(index, name, should_warp, static)
+        self._full_redraw = True
         return None
 
     def add_object_to_layer(self, index: int, obj: RenderObject) -> Error:
@@ -198,14 +303,17 @@ class Shared:
 
     def render(self, frame: cv.Mat, matrix: np.ndarray, width: int, height: int):
         '''
-        Render the render layers one after each other.
+        Render the render layers one after each other. The layers which should be warped get rendered first and get
+        warped by the projection transformation, the remaining layers get rendered on top.
 
         Args:
             frame: The frame to render in.
-            matrix: Projection transformation matrix (Broken).
+            matrix: Projection transformation matrix (No transformation if all zero).
             width: Frame width.
             height: Frame height.
         '''
+        start = time.perf_counter()
+
         # First we render all layers which should be warped
         remanining: List[RenderLayer] = []
         for layer in self.render_layers.values():
@@ -213,15 +321,169 @@ class Shared:
                 remanining.append(layer)
                 continue
             # print(f'Render {len(layer._objects)} objects on layer {layer._name}')
-            layer.render(frame)
+            with trace.span(layer._name, 'layer'):
+                layer.render(frame)
 
-        # Warp
+        # Warp with the cached remap tables, they only get computed if the matrix changed. There are no tables if the
+        # matrix was singular from the start
         if matrix.any():
-            # frame = cv.warpPerspective(frame, matrix, (width, height))
-            pass
+            self.warp.update(matrix, frame.shape[1], frame.shape[0])
+
+        if matrix.any() and self.warp.is_active():
+            with trace.span('warp', 'renderer'):
+                warped = self.warp.apply(frame, self.buffers.acquire(frame.shape, frame.dtype))
+                np.copyto(frame, warped)
+                self.buffers.release(warped)
 
         for layer in remanining:
-            layer.render(frame)
+            with trace.span(layer._name, 'layer'):
+                layer.render(frame)
+
+        end = time.perf_counter()
+        self.render_times.observe(end - start)
+        trace.complete('render', start, end, 'renderer')
+
+    def render_dirty(
+        self,
+        frame: cv.Mat,
+        background: cv.Mat,
+        matrix: np.ndarray,
+        width: int,
+        height: int
+    ) -> List[Rect]:
+        '''
+        Incrementally render the render layers into a persistent frame. Only the regions of objects which moved or
+        changed since the last call get reset and redrawn. Static layers are pre-composited with the background, so
+        they don't get redrawn at all. Everything gets redrawn on the first call, after adding a render layer, when a
+        static layer changed and when the transformation matrix changed.
+
+        With a transformation matrix, the layers which should be warped get rendered into a separate source frame.
+        The changed regions of the source frame get warped into the output via the cached remap tables of `warp` and
+        the remaining layers get rendered on top.
+
+        Args:
+            frame: The persistent frame to render in. It has to be the same frame on every call.
+            background: The frame without any objects, e.g. a blank frame.
+            matrix: Projection transformation matrix (No transformation if all zero).
+            width: Frame width.
+            height: Frame height.
+
+        Returns:
+            The redrawn regions of the frame.
+        '''
+        start = time.perf_counter()
+
+        # Unwarped layers render last
+        layers = sorted(self.render_layers.values(), key=lambda layer: not layer._should_warp)
+
+        warp = matrix.any()
+        if warp:
+            self.warp.update(matrix, frame.shape[1], frame.shape[0])
+            warp = self.warp.is_active()
+
+        full = self._full_redraw or self._last_matrix is None or not np.array_equal(matrix, self._last_matrix)
+        full = full or (warp and self._warp_version != self.warp.rebuilds)
+
+        self._full_redraw = False
+        self._last_matrix = np.copy(matrix)
+        self._warp_version = self.warp.rebuilds
+
+        if not warp:
+            rects, _ = self._render_layers(self._layer_cache, frame, background, layers, full)
+        else:
+            rects = self._render_warped(frame, background, layers, full)
+
+        if len(rects) == 0:
+            return rects
+
+        end = time.perf_counter()
+        self.render_times.observe(end - start)
+        trace.complete('render', start, end, 'renderer')
+
+        self.dirty_rects += len(rects)
+        return rects
+
+    def _render_warped(self, frame: cv.Mat, background: cv.Mat, layers: List[RenderLayer], full: bool) -> List[Rect]:
+        '''
+        Incrementally render the layers which should be warped into the source frame, warp the changed regions into
+        the warped frame and render the remaining layers on top.
+        '''
+        if self._warp_source is None or self._warp_source.shape != background.shape:
+            self._warp_source = background.copy()
+        if self._warped is None or self._warped.shape != frame.shape:
+            self._warped = np.zeros_like(frame)
+
+        warped_layers = [layer for layer in layers if layer._should_warp]
+        other_layers = [layer for layer in layers if not layer._should_warp]
+
+        source_rects, source_full = self._render_layers(
+            self._layer_cache, self._warp_source, background, warped_layers, full
+        )
+
+        if source_full:
+            self.warp.apply(self._warp_source, self._warped)
+        else:
+            fw, fh = frame.shape[1], frame.shape[0]
+            warped_rects = []
+            for rect in source_rects:
+                x0, y0, x1, y1 = self.warp.warp_rect(rect)
+                warped_rects.append((x0, y0, min(x1, fw), min(y1, fh)))
+
+            source_rects = merge_rois(warped_rects)
+            for rect in source_rects:
+                self.warp.apply_region(self._warp_source, rect, self._warped)
+
+        rects, _ = self._render_layers(
+            self._warp_cache, frame, self._warped, other_layers, full or source_full, source_rects
+        )
+        return rects
+
+    def _render_layers(
+        self,
+        cache: LayerCache,
+        frame: cv.Mat,
+        background: cv.Mat,
+        layers: List[RenderLayer],
+        full: bool,
+        extra: List[Rect] = []
+    ) -> Tuple[List[Rect], bool]:
+        '''
+        Incrementally render layers with a layer cache.
+
+        Args:
+            cache: The layer cache of the layers.
+            frame: The persistent frame to render in.
+            background: The frame without any objects.
+            layers: The render layers in draw order.
+            full: If everything should be redrawn.
+            extra: Additional regions to redraw, e.g. because the background changed.
+
+        Returns:
+            The redrawn regions and if everything was redrawn.
+        '''
+        if not cache.valid(background, layers):
+            cache.rebuild(background, layers)
+            full = True
+
+        if full:
+            cache.render(frame)
+            return [(0, 0, frame.shape[1], frame.shape[0])], True
+
+        # Collect the damaged regions of the dynamic layers, clipped to the frame
+        fw, fh = frame.shape[1], frame.shape[0]
+        rects = list(extra)
+        for layer in layers:
+            for x0, y0, x1, y1 in layer.damage():
+                rects.append((max(x0, 0), max(y0, 0), min(x1, fw), min(y1, fh)))
+
+        rects = merge_rois(rects)
+        for rect in rects:
+            cache.render_region(frame, rect)
+
+        for layer in layers:
+            layer.mark_rendered()
+
+        return rects, False
 
     def stop(self):
         '''
@@ -2,14 +2,18 @@ from typing import Tuple
 import numpy as np
 import cv2 as cv
 import threading
+import time
 
 from capture.aruco import board_from, dict_from, type_from
 from capture.tracker import Tracker
 from renderer.shared import Shared
 from config.config import Config
+from utils.stats import Histogram
+import utils.trace as trace
 
 from typings.capture.calibration import CharucoCalibrationData
-from typings.capture.aruco import CornerList, IDList
+from typings.capture.aruco import CornerList, IDList, MarkerBatch
+from typings.stats import MetricValues
 
 
 class Transformer(Shared):
@@ -36,6 +40,10 @@ class Transformer(Shared):
         self.scaling_x = 1
         self.scaling_y = 1
 
+        # Metrics
+        self.transform_times = Histogram()
+        self.transforms = 0
+
         self.axis = np.float32([
             [-.5, -.5, 0],
             [-.5, .5, 0],
@@ -47,26 +55,50 @@ class Transformer(Shared):
             [.5, -.5, 1]
         ])
 
-    def get_reference_scaling_naive(self, corners: CornerList, ids: IDList, width: int, height: int) -> Tuple[float, float]:
-        ''''''
-        if len(corners) < 4:
+    def metrics(self) -> MetricValues:
+        '''
+        Returns the metric values of the renderer and the transformation.
+
+        Returns:
+            The metric values.
+        '''
+        values = super().metrics()
+        values['transformer_transforms_total'] = self.transforms
+        values['transformer_transform_seconds'] = self.transform_times.snapshot()
+        return values
+
+    def get_reference_scaling_naive(self, batch: MarkerBatch, width: int, height: int) -> Tuple[float, float]:
+        '''
+        Calculate the scaling between the camera and the rendered frame based on the top-left corners of the four
+        corner markers (IDs 0 to 3).
+
+        Args:
+            batch: The marker batch.
+            width: Rendered frame width.
+            height: Rendered frame height.
+
+        Returns:
+            The width and height scaling or an empty tuple if not all corner markers were detected.
+        '''
+        if len(batch) < 4:
             return ()
 
-        pairs = []
-        for c in zip(corners, ids):
-            if c[1][0] in [0, 1, 2, 3]:
-                pairs.append((c[0][0], c[1][0]))
+        # Top-left corners of the corner markers, ordered by ID
+        mask = batch.ids < 4
+        if np.count_nonzero(mask) != 4:
+            return ()
 
-        pairs = sorted(pairs, key=lambda x: x[1])
+        order = np.argsort(batch.ids[mask])
+        tl, tr, br, bl = batch.corners[mask][order, 0]
 
         # Calc width scaling
-        top_width = pairs[1][0][0][0] - pairs[0][0][0][0]
-        bot_width = pairs[2][0][0][0] - pairs[3][0][0][0]
+        top_width = tr[0] - tl[0]
+        bot_width = br[0] - bl[0]
         avg_width = (top_width + bot_width) / 2
 
         # Calc heigth scaling
-        left_height = pairs[3][0][0][1] - pairs[0][0][0][1]
-        right_height = pairs[2][0][0][1] - pairs[1][0][0][1]
+        left_height = bl[1] - tl[1]
+        right_height = br[1] - tr[1]
         avg_height = (left_height + right_height) / 2
 
         return (width / avg_width, height / avg_height)
@@ -120,7 +152,7 @@ class Transformer(Shared):
         '''
         Retrieve the raw tracking data to calculate the transformation matrix.
         '''
-        retrieve = self.subscribe_raw(1)
+        retrieve = self.subscribe_raw()
         while self.running:
             all_img_pts = []
 
@@ -129,6 +161,8 @@ class Transformer(Shared):
                 if len(ids) == 0:
                     continue
 
+                start = time.perf_counter()
+
                 rvecs, tvecs, obj_points = cv.aruco.estimatePoseSingleMarkers(
                     corners, 1,
                     self.calib_data[0],
@@ -152,9 +186,17 @@ class Transformer(Shared):
                     self.corner_transform[2] = all_img_pts[np.where(ids == [2])[0][0]][3][0]
                     self.corner_transform[3] = all_img_pts[np.where(ids == [3])[0][0]][0][0]
                     self.calc_projection_transform()
+                    end = time.perf_counter()
+                    self.transform_times.observe(end - start)
+                    trace.complete('calc_corner_transform', start, end, 'transformer')
+                    self.transforms += 1
                     print('Done transform')
                     break
 
+                end = time.perf_counter()
+                self.transform_times.observe(end - start)
+                trace.complete('calc_corner_transform', start, end, 'transformer')
+
             except:
                 continue
 
@@ -183,6 +225,11 @@ class Transformer(Shared):
             [0, height - 1]
         ], dtype="float32")
 
-        self.transform_matrix = cv.getPerspectiveTransform(self.corner_transform, dst)
+        matrix = cv.getPerspectiveTransform(self.corner_transform, dst)
+
+        # Precompute the remap tables before the render loop picks up the new matrix
+        self.warp.update(matrix, self.cfg['renderer']['width'], self.cfg['renderer']['height'])
+
+        self.transform_matrix = matrix
         self.transform_height = height
         self.transform_width = width
@@ -0,0 +1,126 @@
+from typing import Tuple
+import numpy as np
+import cv2 as cv
+import threading
+
+from typings.renderer import Rect
+
+# Padding in pixels around warped regions, bilinear interpolation reads the neighbouring source pixels
+WARP_PADDING = 1
+
+
+class Warp:
+    '''
+    This class applies a perspective transformation via cached remap tables. The tables get computed once per
+    transformation matrix and converted to fixed-point maps (`CV_16SC2`), so warping a frame is a single `cv.remap`.
+    Regions of the output can be warped on their own by slicing the maps.
+
+    The maps can be updated from another thread (e.g. the transformation thread) while rendering.
+    '''
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+
+        # Matrix, output size and the maps of the current transformation
+        self._matrix: np.ndarray | None = None
+        self._size = (0, 0)
+        self._maps: Tuple[np.ndarray, np.ndarray] | None = None
+
+        # Counters
+        self.rebuilds = 0
+
+    def update(self, matrix: np.ndarray, width: int, height: int) -> bool:
+        '''
+        Compute the remap tables for a transformation matrix. Nothing gets computed if the matrix and the output size
+        didn't change. Singular matrices (e.g. from collinear corner markers) can't be inverted, the previous maps are
+        kept for them.
+
+        Args:
+            matrix: The 3x3 perspective transformation matrix mapping source to output coordinates.
+            width: Output width.
+            height: Output height.
+
+        Returns:
+            If the maps were recomputed.
+        '''
+        with self._lock:
+            if self._size == (width, height) and self._matrix is not None and np.array_equal(matrix, self._matrix):
+                return False
+
+        ok, inverse = cv.invert(np.asarray(matrix, dtype=np.float64), flags=cv.DECOMP_LU)
+        if ok == 0 or not np.isfinite(inverse).all():
+            return False
+
+        # The maps store the source position of each output pixel
+        xs, ys = np.meshgrid(np.arange(width, dtype=np.float32), np.arange(height, dtype=np.float32))
+        points = np.stack((xs, ys), axis=-1).reshape(-1, 1, 2)
+        source = cv.perspectiveTransform(points, inverse).reshape(height, width, 2)
+
+        maps = cv.convertMaps(source, None, cv.CV_16SC2)
+
+        with self._lock:
+            self._matrix = np.copy(matrix)
+            self._size = (width, height)
+            self._maps = maps
+            self.rebuilds += 1
+
+        return True
+
+    def is_active(self) -> bool:
+        '''
+        Returns if maps were computed.
+        '''
+        return self._maps != None
+
+    def apply(self, src: cv.Mat, dst: cv.Mat | None = None) -> cv.Mat:
+        '''
+        Warp a full frame.
+
+        Args:
+            src: The source frame.
+            dst: The output frame (Default: None => A new frame).
+
+        Returns:
+            The warped frame.
+        '''
+        map1, map2 = self._maps
+        return cv.remap(src, map1, map2, cv.INTER_LINEAR, dst, cv.BORDER_CONSTANT)
+
+    def apply_region(self, src: cv.Mat, rect: Rect, dst: cv.Mat):
+        '''
+        Warp a region of the output.
+
+        Args:
+            src: The source frame.
+            rect: The region in output coordinates.
+            dst: The output frame. Only the region gets written.
+        '''
+        map1, map2 = self._maps
+        x0, y0, x1, y1 = rect
+        cv.remap(src, map1[y0:y1, x0:x1], map2[y0:y1, x0:x1], cv.INTER_LINEAR, dst[y0:y1, x0:x1], cv.BORDER_CONSTANT)
+
+    def warp_rect(self, rect: Rect) -> Rect:
+        '''
+        Returns the output region affected by a source region: The bounding box of the transformed corners of the
+        region padded for the interpolation, clipped to the output.
+
+        Args:
+            rect: The region in source coordinates.
+
+        Returns:
+            The region in output coordinates.
+        '''
+        x0, y0, x1, y1 = rect
+        x0, y0, x1, y1 = x0 - WARP_PADDING, y0 - WARP_PADDING, x1 + WARP_PADDING, y1 + WARP_PADDING
+        corners = np.array([[[x0, y0]], [[x1, y0]], [[x1, y1]], [[x0, y1]]], dtype=np.float32)
+        warped = cv.perspectiveTransform(corners, self._matrix).reshape(4, 2)
+
+        width, height = self._size
+        (wx0, wy0), (wx1, wy1) = np.floor(warped.min(axis=0)), np.ceil(warped.max(axis=0))
+
+        return (
+            int(np.clip(wx0 - WARP_PADDING, 0, width)),
+            int(np.clip(wy0 - WARP_PADDING, 0, height)),
+            int(np.clip(wx1 + WARP_PADDING, 0, width)),
+            int(np.clip(wy1 + WARP_PADDING, 0, height)),
+        )
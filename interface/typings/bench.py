@@ -0,0 +1,44 @@
+from typing import Dict, List, TypedDict
+
+
+class BenchOptions(TypedDict):
+    # Number of measured iterations per case
+    iterations: int
+
+    # Frame source spec of the tracker suite (Empty => Synthetic scene with ground truth)
+    source: str
+
+    # Number of markers in the synthetic scene
+    markers: int
+
+    # Number of render objects of the render suite
+    objects: int
+
+
+class BenchResult(TypedDict):
+    # Name of the case, e.g. 'tracker.detect'
+    name: str
+
+    # Number of measured iterations
+    iterations: int
+
+    # Latency percentiles and mean in milliseconds
+    p50: float
+    p95: float
+    p99: float
+    mean: float
+
+    # Iterations per second
+    throughput: float
+
+    # Peak resident set size of the process running the suite in MiB
+    peak_rss: float
+
+    # Case specific values, e.g. the detection accuracy
+    extra: Dict[str, float]
+
+
+class BenchReport(TypedDict):
+    # Environment the benchmarks ran in
+    meta: Dict[str, str]
+    results: List[BenchResult]
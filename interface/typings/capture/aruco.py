@@ -1,37 +1,73 @@
 from typing import Callable, List, Tuple, TypeAlias
-from queue import Queue
+import numpy as np
+
+from capture.subscription import SubscriptionQueue
 
 Corners: TypeAlias = List[List[List[int]]]
 CornerList: TypeAlias = Tuple[Corners, ...]
 IDList: TypeAlias = List[List[int]]
 
+# Tuple of detected corners, IDs, rejected candidates and recovered candidates as returned by the ArUco refinement.
+# The recovered candidates are None if the refinement was skipped, because all expected markers were found.
+DetectionResult: TypeAlias = Tuple[CornerList, IDList, CornerList, List[int]]
+
+# Structured dtype of a single marker: The ID, the four corner positions <x, y> (top-left, top-right, bottom-right,
+# bottom-left), the center position <x, y> and the angle in degrees.
+MARKER_DTYPE = np.dtype([
+    ('id', np.int32),
+    ('corners', np.float32, (4, 2)),
+    ('center', np.float32, (2,)),
+    ('angle', np.float32),
+])
+
+
+class MarkerBatch:
+    '''
+    This class describes all markers detected in a single frame. The markers are stored in one structured NumPy array
+    with the `MARKER_DTYPE` dtype. Static batches reuse the markers of an earlier frame, because nothing moved since.
+    '''
+
+    def __init__(self, markers: np.ndarray, frame_no: int = 0, timestamp: float = 0.0, static: bool = False) -> None:
+        self.timestamp = timestamp
+        self.static = static
+        self.frame_no = frame_no
+        self.markers = markers
+
+    def __len__(self) -> int:
+        return len(self.markers)
+
+    @property
+    def ids(self) -> np.ndarray:
+        '''
+        Returns the marker IDs with shape (N,).
+        '''
+        return self.markers['id']
+
+    @property
+    def corners(self) -> np.ndarray:
+        '''
+        Returns the marker corners with shape (N, 4, 2).
+        '''
+        return self.markers['corners']
+
+    @property
+    def centers(self) -> np.ndarray:
+        '''
+        Returns the marker center positions with shape (N, 2).
+        '''
+        return self.markers['center']
+
+    @property
+    def angles(self) -> np.ndarray:
+        '''
+        Returns the marker angles in degrees with shape (N,).
+        '''
+        return self.markers['angle']
+
+
 SubscriptionParams: TypeAlias = Tuple[int, int]
-RawRetrieveFunc: TypeAlias = Callable[[bool, float | None], Tuple[CornerList, IDList]]
-RetrieveFunc: TypeAlias = Callable[[bool, float | None], Tuple[CornerList, IDList]]
+RawRetrieveFunc: TypeAlias = Callable[[bool, float | None], DetectionResult]
+RetrieveFunc: TypeAlias = Callable[[bool, float | None], MarkerBatch]
 RawSubscription: TypeAlias = Tuple[int, SubscriptionParams, RawRetrieveFunc]
 Subscription: TypeAlias = Tuple[int, SubscriptionParams, RetrieveFunc]
-Subscriber: TypeAlias = Tuple[bool, Queue]
-
-# List of tuples of markers which consist of a Tuple for the <x, y> center position, the angle as a float value between
-# 0 and 360 degrees and and integer ID.
-MarkerCenterList: TypeAlias = List[
-    Tuple[
-        Tuple[int, int],
-        float,
-        int
-    ]
-]
-
-MarkerBordersList: TypeAlias = List[
-    Tuple[
-        Tuple[
-            Tuple[int, int],
-            Tuple[int, int],
-            Tuple[int, int],
-            Tuple[int, int],
-        ],
-        Tuple[int, int],
-        float,
-        int
-    ]
-]
+Subscriber: TypeAlias = Tuple[bool, SubscriptionQueue]
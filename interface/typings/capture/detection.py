@@ -0,0 +1,12 @@
+from typing import TypedDict
+
+
+class DetectorOptions(TypedDict):
+    # Candidates get detected on a frame downscaled by this factor (1 => Full resolution)
+    scale: int
+
+    # Half side length of the sub-pixel corner refinement search window in full resolution pixels
+    subpix_window: int
+
+    # Maximum number of sub-pixel corner refinement iterations
+    subpix_iterations: int
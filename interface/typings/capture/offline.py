@@ -0,0 +1,33 @@
+from typing import List, TypedDict
+import numpy as np
+
+from typings.error import Error
+
+
+class ChunkResult(TypedDict):
+    # Index of the first frame of the chunk
+    start: int
+
+    # Corners with shape (N, 4, 2) and IDs with shape (N,) of each frame
+    corners: List[np.ndarray]
+    ids: List[np.ndarray]
+
+    # Summed up detection and refinement time in seconds
+    detect_time: float
+
+    # Set if the video couldn't be opened or the start of the chunk couldn't be reached
+    error: Error | None
+
+
+class OfflineStats(TypedDict):
+    # Number of tracked frames and detected markers
+    frames: int
+    markers: int
+
+    # Number of chunks and worker processes
+    chunks: int
+    workers: int
+
+    # Wall time of the whole run and summed up detection time of all workers in seconds
+    elapsed: float
+    detect_time: float
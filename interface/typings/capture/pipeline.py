@@ -0,0 +1,50 @@
+from enum import Enum, unique, auto
+from typing import Callable, List, TypeAlias
+from typing_extensions import Self
+
+from typings.capture.aruco import DetectionResult
+from typings.error import Err, Error, Ok, Result
+
+# Callback which receives the frame number, the capture timestamp and the detection result
+ResultFunc: TypeAlias = Callable[[int, float, DetectionResult], None]
+
+# Callback which additionally receives the marker IDs expected by an ROI detection (None after a full frame scan)
+EmitFunc: TypeAlias = Callable[[int, float, DetectionResult, List[int] | None], None]
+
+
+@unique
+class WorkerMode(Enum):
+    THREAD = auto()
+    PROCESS = auto()
+
+    @staticmethod
+    def from_str(mode: str) -> Result[Self, Error]:
+        '''
+        Returns the enum from the provided string or returns an error if no corresponding enum exists.
+        '''
+        match mode.lower():
+            case 'thread':
+                return Ok(WorkerMode.THREAD)
+            case 'process':
+                return Ok(WorkerMode.PROCESS)
+            case _:
+                return Err(Error('Invalid worker mode'))
+
+
+@unique
+class DropPolicy(Enum):
+    LATEST = auto()
+    NONE = auto()
+
+    @staticmethod
+    def from_str(policy: str) -> Result[Self, Error]:
+        '''
+        Returns the enum from the provided string or returns an error if no corresponding enum exists.
+        '''
+        match policy.lower():
+            case 'latest':
+                return Ok(DropPolicy.LATEST)
+            case 'none':
+                return Ok(DropPolicy.NONE)
+            case _:
+                return Err(Error('Invalid drop policy'))
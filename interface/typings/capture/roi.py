@@ -0,0 +1,7 @@
+from typing import List, Tuple, TypeAlias
+
+# Region of interest in full frame pixel coordinates: x0, y0, x1, y1 (exclusive)
+Roi: TypeAlias = Tuple[int, int, int, int]
+
+# Planned detection regions and the marker IDs which are expected to be found in these regions
+RoiPlan: TypeAlias = Tuple[List[Roi], List[int]]
@@ -0,0 +1,51 @@
+from typing import TypedDict
+
+
+class SceneOptions(TypedDict):
+    # Frame dimensions in pixels
+    width: int
+    height: int
+
+    # Number of markers. Marker IDs start at 0
+    number: int
+
+    # Side length of the markers (including the border bits) in pixels (0 => Fit to the grid cells)
+    marker_size: int
+
+    # Motion path of the markers: 'static', 'circle' or 'bounce'
+    motion: str
+
+    # Speed of the markers along their motion path in pixels per frame
+    speed: float
+
+    # Maximum rotation of the markers in degrees
+    rotation: float
+
+    # Maximum perspective distortion as fraction of the marker size (0 => Markers stay square)
+    perspective: float
+
+    # Standard deviation of the Gaussian blur in pixels (0 => No blur)
+    blur: float
+
+    # Standard deviation of the Gaussian noise in gray levels (0 => No noise)
+    noise: float
+
+    # Strength of the lighting gradient between 0 (Uniform) and 1 (Dark corner is black)
+    lighting: float
+
+    # Seed of the random marker placement and the noise
+    seed: int
+
+
+class SceneAccuracy(TypedDict):
+    # Number of expected markers
+    expected: int
+
+    # Number of expected markers which were detected
+    matched: int
+
+    # Number of detected markers which are not part of the scene
+    false_positives: int
+
+    # Root mean square error of the matched corners in pixels
+    rms_error: float
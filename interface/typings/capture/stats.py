@@ -0,0 +1,34 @@
+from typing import Dict, TypedDict
+
+from typings.capture.subscription import SubscriptionStats
+from typings.stats import HistogramSnapshot
+
+
+class TrackerStats(TypedDict):
+    # Number of captured frames
+    frames: int
+    # Current capture frame rate
+    fps: float
+    # Number of frames which could not be read
+    failed_reads: int
+    # Frames replaced by newer frames before a worker took them
+    dropped_frames: int
+    # Frames dropped by workers, because they were too old
+    stale_frames: int
+    # Frames which were not detected, because nothing moved
+    static_frames: int
+    # Frames whose detection or result handling raised an error
+    detect_errors: int
+    # Number of refinements and how many markers they recovered
+    refinements: int
+    refine_skips: int
+    recovered_markers: int
+    # Number of full frame and ROI scans
+    full_scans: int
+    roi_scans: int
+    # Timings of each tracker stage
+    stages: Dict[str, HistogramSnapshot]
+    # Queue state of each subscription
+    subscriptions: Dict[int, SubscriptionStats]
+    # Estimated share of the frame time spent on recording these stats
+    overhead: float
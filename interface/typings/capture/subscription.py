@@ -0,0 +1,42 @@
+from enum import Enum, unique, auto
+from typing import TypedDict
+from typing_extensions import Self
+
+from typings.error import Err, Error, Ok, Result
+
+
+@unique
+class SubscriptionMode(Enum):
+    LATEST = auto()
+    DROP_OLDEST = auto()
+    BLOCK = auto()
+
+    @staticmethod
+    def from_str(mode: str) -> Result[Self, Error]:
+        '''
+        Returns the enum from the provided string or returns an error if no corresponding enum exists.
+        '''
+        match mode.lower():
+            case 'latest':
+                return Ok(SubscriptionMode.LATEST)
+            case 'drop-oldest':
+                return Ok(SubscriptionMode.DROP_OLDEST)
+            case 'block':
+                return Ok(SubscriptionMode.BLOCK)
+            case _:
+                return Err(Error('Invalid subscription mode'))
+
+
+class SubscriptionStats(TypedDict):
+    # Number of items put into the subscription
+    published: int
+    # Number of items retrieved by the consumer
+    delivered: int
+    # Number of items dropped because the consumer was too slow
+    dropped: int
+    # Number of items currently waiting to be retrieved
+    depth: int
+    # Time in seconds between put and get of the last retrieved item
+    last_lag: float
+    # Maximum time in seconds between put and get
+    max_lag: float
@@ -1,9 +1,23 @@
 from enum import Enum, auto, unique
-from typing import Dict, Tuple
+from typing import Dict, List, Tuple, TypeAlias
 import cv2 as cv
 
 from typings.error import Err, Error, Ok, Result
 
+# Rectangle in frame pixel coordinates: x0, y0, x1, y1 (exclusive)
+Rect: TypeAlias = Tuple[int, int, int, int]
+
+
+def intersects(a: Rect, b: Rect) -> bool:
+    '''
+    Returns if two rectangles overlap.
+    '''
+    return a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]
+
+
+# Stroke width of nodes in pixels
+NODE_THICKNESS = 5
+
 
 @unique
 class Corner(Enum):
@@ -16,6 +30,9 @@ class Corner(Enum):
 class RenderObject:
     '''
     This is the base class of each RenderObject. It provides some shared attributes and methods.
+
+    Objects which render something report their bounding box via `bounds`. Each object remembers the bounds it was
+    last rendered with, so that incremental rendering only has to redraw the regions of objects which changed since.
     '''
 
     def __init__(self, x: int, y: int, name: str, scale: float) -> None:
@@ -25,19 +42,50 @@ class RenderObject:
         self._x: int = x
         self._y: int = y
 
+        # Bounds of the last render and if the object changed since
+        self._drawn: Rect | None = None
+        self._dirty = True
+
     def update(self, new_x: int, new_y: int):
         '''
         Update the position of the render object.
         '''
+        if new_x == self._x and new_y == self._y:
+            return
+
         self._x = new_x
         self._y = new_y
+        self._dirty = True
 
-    def render(self, _: cv.Mat):
+    def render(self, _: cv.Mat, origin: Tuple[int, int] = (0, 0)):
         '''
         The default render method renders nothing.
         '''
         pass
 
+    def bounds(self) -> Rect | None:
+        '''
+        Returns the bounding box of everything the object renders. The default render object renders nothing.
+        '''
+        return None
+
+    def damage(self) -> List[Rect]:
+        '''
+        Returns the regions which have to be redrawn because the object changed since it was last rendered: The
+        previous and the current bounding box.
+        '''
+        if not self._dirty:
+            return []
+
+        return [rect for rect in (self._drawn, self.bounds()) if rect != None]
+
+    def rendered(self):
+        '''
+        Remember the current bounding box as rendered.
+        '''
+        self._drawn = self.bounds()
+        self._dirty = False
+
     def scale(self, current_mat: cv.Mat, src_mat: cv.Mat) -> cv.Mat:
         '''
         Scale 'mat' by factor.
@@ -56,6 +104,7 @@ class RenderObject:
         Set the scaling factor.
         '''
         self._scale = scale
+        self._dirty = True
 
 
 class Node(RenderObject):
@@ -71,11 +120,16 @@ class Node(RenderObject):
     def update(self, new_x: int, new_y: int):
         super().update(new_x, new_y)
 
-    def render(self, frame: cv.Mat):
+    def render(self, frame: cv.Mat, origin: Tuple[int, int] = (0, 0)):
         '''
         Render a circle around the tracked marker.
         '''
-        cv.circle(frame, (self._x, self._y), self._radius, self._color, 5)
+        cv.circle(frame, (self._x - origin[0], self._y - origin[1]), self._radius, self._color, NODE_THICKNESS)
+
+    def bounds(self) -> Rect | None:
+        # The stroke is centered on the circle, pad by one pixel for rounding
+        r = self._radius + NODE_THICKNESS // 2 + 1
+        return self._x - r, self._y - r, self._x + r + 1, self._y + r + 1
 
 
 class ArUcoMarker(RenderObject):
@@ -94,15 +148,27 @@ class ArUcoMarker(RenderObject):
         '''
         pass
 
-    def render(self, frame: cv.Mat):
+    def render(self, frame: cv.Mat, origin: Tuple[int, int] = (0, 0)):
         '''
-        Render first scales the marker (if needed) and then inserts the pixels into the frame mat.
+        Render first scales the marker (if needed) and then inserts the pixels into the frame mat. Only the part of
+        the marker which lies inside the frame gets inserted.
         '''
         self.scale()
-        frame[
-            self._y:self._y + self._marker.shape[0],
-            self._x:self._x + self._marker.shape[1]
-        ] = self._marker
+
+        x0, y0, x1, y1 = self.bounds()
+        x0, y0, x1, y1 = x0 - origin[0], y0 - origin[1], x1 - origin[0], y1 - origin[1]
+
+        # Clip the marker to the frame
+        cx0, cy0 = max(x0, 0), max(y0, 0)
+        cx1, cy1 = min(x1, frame.shape[1]), min(y1, frame.shape[0])
+        if cx1 <= cx0 or cy1 <= cy0:
+            return
+
+        frame[cy0:cy1, cx0:cx1] = self._marker[cy0 - y0:cy1 - y0, cx0 - x0:cx1 - x0]
+
+    def bounds(self) -> Rect | None:
+        self.scale()
+        return self._x, self._y, self._x + self._marker.shape[1], self._y + self._marker.shape[0]
 
     def scale(self):
         '''
@@ -131,20 +197,36 @@ class ConfettiParticle(RenderObject):
 
 
 class RenderLayer:
-    def __init__(self, index: int, name: str, should_warp: bool) -> None:
+    def __init__(self, index: int, name: str, should_warp: bool, static: bool = False) -> None:
         self._objects: Dict[int, RenderObject] = {}
         self._should_warp = should_warp
+        self._static = static
         self._index = index
         self._name = name
 
+        # Incremented when objects get added. Changes of the objects themselves are tracked by the objects
+        self._version = 0
+        self._rendered_version = -1
+
     def add_object(self, obj: RenderObject):
         self._objects[len(self._objects)] = obj
+        self._version += 1
 
     def add_object_by_index(self, index: int, obj: RenderObject) -> Error:
         if index in self._objects.keys():
             return Error(f'Object with index {index} already exists on layer {self._name}')
 
         self._objects[index] = obj
+        self._version += 1
+
+    def changed(self) -> bool:
+        '''
+        Returns if objects were added or changed since the layer was last rendered.
+        '''
+        if self._version != self._rendered_version:
+            return True
+
+        return any(obj._dirty for obj in self._objects.values())
 
     def get_object(self, index: int) -> Result[RenderObject, Error]:
         if not index in self._objects.keys():
@@ -155,3 +237,41 @@ class RenderLayer:
     def render(self, frame: cv.Mat):
         for obj in self._objects.values():
             obj.render(frame)
+            obj.rendered()
+
+        self._rendered_version = self._version
+
+    def damage(self) -> List[Rect]:
+        '''
+        Returns the regions of all objects which changed since they were last rendered.
+        '''
+        rects = []
+        for obj in self._objects.values():
+            if obj._dirty:
+                rects.extend(obj.damage())
+
+        return rects
+
+    def render_region(self, view: cv.Mat, origin: Tuple[int, int], rect: Rect):
+        '''
+        Render the objects which overlap a region into a view of the frame.
+
+        Args:
+            view: A view of the frame which contains the region.
+            origin: Position of the top-left pixel of the view in the frame.
+            rect: The region to redraw.
+        '''
+        for obj in self._objects.values():
+            bounds = obj.bounds()
+            if bounds != None and intersects(bounds, rect):
+                obj.render(view, origin)
+
+    def mark_rendered(self):
+        '''
+        Remember the current bounds of all changed objects as rendered.
+        '''
+        for obj in self._objects.values():
+            if obj._dirty:
+                obj.rendered()
+
+        self._rendered_version = self._version
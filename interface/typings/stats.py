@@ -0,0 +1,30 @@
+from typing import Dict, List, TypeAlias, TypedDict
+
+
+class HistogramSnapshot(TypedDict):
+    # Upper bounds of the buckets in milliseconds. The last bucket counts all larger values
+    bounds: List[float]
+    # Number of values per bucket (one more than bounds)
+    counts: List[int]
+    # Total number of values
+    count: int
+    # Sum of all values in milliseconds
+    sum: float
+    # Largest value in milliseconds
+    max: float
+
+
+# Metric values keyed by metric name (optionally with labels, e.g. 'name{a="b"}'). Histograms are exported as such,
+# all other values as counters (if the name ends with _total) or gauges.
+MetricValues: TypeAlias = Dict[str, int | float | HistogramSnapshot]
+
+
+class SchedulerStats(TypedDict):
+    # Number of presented frames
+    presented: int
+    # Number of deadlines without a new frame, the previous frame stayed on screen
+    repeated: int
+    # Number of deadlines which were presented more than half a display period late or skipped
+    missed: int
+    # Number of frames which failed to render
+    render_errors: int
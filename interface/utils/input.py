@@ -1,6 +1,7 @@
 import os
 
 from capture.calibration import Calibration, read_calibration_result
+from capture.source import source_from
 from config.config import Config
 
 from typings.capture.calibration import CalibrationMode, CharucoCalibrationData
@@ -32,7 +33,12 @@ def confirmation_prompt(text: str, default: bool | None = False) -> bool:
     return inp == 'y'
 
 
-def handle_calibration(cfg: Config, mode: str) -> Result[CharucoCalibrationData, Error]:
+def handle_calibration(
+    cfg: Config,
+    mode: str,
+    source: str = '',
+    realtime: bool = False
+) -> Result[CharucoCalibrationData, Error]:
     '''
     Handle calibration flow. This first detects if a calibration jSON file exists. If this is not the case the user is
     asked to run the calibration. Denying this prompt exists the program. If a JSON file already exists the user is
@@ -40,6 +46,9 @@ def handle_calibration(cfg: Config, mode: str) -> Result[CharucoCalibrationData,
 
     Args:
         cfg: Config data
+        mode: The calibration mode.
+        source: Frame source spec used when the calibration is (re-)run (Default: '' => Camera).
+        realtime: If file based frame sources should be paced in real-time.
 
     Returns:
         Calibration data or error
@@ -49,17 +58,21 @@ def handle_calibration(cfg: Config, mode: str) -> Result[CharucoCalibrationData,
     if result.is_err():
         return Err(result.error())
 
+    source_result = source_from(cfg, source, realtime)
+    if source_result.is_err():
+        return Err(source_result.error())
+
     # Construct calib JSON file path
     calib_file_path = os.path.join(cfg['capture']['path'], 'calib.pckl')
 
     # Check if we already have a calib JSON file
     if not os.path.exists(calib_file_path):
         if confirmation_prompt('No calibration file (.data/pckl.json) detected. Run calibration?'):
-            c = Calibration(cfg)
+            c = Calibration(cfg, source=source_result.unwrap())
             return c.calibrate_save(result.unwrap())
 
     if confirmation_prompt('Calibration file exists. Re-run calibration?'):
-        c = Calibration(cfg)
+        c = Calibration(cfg, source=source_result.unwrap())
         return c.calibrate_save(result.unwrap())
     else:
         return read_calibration_result(calib_file_path)
@@ -0,0 +1,226 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Tuple
+import threading
+
+from config.config import Config
+from typings.capture.stats import TrackerStats
+from typings.stats import HistogramSnapshot, MetricValues
+from typings.error import Error
+
+# Collectors return the current metric values keyed by metric name. Names may contain labels, e.g. 'name{a="b"}'
+Collector = Callable[[], MetricValues]
+
+
+class MetricsServer:
+    '''
+    This class describes a lightweight HTTP server which exports metrics in the Prometheus text format. Metrics are
+    gathered from registered collectors on each scrape. Collectors only read counters and snapshots, so scraping never
+    waits for the tracking or rendering loops.
+    '''
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 9464) -> None:
+        '''
+        Create a new metrics server.
+
+        Args:
+            host: Address to bind to (Default: '127.0.0.1' => Only reachable from localhost).
+            port: Port to bind to.
+        '''
+        self._collectors: List[Collector] = []
+        self._server: ThreadingHTTPServer | None = None
+        self._thread = None
+        self._host = host
+        self._port = port
+
+    def add_collector(self, collector: Collector):
+        '''
+        Register a collector.
+
+        Args:
+            collector: Function which returns the current metric values.
+        '''
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        '''
+        Collect all metrics and render them in the Prometheus text format.
+
+        Returns:
+            The rendered metrics.
+        '''
+        # Samples of the same metric have to be grouped, so gather them by name first
+        metrics: Dict[str, List[Tuple[str, int | float | HistogramSnapshot]]] = {}
+        for collector in self._collectors:
+            try:
+                values = collector()
+            except Exception:
+                continue
+
+            for key, value in values.items():
+                name, labels = _split_key(key)
+                metrics.setdefault(name, []).append((labels, value))
+
+        lines: List[str] = []
+        for name, samples in metrics.items():
+            is_histogram = isinstance(samples[0][1], dict)
+
+            if is_histogram:
+                lines.append(f'# TYPE {name} histogram')
+            elif name.endswith('_total'):
+                lines.append(f'# TYPE {name} counter')
+            else:
+                lines.append(f'# TYPE {name} gauge')
+
+            for labels, value in samples:
+                if is_histogram:
+                    lines.extend(_render_histogram(name, labels, value))
+                else:
+                    lines.append(f'{name}{_labels(labels)} {value}')
+
+        return '\n'.join(lines) + '\n'
+
+    def start(self) -> Error:
+        '''
+        Start serving metrics in a separate thread.
+
+        Returns:
+            Non None if an error occured.
+        '''
+        render = self.render
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path != '/metrics':
+                    self.send_error(404)
+                    return
+
+                body = render().encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *_):
+                pass
+
+        try:
+            self._server = ThreadingHTTPServer((self._host, self._port), Handler)
+        except OSError as e:
+            return Error(f'Failed to start metrics server: {e}')
+
+        self._server.daemon_threads = True
+        t = threading.Thread(None, self._server.serve_forever, 'metrics-server', daemon=True)
+        self._thread = t
+        t.start()
+
+        return None
+
+    def stop(self):
+        '''
+        Stop the metrics server.
+        '''
+        if self._server == None:
+            return
+
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+        self._server = None
+
+
+def server_from(cfg: Config, collectors: List[Collector]) -> MetricsServer | None:
+    '''
+    Create a metrics server with the provided collectors if metrics are enabled in the config.
+
+    Args:
+        cfg: The config.
+        collectors: Collectors to register.
+
+    Returns:
+        The (not yet started) metrics server or None if metrics are disabled.
+    '''
+    if not cfg['metrics']['enabled']:
+        return None
+
+    server = MetricsServer(cfg['metrics']['host'], cfg['metrics']['port'])
+    for collector in collectors:
+        server.add_collector(collector)
+
+    return server
+
+
+def tracker_metrics(stats: TrackerStats) -> MetricValues:
+    '''
+    Convert tracker stats into metric values.
+
+    Args:
+        stats: The tracker stats.
+
+    Returns:
+        The metric values.
+    '''
+    values: MetricValues = {
+        'tracker_frames_total': stats['frames'],
+        'tracker_fps': stats['fps'],
+        'tracker_failed_reads_total': stats['failed_reads'],
+        'tracker_dropped_frames_total': stats['dropped_frames'],
+        'tracker_stale_frames_total': stats['stale_frames'],
+        'tracker_detect_errors_total': stats['detect_errors'],
+        'tracker_static_frames_total': stats['static_frames'],
+        'tracker_refinements_total': stats['refinements'],
+        'tracker_refine_skips_total': stats['refine_skips'],
+        'tracker_recovered_markers_total': stats['recovered_markers'],
+        'tracker_full_scans_total': stats['full_scans'],
+        'tracker_roi_scans_total': stats['roi_scans'],
+    }
+
+    for stage, h in stats['stages'].items():
+        values[f'tracker_stage_seconds{{stage="{stage}"}}'] = h
+
+    for id, s in stats['subscriptions'].items():
+        values[f'tracker_subscription_depth{{id="{id}"}}'] = s['depth']
+        values[f'tracker_subscription_dropped_total{{id="{id}"}}'] = s['dropped']
+        values[f'tracker_subscription_lag_seconds{{id="{id}"}}'] = s['last_lag']
+        values[f'tracker_subscription_max_lag_seconds{{id="{id}"}}'] = s['max_lag']
+
+    return values
+
+
+def _split_key(key: str):
+    '''
+    Split a metric key into the name and the label string.
+    '''
+    if '{' not in key:
+        return key, ''
+
+    name, labels = key.split('{', 1)
+    return name, labels.rstrip('}')
+
+
+def _labels(labels: str) -> str:
+    '''
+    Returns the label string in braces or an empty string.
+    '''
+    return f'{{{labels}}}' if labels else ''
+
+
+def _render_histogram(name: str, labels: str, h: HistogramSnapshot) -> List[str]:
+    '''
+    Render a histogram snapshot with cumulative buckets in seconds.
+    '''
+    prefix = f'{labels},' if labels else ''
+    lines = []
+
+    total = 0
+    for bound, count in zip(h['bounds'], h['counts']):
+        total += count
+        lines.append(f'{name}_bucket{{{prefix}le="{bound / 1000:g}"}} {total}')
+
+    # Derive the count from the buckets, the snapshot is not taken atomically
+    total += h['counts'][-1]
+    lines.append(f'{name}_bucket{{{prefix}le="+Inf"}} {total}')
+    lines.append(f'{name}_sum{_labels(labels)} {h["sum"] / 1000}')
+    lines.append(f'{name}_count{_labels(labels)} {total}')
+
+    return lines
@@ -0,0 +1,88 @@
+from typing import Dict, List, Tuple
+import numpy as np
+import threading
+
+
+class BufferPool:
+    '''
+    This class describes a pool of reusable frame buffers. Buffers are kept in free lists keyed by shape and dtype,
+    so acquiring a buffer of a known frame size doesn't allocate once the pool is warm. Released buffers beyond
+    `limit` per key get dropped, so a burst of acquisitions doesn't keep memory forever.
+
+    Acquired buffers are not cleared, their content is the one of the frame they were last used for.
+    '''
+
+    def __init__(self, limit: int = 4) -> None:
+        '''
+        Create a new buffer pool.
+
+        Args:
+            limit: Maximum number of free buffers kept per shape and dtype.
+        '''
+        self._free: Dict[Tuple[Tuple[int, ...], np.dtype], List[np.ndarray]] = {}
+        self._lock = threading.Lock()
+        self._limit = limit
+
+        # Counters
+        self.allocations = 0
+        self.reuses = 0
+
+    def acquire(self, shape: Tuple[int, ...], dtype: np.dtype = np.uint8) -> np.ndarray:
+        '''
+        Returns a free buffer of the given shape and dtype. A new buffer gets allocated if there is none.
+
+        Args:
+            shape: Shape of the buffer.
+            dtype: Data type of the buffer.
+
+        Returns:
+            The buffer.
+        '''
+        key = (tuple(shape), np.dtype(dtype))
+        with self._lock:
+            free = self._free.get(key)
+            if free:
+                self.reuses += 1
+                return free.pop()
+
+            self.allocations += 1
+
+        return np.empty(shape, dtype)
+
+    def acquire_like(self, src: np.ndarray) -> np.ndarray:
+        '''
+        Returns a copy of an array in a pooled buffer.
+
+        Args:
+            src: The array to copy.
+
+        Returns:
+            The buffer.
+        '''
+        buf = self.acquire(src.shape, src.dtype)
+        np.copyto(buf, src)
+        return buf
+
+    def release(self, buf: np.ndarray | None):
+        '''
+        Return a buffer to the pool. The buffer must not be used afterwards. Views and read-only buffers are not
+        pooled, their memory belongs to someone else.
+
+        Args:
+            buf: The buffer returned by `acquire`.
+        '''
+        if buf is None or buf.base is not None or not buf.flags.writeable:
+            return
+
+        key = (buf.shape, buf.dtype)
+        with self._lock:
+            free = self._free.setdefault(key, [])
+            if len(free) < self._limit and not any(b is buf for b in free):
+                free.append(buf)
+
+    def clear(self):
+        '''
+        Drop all free buffers.
+        '''
+        with self._lock:
+            self._free = {}
@@ -0,0 +1,211 @@
+from typing import Callable, Dict, List
+import threading
+import bisect
+import click
+import time
+
+from typings.capture.stats import TrackerStats
+from typings.stats import HistogramSnapshot
+
+# Default bucket upper bounds in milliseconds
+DEFAULT_BOUNDS = [0.25, 0.5, 1, 2, 4, 8, 16, 33, 66, 133, 266]
+
+# Cached cost of a single `Histogram.observe` call in seconds
+_observe_cost = None
+
+
+class Histogram:
+    '''
+    This class describes a histogram with fixed buckets. Recording a value only increments counters, so it is cheap
+    enough to run in every frame. Writers are serialized by an uncontended lock, snapshots are taken without locking
+    and therefore never block the writers.
+    '''
+
+    def __init__(self, bounds: List[float] = DEFAULT_BOUNDS) -> None:
+        '''
+        Create a new histogram.
+
+        Args:
+            bounds: Ascending bucket upper bounds in milliseconds.
+        '''
+        self._lock = threading.Lock()
+        self._counts = [0] * (len(bounds) + 1)
+        self._bounds = bounds
+        self._count = 0
+        self._sum = 0.0
+        self._max = 0.0
+
+    def observe(self, seconds: float):
+        '''
+        Record a duration.
+
+        Args:
+            seconds: The duration in seconds.
+        '''
+        ms = seconds * 1000
+        i = bisect.bisect_left(self._bounds, ms)
+
+        with self._lock:
+            self._counts[i] += 1
+            self._count += 1
+            self._sum += ms
+
+            if ms > self._max:
+                self._max = ms
+
+    def snapshot(self) -> HistogramSnapshot:
+        '''
+        Returns a copy of the current histogram values.
+
+        Returns:
+            The snapshot.
+        '''
+        return HistogramSnapshot(
+            bounds=list(self._bounds),
+            counts=list(self._counts),
+            count=self._count,
+            sum=self._sum,
+            max=self._max
+        )
+
+
+class Stages:
+    '''
+    This class describes the timing histograms of multiple named stages.
+    '''
+
+    def __init__(self, names: List[str], bounds: List[float] = DEFAULT_BOUNDS) -> None:
+        '''
+        Create new stage timings.
+
+        Args:
+            names: Stage names.
+            bounds: Ascending bucket upper bounds in milliseconds.
+        '''
+        self._histograms = {name: Histogram(bounds) for name in names}
+
+    def observe(self, name: str, seconds: float):
+        '''
+        Record the duration of a stage.
+
+        Args:
+            name: The stage name.
+            seconds: The duration in seconds.
+        '''
+        self._histograms[name].observe(seconds)
+
+    def observations(self) -> int:
+        '''
+        Returns the total number of recorded durations of all stages.
+
+        Returns:
+            Number of recorded durations.
+        '''
+        return sum(h._count for h in self._histograms.values())
+
+    def snapshot(self) -> Dict[str, HistogramSnapshot]:
+        '''
+        Returns a copy of the histograms of all stages.
+
+        Returns:
+            The snapshots keyed by stage name.
+        '''
+        return {name: h.snapshot() for name, h in self._histograms.items()}
+
+
+def observe_cost() -> float:
+    '''
+    Returns the cost of recording a single duration including the clock reads around it. The cost gets measured once
+    and is cached afterwards.
+
+    Returns:
+        The cost in seconds.
+    '''
+    global _observe_cost
+    if _observe_cost != None:
+        return _observe_cost
+
+    n = 10000
+    histogram = Histogram()
+
+    start = time.perf_counter()
+    for _ in range(n):
+        t = time.perf_counter()
+        histogram.observe(time.perf_counter() - t)
+
+    _observe_cost = (time.perf_counter() - start) / n
+    return _observe_cost
+
+
+def quantile(snapshot: HistogramSnapshot, q: float) -> float:
+    '''
+    Estimate a quantile from a histogram snapshot. The estimate is the upper bound of the bucket which contains the
+    quantile.
+
+    Args:
+        snapshot: The histogram snapshot.
+        q: The quantile between 0 and 1.
+
+    Returns:
+        The estimated quantile in milliseconds.
+    '''
+    if snapshot['count'] == 0:
+        return 0.0
+
+    rank = q * snapshot['count']
+    total = 0
+    for i, count in enumerate(snapshot['counts']):
+        total += count
+        if total >= rank:
+            return snapshot['bounds'][i] if i < len(snapshot['bounds']) else snapshot['max']
+
+    return snapshot['max']
+
+
+def format_stats(stats: TrackerStats) -> List[str]:
+    '''
+    Format tracker stats as human readable lines.
+
+    Args:
+        stats: The tracker stats.
+
+    Returns:
+        The formatted lines.
+    '''
+    lines = [
+        f'frames: {stats["frames"]} fps: {stats["fps"]:.1f} failed: {stats["failed_reads"]} '
+        f'dropped: {stats["dropped_frames"]} stale: {stats["stale_frames"]} static: {stats["static_frames"]} '
+        f'errors: {stats["detect_errors"]}',
+        f'refined: {stats["refinements"]} skipped: {stats["refine_skips"]} recovered: {stats["recovered_markers"]} '
+        f'full scans: {stats["full_scans"]} roi scans: {stats["roi_scans"]} overhead: {stats["overhead"] * 100:.2f}%'
+    ]
+
+    for name, h in stats['stages'].items():
+        if h['count'] == 0:
+            continue
+
+        lines.append(
+            f'  {name:<8} mean: {h["sum"] / h["count"]:7.2f}ms p50: <{quantile(h, 0.5):g}ms '
+            f'p95: <{quantile(h, 0.95):g}ms max: {h["max"]:.2f}ms'
+        )
+
+    for id, s in stats['subscriptions'].items():
+        lines.append(
+            f'  subscription {id}: depth: {s["depth"]} dropped: {s["dropped"]} '
+            f'lag: {s["last_lag"] * 1000:.2f}ms'
+        )
+
+    return lines
+
+
+def dump_periodically(stats_func: Callable[[], TrackerStats], stop: threading.Event, interval: float = 2.0):
+    '''
+    Print tracker stats to the console until `stop` is set. Run this in a separate thread.
+
+    Args:
+        stats_func: Returns the current tracker stats, e.g. `Tracker.stats`.
+        stop: Event to stop printing.
+        interval: Interval between two dumps in seconds.
+    '''
+    while not stop.wait(interval):
+        click.echo('\n'.join(format_stats(stats_func())))
@@ -0,0 +1,172 @@
+from collections import deque
+from typing import Deque, Dict, List, Tuple
+import multiprocessing
+import threading
+import json
+import time
+import os
+
+from typings.error import Error
+
+# Default number of events kept per thread. Older events get overwritten
+DEFAULT_CAPACITY = 100000
+
+# An event consists of the name, the category and the start and end time (`time.perf_counter`)
+Event = Tuple[str, str, float, float]
+
+_enabled = False
+_capacity = DEFAULT_CAPACITY
+_local = threading.local()
+_lock = threading.Lock()
+_buffers: List[Tuple[int, str, Deque[Event]]] = []
+
+# Trace event JSON objects received from other processes
+_imported: List[Dict] = []
+
+
+def enable(capacity: int = DEFAULT_CAPACITY):
+    '''
+    Start recording trace events. Each thread records into its own ring buffer, so recording never contends with
+    other threads.
+
+    Args:
+        capacity: Number of events kept per thread.
+    '''
+    global _enabled, _capacity
+    _capacity = capacity
+    _enabled = True
+
+
+def is_enabled() -> bool:
+    '''
+    Returns if trace events get recorded.
+    '''
+    return _enabled
+
+
+def complete(name: str, start: float, end: float, category: str = ''):
+    '''
+    Record a span which already ended. This is a no-op if tracing is disabled.
+
+    Args:
+        name: Name of the span.
+        start: Start time (`time.perf_counter`).
+        end: End time (`time.perf_counter`).
+        category: Category of the span.
+    '''
+    if not _enabled:
+        return
+
+    buffer = getattr(_local, 'buffer', None)
+    if buffer == None:
+        buffer = _register()
+
+    buffer.append((name, category, start, end))
+
+
+class span:
+    '''
+    Context manager which records the enclosed code as span. This is a no-op if tracing is disabled.
+    '''
+    __slots__ = ('_name', '_category', '_start')
+
+    def __init__(self, name: str, category: str = '') -> None:
+        self._category = category
+        self._name = name
+        self._start = 0.0
+
+    def __enter__(self) -> 'span':
+        if _enabled:
+            self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *_):
+        if _enabled and self._start > 0:
+            complete(self._name, self._start, time.perf_counter(), self._category)
+
+
+def events() -> List[Dict]:
+    '''
+    Returns the events recorded in this process as trace event JSON objects. Use this to send the events of a child
+    process to the parent process, which adds them via `add_events`.
+
+    Returns:
+        The trace events.
+    '''
+    pid = os.getpid()
+    recorded = [{
+        'name': 'process_name',
+        'ph': 'M',
+        'pid': pid,
+        'args': {'name': multiprocessing.current_process().name}
+    }]
+
+    with _lock:
+        buffers = list(_buffers)
+
+    for tid, thread_name, buffer in buffers:
+        recorded.append({'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tid, 'args': {'name': thread_name}})
+
+        # Copying the deque happens without releasing the GIL, so the owning thread can keep recording
+        for name, category, start, end in buffer.copy():
+            recorded.append({
+                'name': name,
+                'cat': category,
+                'ph': 'X',
+                'ts': start * 1e6,
+                'dur': (end - start) * 1e6,
+                'pid': pid,
+                'tid': tid
+            })
+
+    return recorded
+
+
+def add_events(events: List[Dict]):
+    '''
+    Add the events of another process. They get written along with the events of this process. Timestamps of both
+    processes are comparable, `time.perf_counter` uses the system-wide monotonic clock.
+
+    Args:
+        events: The trace events returned by `events` in the other process.
+    '''
+    with _lock:
+        _imported.extend(events)
+
+
+def flush(path: str) -> Error:
+    '''
+    Write all recorded events and the events added from other processes as Chrome trace event JSON, which can be
+    opened in `chrome://tracing` or Perfetto.
+
+    Args:
+        path: Path of the JSON file.
+
+    Returns:
+        Non None if an error occured.
+    '''
+    recorded = events()
+    with _lock:
+        recorded.extend(_imported)
+
+    try:
+        with open(path, 'w') as f:
+            json.dump({'traceEvents': recorded, 'displayTimeUnit': 'ms'}, f)
+    except OSError as e:
+        return Error(f'Failed to write trace: {e}')
+
+    return None
+
+
+def _register() -> Deque[Event]:
+    '''
+    Create and register the ring buffer of the current thread.
+    '''
+    buffer = deque(maxlen=_capacity)
+    _local.buffer = buffer
+
+    thread = threading.current_thread()
+    with _lock:
+        _buffers.append((threading.get_ident(), thread.name, buffer))
+
+    return buffer
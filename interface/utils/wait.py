@@ -1,5 +1,7 @@
 import cv2 as cv
 
+import utils.trace as trace
+
 
 def wait_or(d: int, key: str = 'q') -> bool:
     '''
@@ -30,7 +32,9 @@ def multi_wait_or(d: int, *keys: str) -> int:
     Returns:
         pressed: Returns index > 0 if one of the provided keys were pressed, -1 otherwise.
     '''
-    code = cv.waitKey(d)
+    with trace.span('multi_wait_or', 'renderer'):
+        code = cv.waitKey(d)
+
     for i, key in enumerate(keys):
         if code == ord(key):
             return i
@@ -0,0 +1,6 @@
+import os
+import sys
+
+# The interface modules import each other top-level. Append instead of prepend, the interface `cmd` package would
+# shadow the standard library module otherwise
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'interface'))
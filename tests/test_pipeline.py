@@ -0,0 +1,58 @@
+import time
+import numpy as np
+
+from capture.frames import FrameStore
+from capture.pipeline import DetectionPipeline
+import capture.aruco as aruco
+
+from typings.capture.pipeline import DropPolicy
+
+
+def _submit_frames(pipeline: DetectionPipeline, number: int):
+    store = FrameStore()
+    for _ in range(number):
+        slot = store.begin_write()
+        slot.color = np.zeros((120, 160, 3), dtype=np.uint8)
+        slot.gray = np.zeros((120, 160), dtype=np.uint8)
+        store.commit(slot, time.monotonic())
+        pipeline.submit(store.latest())
+
+
+def test_results_in_order_without_drops():
+    dict_type, _ = aruco.dict_from(aruco.type_from(5, 50))
+    frame_nos = []
+
+    pipeline = DetectionPipeline(
+        dict_type,
+        (np.eye(3), np.zeros(5), (), ()),
+        lambda frame_no, *_: frame_nos.append(frame_no),
+        workers=3,
+        policy=DropPolicy.NONE
+    )
+    pipeline.start()
+    _submit_frames(pipeline, 30)
+
+    assert pipeline.stop(True) == None
+    assert frame_nos == list(range(1, 31))
+
+
+def test_failing_result_handler():
+    dict_type, _ = aruco.dict_from(aruco.type_from(5, 50))
+
+    def on_result(*_):
+        raise ValueError('broken consumer')
+
+    pipeline = DetectionPipeline(
+        dict_type,
+        (np.eye(3), np.zeros(5), (), ()),
+        on_result,
+        workers=2,
+        policy=DropPolicy.NONE
+    )
+    pipeline.start()
+    _submit_frames(pipeline, 10)
+
+    # The workers survive the errors, so draining terminates
+    err = pipeline.stop(True)
+    assert err != None and 'broken consumer' in err.string()
+    assert pipeline.detect_errors == 10
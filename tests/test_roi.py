@@ -0,0 +1,43 @@
+import os
+import time
+import numpy as np
+import cv2 as cv
+
+from capture.roi import RoiPredictor
+from capture.source import ImageDirectorySource
+from capture.tracker import Tracker
+from config.config import Config, TrackerOptions, CaptureOptions, read_config
+
+EXAMPLE_CONFIG = os.path.join(os.path.dirname(__file__), '..', 'example.toml')
+
+
+def test_update_without_markers():
+    predictor = RoiPredictor(30, 0.5)
+    predictor.update(1, ((), None, (), None), None)
+
+    # Nothing is known, so the next frame gets scanned fully
+    assert predictor.plan(2, 640, 480) == None
+
+
+def test_roi_tracking_blank_frames(tmp_path):
+    for i in range(20):
+        cv.imwrite(str(tmp_path / f'{i:03}.png'), np.full((480, 640, 3), 255, dtype=np.uint8))
+
+    cfg = read_config(EXAMPLE_CONFIG, True).unwrap()
+    tracker_options = TrackerOptions(cfg['capture']['tracker'], roi=True, drop_policy='none')
+    cfg = Config(cfg, capture=CaptureOptions(cfg['capture'], tracker=tracker_options))
+
+    calib = (np.eye(3), np.zeros(5), (), ())
+    tracker = Tracker(cfg, calib, ImageDirectorySource(str(tmp_path)))
+    tracker.start()
+
+    # The tracker stops by itself at the end of the images
+    deadline = time.monotonic() + 10
+    while tracker.is_running() and time.monotonic() < deadline:
+        time.sleep(0.05)
+
+    running = tracker.is_running()
+    tracker.stop()
+
+    assert not running
+    assert tracker.stats()['frames'] == 20